@@ -0,0 +1,258 @@
+"""
+Columnar compliance analytics over shifts and breaks.
+
+Shifts and breaks are bulk-loaded into NumPy arrays held in memory and refreshed incrementally by shiftid, so audits
+over years of punches are a few vectorized passes instead of a Python loop over report rows. Worked time follows
+payroll_summary: breaks are paid, lunches are not.
+
+Usage:
+    python analytics.py [--db timeclockdb.db] --from 2022-10-01 --to 2022-10-31 [--weekly-hours 40]
+"""
+import argparse
+import threading
+
+import numpy as np
+
+from db import Database
+from report import work_date
+
+SHIFT_COLUMNS = ("shiftid", "empid", "shift_start", "shift_end", "work_date")
+BREAK_COLUMNS = ("breakid", "shiftid", "empid", "lunch", "break_start", "break_end")
+
+#Open shifts and breaks are loaded with an end of OPEN
+OPEN = -1
+
+def _columns(cur, names):
+    """
+    Function to read a cursor's rows straight into one int64 array per column
+    """
+    rows = np.fromiter(cur, dtype=[(name, np.int64) for name in names])
+    return {name: rows[name] for name in names}
+
+def _dates(work_dates):
+    """
+    Function to convert YYYYMMDD integers into numpy datetime64 days
+    """
+    years = (work_dates // 10000 - 1970).astype("datetime64[Y]")
+    months = years.astype("datetime64[M]") + (work_dates // 100 % 100 - 1)
+    return months.astype("datetime64[D]") + (work_dates % 100 - 1)
+
+def _take(columns, mask):
+    """
+    Function to select the rows of every column where mask is set, without copying when every row is selected
+    """
+    if mask.all():
+        return dict(columns)
+    index = np.flatnonzero(mask)
+    return {name: column.take(index) for name, column in columns.items()}
+
+class Analytics:
+    """
+    Analytics class caching shifts and breaks as columnar arrays for compliance checks. Safe to share between threads.
+
+    Arrays are kept in shiftid order. Each query first calls refresh, which only reads shifts from the oldest one that
+    was still open (or had an open break) at the previous load onwards, so an up-to-date cache costs one indexed range
+    scan. Rows written out of shiftid order, e.g. by bulk.import_shifts with explicit ids, or deleted, e.g. moved out by
+    archive.py, need reload. Only the live tables are read.
+
+    """
+
+    def __init__(self, db):
+        """
+        Args:
+            db (Database): database to read punches from
+        """
+        self.db = db
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """
+        Function to discard the cached arrays so the next query loads every shift again
+        """
+        with self.lock:
+            self.shifts = _columns([], SHIFT_COLUMNS)
+            self.breaks = _columns([], BREAK_COLUMNS)
+            self._derive()
+            self.reload_from = 1
+
+    def refresh(self):
+        """
+        Function to load shifts and breaks added or closed since the last refresh
+
+        Returns:
+            count (int) : number of shifts read
+        """
+        with self.lock:
+            start = self.reload_from
+            conn = self.db.conn
+            shifts = _columns(conn.execute(f"""SELECT shiftid, empid, shift_start, IFNULL(shift_end, {OPEN}), work_date
+                FROM shifts WHERE shiftid >= ? ORDER BY shiftid""", (start,)), SHIFT_COLUMNS)
+            breaks = _columns(conn.execute(f"""SELECT breakid, shiftid, empid, breaktype = 'lunch', break_start, IFNULL(break_end, {OPEN})
+                FROM breaks WHERE shiftid >= ? ORDER BY shiftid, breakid""", (start,)), BREAK_COLUMNS)
+            if not len(shifts["shiftid"]) and not len(breaks["shiftid"]):
+                return 0
+
+            keep = np.searchsorted(self.shifts["shiftid"], start)
+            self.shifts = {name: np.concatenate((self.shifts[name][:keep], shifts[name])) for name in SHIFT_COLUMNS}
+            keep = np.searchsorted(self.breaks["shiftid"], start)
+            self.breaks = {name: np.concatenate((self.breaks[name][:keep], breaks[name])) for name in BREAK_COLUMNS}
+            self._derive()
+
+            #the next refresh starts at the first shift that can still change
+            pending = np.concatenate((shifts["shiftid"][shifts["shift_end"] == OPEN], breaks["shiftid"][breaks["break_end"] == OPEN]))
+            if pending.size:
+                self.reload_from = int(pending.min())
+            elif shifts["shiftid"].size:
+                self.reload_from = int(shifts["shiftid"][-1]) + 1
+            return len(shifts["shiftid"])
+
+    def _derive(self):
+        """
+        Function to recompute the per-shift durations and each closed break's shift once per refresh rather than per query
+        """
+        shifts, breaks = self.shifts, self.breaks
+        count = len(shifts["shiftid"])
+        #shifts are sorted by shiftid, so each break's shift is found by binary search
+        position = np.minimum(np.searchsorted(shifts["shiftid"], breaks["shiftid"]), max(count - 1, 0))
+        closed = breaks["break_end"] != OPEN
+        if count:
+            closed &= shifts["shiftid"][position] == breaks["shiftid"]
+        seconds = np.where(closed, breaks["break_end"] - breaks["break_start"], 0)
+        lunch = breaks["lunch"].astype(bool)
+
+        breaks["seconds"] = seconds
+        breaks["position"] = np.where(closed, position, -1)
+        shifts["seconds"] = shifts["shift_end"] - shifts["shift_start"]
+        shifts["lunch_seconds"] = np.bincount(position[closed], seconds[closed] * lunch[closed], count).astype(np.int64)
+        shifts["break_seconds"] = np.bincount(position[closed], seconds[closed] * ~lunch[closed], count).astype(np.int64)
+
+    def _select(self, start, end, empids):
+        """
+        Function to refresh and select the closed shifts in a date range along with their closed breaks
+
+        Returns:
+            shifts (dict) : shift columns plus seconds, lunch_seconds and break_seconds per shift
+            breaks (dict) : break columns plus seconds per break
+        """
+        self.refresh()
+        with self.lock:
+            shifts, breaks = self.shifts, self.breaks
+        mask = shifts["shift_end"] != OPEN
+        if start is not None:
+            mask &= shifts["work_date"] >= work_date(start)
+        if end is not None:
+            mask &= shifts["work_date"] <= work_date(end)
+        if empids is not None:
+            mask &= np.isin(shifts["empid"], np.array([int(empid) for empid in empids], np.int64))
+        position = breaks["position"]
+        found = (position >= 0) & mask[position] if len(mask) else position >= 0
+        return _take(shifts, mask), _take(breaks, found)
+
+    def employee_hours(self, start=None, end=None, empids=None):
+        """
+        Function to total closed shifts per employee
+
+        Args:
+            start (str): first shift date to include, "YYYY-MM-DD", None for no lower bound
+            end (str): last shift date to include, "YYYY-MM-DD", None for no upper bound
+            empids (list): employee ids to include, None for all employees
+
+        Returns:
+            rows (list) : (empid, shifts, total hours, break hours, lunch hours, net hours) tuples ordered by empid,
+                where net hours is total hours less lunches
+        """
+        shifts, _ = self._select(start, end, empids)
+        employees, index = np.unique(shifts["empid"], return_inverse=True)
+        total = lambda values: np.round(np.bincount(index, values, len(employees)) / 3600, 2).tolist()
+        return list(zip(employees.tolist(), np.bincount(index, minlength=len(employees)).tolist(),
+                        total(shifts["seconds"]), total(shifts["break_seconds"]), total(shifts["lunch_seconds"]),
+                        total(shifts["seconds"] - shifts["lunch_seconds"])))
+
+    def overtime(self, start=None, end=None, empids=None, weekly_hours=40, daily_hours=None):
+        """
+        Function to find employees whose net hours exceed the overtime thresholds. Weeks start on Monday and are
+        counted from the shift's work date.
+
+        Args:
+            weekly_hours (float): net hours per week above which time is overtime
+            daily_hours (float): net hours per work date above which time is overtime, None for no daily limit
+
+        Returns:
+            rows (list) : (empid, period start date, net hours, overtime hours) tuples ordered by empid then date, one per
+                week over weekly_hours and one per work date over daily_hours
+        """
+        shifts, _ = self._select(start, end, empids)
+        net = shifts["seconds"] - shifts["lunch_seconds"]
+        days = _dates(shifts["work_date"]).astype(np.int64)
+        #1970-01-01 was a Thursday
+        weeks = days - (days + 3) % 7
+
+        rows = []
+        limits = [(weeks, weekly_hours)] + ([(days, daily_hours)] if daily_hours is not None else [])
+        for periods, limit in limits:
+            #one sortable int64 key per (employee, period) keeps the grouping a single 1-D unique
+            groups, index = np.unique(shifts["empid"] << 32 | periods, return_inverse=True)
+            hours = np.bincount(index.ravel(), net, len(groups)) / 3600
+            over = hours > limit
+            rows.extend(zip((groups[over] >> 32).tolist(), (groups[over] & 0xFFFFFFFF).astype("datetime64[D]").astype(str).tolist(),
+                            np.round(hours[over], 2).tolist(), np.round(hours[over] - limit, 2).tolist()))
+        rows.sort()
+        return rows
+
+    def missed_lunches(self, start=None, end=None, empids=None, lunch_after=6):
+        """
+        Function to find closed shifts long enough to require a lunch that have none
+
+        Args:
+            lunch_after (float): shift hours above which a lunch is required
+
+        Returns:
+            rows (list) : (shiftid, empid, work date, shift hours) tuples ordered by shiftid
+        """
+        shifts, _ = self._select(start, end, empids)
+        missed = (shifts["seconds"] > lunch_after * 3600) & (shifts["lunch_seconds"] == 0)
+        return list(zip(shifts["shiftid"][missed].tolist(), shifts["empid"][missed].tolist(),
+                        _dates(shifts["work_date"][missed]).astype(str).tolist(),
+                        np.round(shifts["seconds"][missed] / 3600, 2).tolist()))
+
+    def long_breaks(self, start=None, end=None, empids=None, break_minutes=15, lunch_minutes=60):
+        """
+        Function to find breaks and lunches that ran longer than allowed
+
+        Args:
+            break_minutes (float): longest allowed break
+            lunch_minutes (float): longest allowed lunch
+
+        Returns:
+            rows (list) : (breakid, shiftid, empid, breaktype, minutes) tuples ordered by shiftid then breakid
+        """
+        _, breaks = self._select(start, end, empids)
+        lunch = breaks["lunch"].astype(bool)
+        long = breaks["seconds"] > np.where(lunch, lunch_minutes * 60, break_minutes * 60)
+        return list(zip(breaks["breakid"][long].tolist(), breaks["shiftid"][long].tolist(), breaks["empid"][long].tolist(),
+                        np.where(lunch[long], "lunch", "break").tolist(),
+                        np.round(breaks["seconds"][long] / 60, 2).tolist()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="timeclockdb.db")
+    parser.add_argument("--from", dest="start", help="first shift date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last shift date, YYYY-MM-DD")
+    parser.add_argument("--weekly-hours", type=float, default=40)
+    parser.add_argument("--daily-hours", type=float)
+    args = parser.parse_args()
+
+    analytics = Analytics(Database(args.db))
+    print("Overtime")
+    for row in analytics.overtime(args.start, args.end, weekly_hours=args.weekly_hours, daily_hours=args.daily_hours):
+        print("  employee {} from {}: {} hours, {} overtime".format(*row))
+    print("Missed lunches")
+    for row in analytics.missed_lunches(args.start, args.end):
+        print("  shift {} employee {} on {}: {} hours".format(*row))
+    print("Long breaks")
+    for row in analytics.long_breaks(args.start, args.end):
+        print("  {3} {0} on shift {1} employee {2}: {4} minutes".format(*row))
+
+if __name__ == "__main__":
+    main()
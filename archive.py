@@ -0,0 +1,154 @@
+"""
+Hot/cold archival of closed pay periods.
+
+Moves every shift of a pay period, with its breaks, out of the live shifts and breaks tables into its own archive
+database file and registers the file in the archives table. Reports attach an archive only when their filters can
+match its period, see Database.report. The daily_hours rollup keeps its rows, so payroll summaries are unchanged.
+Shift and break ids are AUTOINCREMENT, so the ids of archived shifts are never handed out again.
+
+The archive file is written and committed before the live rows are deleted, so an interrupted job leaves either an
+unregistered archive file that the next run replaces, or a completed archive.
+
+Usage:
+    python archive.py [--db timeclockdb.db] [--dir archive] --from 2022-10-01 --to 2022-10-15
+    python archive.py [--db timeclockdb.db] --list
+"""
+import argparse
+import os
+import time
+
+from db import Database
+from report import work_date
+
+#Schema of an archive file, the live shifts and breaks tables without the employee foreign keys. Indexes are created
+#after the rows are copied
+ARCHIVE_TABLES = [
+    """CREATE TABLE {schema}.shifts (
+        shiftid INTEGER PRIMARY KEY,
+        empid INTEGER,
+        shift_start INTEGER,
+        shift_end INTEGER,
+        utc_offset INTEGER NOT NULL DEFAULT 0,
+        work_date INTEGER)""",
+
+    """CREATE TABLE {schema}.breaks (
+        breakid INTEGER PRIMARY KEY,
+        empid INTEGER,
+        shiftid INTEGER,
+        breaktype TEXT NOT NULL CHECK (breaktype IN ("lunch","break")),
+        break_start INTEGER,
+        break_end INTEGER,
+        utc_offset INTEGER NOT NULL DEFAULT 0)""",
+]
+
+ARCHIVE_INDEXES = [
+    "CREATE INDEX {schema}.idx_shifts_empid_start ON shifts(empid, shift_start)",
+    "CREATE INDEX {schema}.idx_shifts_start ON shifts(shift_start)",
+    "CREATE INDEX {schema}.idx_shifts_work_date ON shifts(work_date)",
+    "CREATE INDEX {schema}.idx_shifts_empid_work_date ON shifts(empid, work_date)",
+    "CREATE INDEX {schema}.idx_breaks_shiftid ON breaks(shiftid)",
+]
+
+SHIFT_COLUMNS = "shiftid, empid, shift_start, shift_end, utc_offset, work_date"
+BREAK_COLUMNS = "breakid, empid, shiftid, breaktype, break_start, break_end, utc_offset"
+
+def archive_period(db, start, end, directory="archive"):
+    """
+    Function to move the shifts of a closed pay period and their breaks into a new archive file
+
+    Args:
+        db (Database): live database
+        start (str): first shift date of the period, "YYYY-MM-DD"
+        end (str): last shift date of the period, "YYYY-MM-DD"
+        directory (str): directory for archive files, relative to the database's directory
+
+    Returns:
+        path (str) : archive file written, None when the period has no shifts
+        count (int) : number of shifts archived
+
+    Raises:
+        ValueError: the period overlaps an archived period or still has open shifts or breaks
+    """
+    first, last = work_date(start), work_date(end)
+    conn = db.conn
+    overlap = conn.execute("SELECT path FROM archives WHERE first_date <= ? AND last_date >= ?", (last, first)).fetchone()
+    if overlap is not None:
+        raise ValueError(f"{start} to {end} overlaps the period archived in {overlap[0]}")
+    still_open = conn.execute("""SELECT COUNT(*) FROM shifts
+        WHERE work_date BETWEEN ? AND ?
+        AND (shift_end IS NULL OR EXISTS (SELECT 1 FROM breaks WHERE breaks.shiftid = shifts.shiftid AND break_end IS NULL))""",
+        (first, last)).fetchone()[0]
+    if still_open:
+        raise ValueError(f"{still_open} shifts from {start} to {end} are still open")
+    if conn.execute("SELECT 1 FROM shifts WHERE work_date BETWEEN ? AND ? LIMIT 1", (first, last)).fetchone() is None:
+        return None, 0
+
+    relative = os.path.join(directory, f"timeclock_{first}_{last}.db")
+    path = os.path.join(os.path.dirname(os.path.abspath(db.db)), relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    #left over from an interrupted run, it was never registered
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn.execute("ATTACH DATABASE ? AS archive_job", (path,))
+    try:
+        #copy into the archive file and commit it on its own, before touching the live tables
+        conn.execute("BEGIN")
+        try:
+            for statement in ARCHIVE_TABLES:
+                conn.execute(statement.format(schema="archive_job"))
+            conn.execute(f"""INSERT INTO archive_job.shifts ({SHIFT_COLUMNS})
+                SELECT {SHIFT_COLUMNS} FROM main.shifts WHERE work_date BETWEEN ? AND ?""", (first, last))
+            conn.execute(f"""INSERT INTO archive_job.breaks ({BREAK_COLUMNS})
+                SELECT {BREAK_COLUMNS} FROM main.breaks WHERE shiftid IN (SELECT shiftid FROM archive_job.shifts)""")
+            for statement in ARCHIVE_INDEXES:
+                conn.execute(statement.format(schema="archive_job"))
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        conn.execute("ANALYZE archive_job")
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count, first_shiftid, last_shiftid = conn.execute(
+                "SELECT COUNT(*), MIN(shiftid), MAX(shiftid) FROM archive_job.shifts").fetchone()
+            #registered first, so the rollup delete triggers leave the period's daily_hours rows in place
+            conn.execute("""INSERT INTO archives (path, first_date, last_date, first_shiftid, last_shiftid, shifts, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""", (relative, first, last, first_shiftid, last_shiftid, count, int(time.time())))
+            conn.execute("DELETE FROM main.breaks WHERE shiftid IN (SELECT shiftid FROM archive_job.shifts)")
+            conn.execute("DELETE FROM main.shifts WHERE shiftid IN (SELECT shiftid FROM archive_job.shifts)")
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE archive_job")
+    if db.report_cache is not None:
+        db.report_cache.clear()
+    return path, count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    parser.add_argument("--dir", default="archive", help="archive directory, relative to the database's directory")
+    parser.add_argument("--from", dest="start", help="first shift date of the pay period, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last shift date of the pay period, YYYY-MM-DD")
+    parser.add_argument("--list", action="store_true", help="list archived periods")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.list:
+        for path, first, last, first_shiftid, last_shiftid, count in db.archives():
+            print(f"{first}-{last}  shifts {first_shiftid}-{last_shiftid} ({count})  {path}")
+    elif args.start and args.end:
+        path, count = archive_period(db, args.start, args.end, args.dir)
+        print(f"archived {count} shifts to {path}" if path else "no shifts in that period")
+    else:
+        parser.error("--from and --to are required unless --list is given")
+    db.close()
+
+if __name__ == "__main__":
+    main()
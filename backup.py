@@ -0,0 +1,314 @@
+"""
+Online snapshots of the live database.
+
+A snapshot is a complete, consistent copy of timeclockdb.db written with SQLite's online backup API through
+Database.backup, a few pages at a time with short sleeps in between, so kiosks keep punching at their usual latency
+while it runs. Snapshots are named by the local time they were taken and kept in a directory next to the database.
+Every new snapshot is checked before older ones are pruned: the newest --keep snapshots are kept, plus the newest
+snapshot of each of the last --days days.
+
+Pass a SnapshotSchedule as Database(..., snapshots=SnapshotSchedule()) to take snapshots in the background while the
+database is open, or run the snapshot command from a scheduler. Archive files are not copied, as they never change
+once written, see archive.py.
+
+Restore with SimpleTime stopped. The database being replaced is saved next to it as <db>.pre-restore first.
+
+Usage:
+    python backup.py snapshot [--db timeclockdb.db] [--dir backups] [--keep 24] [--days 14]
+    python backup.py list [--db timeclockdb.db] [--dir backups]
+    python backup.py verify SNAPSHOT
+    python backup.py restore SNAPSHOT [--db timeclockdb.db] [--journal timeclockdb.journal]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+
+from db import BACKUP_PAGES, BACKUP_PAUSE, MIGRATIONS, Database
+
+#Snapshot file names, parsed back to the time the snapshot was taken
+SNAPSHOT_NAME = "timeclock_%Y%m%d_%H%M%S.db"
+
+#Default retention, the newest KEEP snapshots plus the newest snapshot of each of the last DAYS days
+KEEP = 24
+DAYS = 14
+
+#Seconds between scheduled snapshots, and before a failed scheduled snapshot is tried again
+SNAPSHOT_INTERVAL = 3600
+RETRY_INTERVAL = 300
+
+def snapshot_dir(db_path, directory="backups"):
+    """
+    Function to resolve a snapshot directory relative to the database's directory, like archive.py does
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), directory)
+
+def snapshot(db, directory="backups", keep=KEEP, days=DAYS, pages=BACKUP_PAGES, pause=BACKUP_PAUSE, progress=None):
+    """
+    Function to take a snapshot of the live database, check it and prune older snapshots
+
+    Args:
+        db (Database): live database
+        directory (str): snapshot directory, relative to the database's directory
+        keep (int): number of newest snapshots always kept
+        days (int): days for which the newest snapshot of each day is kept
+        pages (int): pages copied per backup step, see Database.backup
+        pause (float): seconds slept between backup steps
+        progress (callable): called with (pages copied, total pages) after each step
+
+    Returns:
+        path (str) : snapshot file written
+
+    Raises:
+        sqlite3.DatabaseError: the snapshot failed its check. It is removed and no snapshot is pruned
+    """
+    directory = snapshot_dir(db.db, directory)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, datetime.now().strftime(SNAPSHOT_NAME))
+    db.backup(path, pages, pause, progress)
+    #quick_check reads every page but skips the index cross checks, so it costs about as much as the copy
+    problems = verify(path, quick=True)
+    if problems:
+        os.remove(path)
+        raise sqlite3.DatabaseError(f"snapshot {path} failed its check: {problems[0]}")
+    prune(directory, keep, days)
+    return path
+
+def snapshots(directory):
+    """
+    Function to list the snapshots in a directory
+
+    Returns:
+        snapshots (list) : (taken, path) tuples, newest first. taken is a local datetime
+    """
+    found = []
+    if not os.path.isdir(directory):
+        return found
+    for name in os.listdir(directory):
+        try:
+            taken = datetime.strptime(name, SNAPSHOT_NAME)
+        except ValueError:
+            continue
+        found.append((taken, os.path.join(directory, name)))
+    found.sort(reverse=True)
+    return found
+
+def prune(directory, keep=KEEP, days=DAYS, now=None):
+    """
+    Function to remove the snapshots outside the retention policy
+
+    Args:
+        directory (str): snapshot directory
+        keep (int): number of newest snapshots always kept
+        days (int): days for which the newest snapshot of each day is kept
+        now (datetime): local time the days are counted back from. Defaults to now
+
+    Returns:
+        removed (list) : paths of the removed snapshots
+    """
+    now = datetime.now() if now is None else now
+    kept_days = set()
+    removed = []
+    for index, (taken, path) in enumerate(snapshots(directory)):
+        if index < keep or (now - taken < timedelta(days=days) and taken.date() not in kept_days):
+            kept_days.add(taken.date())
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+def verify(path, quick=False):
+    """
+    Function to check a snapshot can be restored, without changing it
+
+    Args:
+        path (str): snapshot file
+        quick (bool): run PRAGMA quick_check rather than the slower integrity_check, which also checks every index
+            against its table
+
+    Returns:
+        problems (list) : description of each problem found, empty when the snapshot is sound
+    """
+    if not os.path.isfile(path):
+        return [f"{path} does not exist"]
+    problems = []
+    conn = sqlite3.connect("file:" + urllib.parse.quote(os.path.abspath(path)) + "?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check").fetchall()
+        problems.extend(row[0] for row in rows if row[0] != "ok")
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"employees", "shifts", "breaks"} <= tables:
+            problems.append("not a SimpleTime database, the employees, shifts or breaks table is missing")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > len(MIGRATIONS):
+            problems.append(f"schema version {version} is newer than this SimpleTime's {len(MIGRATIONS)}")
+        for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check"):
+            problems.append(f"{table} row {rowid} references a missing {parent} row")
+    except sqlite3.DatabaseError as e:
+        problems.append(str(e))
+    finally:
+        conn.close()
+    return problems
+
+def restore(path, db_path, journal=None, pages=BACKUP_PAGES):
+    """
+    Function to replace a database with a snapshot. SimpleTime must be stopped while restoring
+
+    The current database is first saved as db_path + ".pre-restore", then the snapshot is copied in through the
+    backup API, so the -wal file of the replaced database cannot be applied on top of the restored one.
+
+    Args:
+        path (str): snapshot file
+        db_path (str): database file to replace
+        journal (str): path of the punch journal used with the database, checked for punches not yet replayed
+        pages (int): pages copied per backup step
+
+    Raises:
+        ValueError: the snapshot failed verify, or the journal still holds punches
+    """
+    problems = verify(path)
+    if problems:
+        raise ValueError(f"{path} cannot be restored: {'; '.join(problems[:5])}")
+    if journal is not None and os.path.exists(journal) and os.path.getsize(journal):
+        raise ValueError(f"{journal} still holds punches. Open the database once to replay them before restoring")
+
+    if os.path.exists(db_path):
+        current = sqlite3.connect(db_path)
+        saved = sqlite3.connect(db_path + ".pre-restore")
+        try:
+            current.backup(saved, pages=pages)
+        finally:
+            saved.close()
+            current.close()
+    source = sqlite3.connect("file:" + urllib.parse.quote(os.path.abspath(path)) + "?mode=ro", uri=True)
+    target = sqlite3.connect(db_path)
+    try:
+        source.backup(target, pages=pages)
+        target.execute("PRAGMA journal_mode = WAL")
+    finally:
+        target.close()
+        source.close()
+
+class SnapshotSchedule:
+    """
+    SnapshotSchedule class taking snapshots on a background thread while a Database is open. The first snapshot is
+    due interval seconds after the newest one already in the directory, so restarting SimpleTime does not take extra
+    snapshots. Failures are recorded in errors and tried again after RETRY_INTERVAL seconds.
+
+    """
+
+    def __init__(self, directory="backups", interval=SNAPSHOT_INTERVAL, keep=KEEP, days=DAYS, pages=BACKUP_PAGES,
+                 pause=BACKUP_PAUSE):
+        """
+        Args:
+            directory (str): snapshot directory, relative to the database's directory
+            interval (float): seconds between snapshots
+            keep (int): number of newest snapshots always kept
+            days (int): days for which the newest snapshot of each day is kept
+            pages (int): pages copied per backup step, see Database.backup
+            pause (float): seconds slept between backup steps
+        """
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.days = days
+        self.pages = pages
+        self.pause = pause
+        #(local time, error) of each failed snapshot
+        self.errors = []
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self, db):
+        """
+        Function to start taking snapshots of db, called by Database when opened with snapshots
+        """
+        self.db = db
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """
+        Function to stop the schedule, abandoning a snapshot in progress
+        """
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        found = snapshots(snapshot_dir(self.db.db, self.directory))
+        due = time.time() + (self.interval - (datetime.now() - found[0][0]).total_seconds() if found else 0)
+        while not self.stopping.wait(max(due - time.time(), 0)):
+            try:
+                snapshot(self.db, self.directory, self.keep, self.days, self.pages, self.pause, self._cancel)
+                due = time.time() + self.interval
+            except Exception as e:
+                if self.stopping.is_set():
+                    break
+                self.errors.append((datetime.now(), repr(e)))
+                due = time.time() + min(self.interval, RETRY_INTERVAL)
+
+    def _cancel(self, copied, total):
+        #raising from the backup progress callback abandons the copy and removes the partial file
+        if self.stopping.is_set():
+            raise InterruptedError("snapshot abandoned, the database is closing")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("snapshot", help="snapshot the database and prune old snapshots")
+    command.add_argument("--db", default="timeclockdb.db", help="database file")
+    command.add_argument("--dir", default="backups", help="snapshot directory, relative to the database's directory")
+    command.add_argument("--keep", type=int, default=KEEP, help="number of newest snapshots always kept")
+    command.add_argument("--days", type=int, default=DAYS, help="days for which the newest snapshot of each day is kept")
+    command.add_argument("--pages", type=int, default=BACKUP_PAGES, help="pages copied per backup step")
+    command.add_argument("--pause", type=float, default=BACKUP_PAUSE, help="seconds slept between backup steps")
+
+    command = commands.add_parser("list", help="list snapshots, newest first")
+    command.add_argument("--db", default="timeclockdb.db", help="database file")
+    command.add_argument("--dir", default="backups", help="snapshot directory, relative to the database's directory")
+
+    command = commands.add_parser("verify", help="check a snapshot can be restored")
+    command.add_argument("snapshot", help="snapshot file")
+
+    command = commands.add_parser("restore", help="replace the database with a snapshot, with SimpleTime stopped")
+    command.add_argument("snapshot", help="snapshot file")
+    command.add_argument("--db", default="timeclockdb.db", help="database file")
+    command.add_argument("--journal", default="timeclockdb.journal", help="punch journal, must hold no punches")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        db = Database(args.db)
+        try:
+            start = time.perf_counter()
+            path = snapshot(db, args.dir, args.keep, args.days, args.pages, args.pause)
+            print(f"wrote {path} ({os.path.getsize(path) / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f} s")
+        finally:
+            db.close()
+    elif args.command == "list":
+        for taken, path in snapshots(snapshot_dir(args.db, args.dir)):
+            print(f"{taken:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 2**20:10.1f} MiB  {path}")
+    elif args.command == "verify":
+        problems = verify(args.snapshot)
+        for problem in problems:
+            print(problem)
+        print("ok" if not problems else f"{len(problems)} problems found")
+        return 1 if problems else 0
+    else:
+        try:
+            restore(args.snapshot, args.db, args.journal)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"restored {args.db} from {args.snapshot}, the replaced database is in {args.db}.pre-restore")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
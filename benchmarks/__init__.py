@@ -0,0 +1,3 @@
+"""
+Benchmarks for the SimpleTime database layer. Run each module from the repository root with python -m benchmarks.<name>
+"""
@@ -0,0 +1,114 @@
+"""
+Benchmark for the columnar analytics engine.
+
+Runs the overtime, missed lunch and long break checks over a generated database once as a SQL query with a Python loop
+over its rows and once with analytics.Analytics, checks both give the same answer and prints the times. The Analytics
+time is shown for the first (cold) load and for a query against an already loaded cache.
+
+Usage:
+    python -m benchmarks.analytics [--shifts 200000] [--data-dir bench_data] [--seed 0]
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from analytics import Analytics
+from benchmarks.generate import generate
+from db import Database
+
+
+def python_loop(db, weekly_hours=40, lunch_after=6, break_minutes=15, lunch_minutes=60):
+    """
+    Function to run the same checks as Analytics row by row over shifts joined with their breaks
+
+    Returns:
+        overtime (list) : see Analytics.overtime
+        missed (list) : see Analytics.missed_lunches
+        long (list) : see Analytics.long_breaks
+    """
+    rows = db.conn.execute("""SELECT shifts.shiftid, shifts.empid, shifts.shift_start, shifts.shift_end, shifts.work_date,
+        breaks.breakid, breaks.breaktype, breaks.break_start, breaks.break_end
+        FROM shifts
+        LEFT JOIN breaks
+        ON breaks.shiftid = shifts.shiftid AND breaks.break_end IS NOT NULL
+        WHERE shifts.shift_end IS NOT NULL
+        ORDER BY shifts.shiftid, breaks.breakid""")
+    weeks = defaultdict(int)
+    missed = []
+    long = []
+    shift = None
+    lunch = 0
+
+    def finish():
+        shiftid, empid, start, end, work_date = shift
+        day = date(work_date // 10000, work_date // 100 % 100, work_date % 100)
+        weeks[empid, day - timedelta(days=day.weekday())] += end - start - lunch
+        if end - start > lunch_after * 3600 and lunch == 0:
+            missed.append((shiftid, empid, day.isoformat(), round((end - start) / 3600, 2)))
+
+    for shiftid, empid, start, end, work_date, breakid, breaktype, break_start, break_end in rows:
+        if shift is None or shift[0] != shiftid:
+            if shift is not None:
+                finish()
+            shift = (shiftid, empid, start, end, work_date)
+            lunch = 0
+        if breakid is None:
+            continue
+        seconds = break_end - break_start
+        if breaktype == "lunch":
+            lunch += seconds
+        if seconds > (lunch_minutes if breaktype == "lunch" else break_minutes) * 60:
+            long.append((breakid, shiftid, empid, breaktype, round(seconds / 60, 2)))
+    if shift is not None:
+        finish()
+
+    overtime = []
+    for (empid, week), seconds in sorted(weeks.items()):
+        if seconds / 3600 > weekly_hours:
+            overtime.append((empid, week.isoformat(), round(seconds / 3600, 2), round(seconds / 3600 - weekly_hours, 2)))
+    return overtime, missed, long
+
+
+def checks(analytics):
+    return analytics.overtime(), analytics.missed_lunches(), analytics.long_breaks()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shifts", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="directory for generated databases")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f"workforce_{args.shifts}_{args.seed}.db")
+    if not os.path.exists(path):
+        generate(path, max(args.shifts // 250, 1), args.shifts, args.seed)
+    db = Database(path)
+
+    start = time.perf_counter()
+    expected = python_loop(db)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analytics = Analytics(db)
+    result = checks(analytics)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checks(analytics)
+    warm = time.perf_counter() - start
+    db.close()
+
+    if result != expected:
+        raise SystemExit("Analytics results differ from the Python loop")
+    print(f"{args.shifts} shifts: {len(result[0])} overtime weeks, {len(result[1])} missed lunches, {len(result[2])} long breaks")
+    print(f"SQL + Python loop  {loop * 1000:10.1f} ms")
+    print(f"Analytics cold     {cold * 1000:10.1f} ms  ({loop / cold:.1f}x)")
+    print(f"Analytics cached   {warm * 1000:10.1f} ms  ({loop / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
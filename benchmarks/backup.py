@@ -0,0 +1,144 @@
+"""
+Punch latency during an online backup.
+
+Builds a database of about --size-mb MiB, a generated workforce padded with filler rows, and runs kiosk threads
+punching start_shift/end_shift pairs against it in WAL mode. Punch latency is measured with nothing else running, while
+the file is copied under a write transaction the way a consistent file copy has to be taken, and while
+Database.backup copies it in one step and in its default page batches with pauses.
+
+Usage:
+    python -m benchmarks.backup [--size-mb 2048] [--kiosks 4] [--think 0.05] [--idle 10] [--data-dir bench_data]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.generate import generate
+from db import BACKUP_PAGES, BACKUP_PAUSE, Database
+
+#Filler row size used to pad the database, and rows inserted per transaction
+PAD_ROW = 2**20
+PAD_BATCH = 64
+
+def build(path, size_mb):
+    """
+    Function to generate a workforce database and pad it with filler rows to about size_mb MiB
+    """
+    generate(path, 400, 100000, 0)
+    db = Database(path)
+    conn = db.conn
+    conn.execute("CREATE TABLE bench_padding (data BLOB)")
+    while os.path.getsize(path) < size_mb * 2**20:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO bench_padding VALUES (randomblob(?))", [(PAD_ROW,)] * PAD_BATCH)
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+
+def measure(path, kiosks, think, work, seconds=None):
+    """
+    Function to time punches from kiosks threads while work runs, or for seconds when work is None
+
+    Returns:
+        latencies (list) : seconds taken by each punch
+        failures (int) : punches that raised
+        elapsed (float) : seconds work took
+    """
+    db = Database(path)
+    for i in range(kiosks):
+        if db.login(f"kiosk{i}", "bench") is None:
+            db.register(f"kiosk{i}", "Kiosk", str(i), "bench", 0)
+    empids = [db.login(f"kiosk{i}", "bench")[0] for i in range(kiosks)]
+    latencies = []
+    failures = [0]
+    done = threading.Event()
+
+    def kiosk(empid):
+        while not done.is_set():
+            for punch in ("start", "end"):
+                start = time.perf_counter()
+                try:
+                    if punch == "start":
+                        shiftid = db.start_shift(empid)
+                    else:
+                        db.end_shift(shiftid)
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    failures[0] += 1
+                    break
+                time.sleep(think)
+
+    threads = [threading.Thread(target=kiosk, args=(empid,)) for empid in empids]
+    for thread in threads:
+        thread.start()
+    #let every kiosk reach its steady state first
+    time.sleep(1)
+    start = time.perf_counter()
+    if work is None:
+        time.sleep(seconds)
+    else:
+        work(db)
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+    return latencies, failures[0], elapsed
+
+def copy_locked(path, target):
+    """
+    Function to take a consistent plain file copy, holding a write transaction so no punch lands mid copy
+    """
+    def work(db):
+        conn = db._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("BEGIN IMMEDIATE")
+        shutil.copyfile(path, target)
+        conn.rollback()
+        conn.close()
+    return work
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048, help="approximate database size")
+    parser.add_argument("--kiosks", type=int, default=4, help="number of punching threads")
+    parser.add_argument("--think", type=float, default=0.05, help="seconds each kiosk waits between punches")
+    parser.add_argument("--idle", type=float, default=10, help="seconds measured without a backup")
+    parser.add_argument("--data-dir", default="bench_data")
+    args = parser.parse_args()
+
+    source = os.path.join(args.data_dir, f"backup_{args.size_mb}.db")
+    if not os.path.exists(source):
+        os.makedirs(args.data_dir, exist_ok=True)
+        build(source, args.size_mb)
+    scratch = tempfile.mkdtemp(dir=args.data_dir)
+    path = os.path.join(scratch, "live.db")
+    target = os.path.join(scratch, "snapshot.db")
+    shutil.copyfile(source, path)
+    print(f"{os.path.getsize(path) / 2**20:.0f} MiB database, {args.kiosks} kiosks punching every {args.think * 1000:.0f} ms")
+
+    cases = [
+        ("no backup", None),
+        ("file copy, locked", copy_locked(path, target)),
+        ("backup, one step", lambda db: db.backup(target, pages=-1, pause=0)),
+        (f"backup, {BACKUP_PAGES} pages + {BACKUP_PAUSE * 1000:g} ms", lambda db: db.backup(target)),
+    ]
+    try:
+        for name, work in cases:
+            latencies, failures, elapsed = measure(path, args.kiosks, args.think, work, args.idle)
+            latencies.sort()
+            p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] if latencies else 0
+            print(f"{name:<28} {elapsed:7.1f} s  punches {len(latencies):6d}  failed {failures:3d}  "
+                  f"p50 {statistics.median(latencies) * 1000 if latencies else 0:8.2f} ms  p99 {p99 * 1000:8.2f} ms  "
+                  f"max {latencies[-1] * 1000 if latencies else 0:8.2f} ms")
+            if os.path.exists(target):
+                os.remove(target)
+    finally:
+        shutil.rmtree(scratch)
+
+if __name__ == "__main__":
+    main()
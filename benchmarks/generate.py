@@ -0,0 +1,113 @@
+"""
+Deterministic synthetic workforce generator.
+
+Creates a timeclockdb.db-compatible database with N employees and M shifts, with punch times in UTC. Each employee works one shift per
+working day starting between 06:00 and 10:00 and lasting 4 to 10 hours. Shifts over 4 hours get a 10-15 minute
+break, shifts over 6 hours also get a 30-60 minute lunch and a second break. The same arguments and seed always
+produce the same database.
+
+Usage:
+    python -m benchmarks.generate out.db --shifts 1000000 [--employees 4000] [--seed 0]
+"""
+import argparse
+import calendar
+import os
+import random
+import time
+
+from bulk import deferred_indexes
+from db import Database
+
+START_DATE = "2020-01-06"
+BATCH = 100000
+INSERT_SHIFT = "INSERT INTO shifts (shiftid, empid, shift_start, shift_end, utc_offset, work_date) VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_BREAK = "INSERT INTO breaks (empid, shiftid, breaktype, break_start, break_end, utc_offset) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def punches(employees, shifts, seed=0):
+    """
+    Generator over synthetic shifts in shiftid order
+
+    Yields:
+        shift (tuple) : (shiftid, empid, shift_start, shift_end, utc_offset, work_date)
+        breaks (list) : (empid, shiftid, breaktype, break_start, break_end, utc_offset) tuples for the shift
+    """
+    rng = random.Random(seed)
+    day = calendar.timegm(time.strptime(START_DATE, "%Y-%m-%d"))
+    shiftid = 0
+    while shiftid < shifts:
+        date = int(time.strftime("%Y%m%d", time.gmtime(day)))
+        #skip weekends, START_DATE is a Monday
+        if (day // 86400 - 4) % 7 < 5:
+            for empid in range(1, employees + 1):
+                shiftid += 1
+                if shiftid > shifts:
+                    return
+                start = day + rng.randrange(6 * 3600, 10 * 3600, 60)
+                length = rng.randrange(4 * 3600, 10 * 3600, 60)
+                breaks = []
+                if length > 4 * 3600:
+                    at = start + rng.randrange(90 * 60, 150 * 60, 60)
+                    breaks.append((empid, shiftid, "break", at, at + rng.randrange(10 * 60, 16 * 60, 60), 0))
+                if length > 6 * 3600:
+                    at = start + length // 2 - rng.randrange(0, 30 * 60, 60)
+                    breaks.append((empid, shiftid, "lunch", at, at + rng.randrange(30 * 60, 61 * 60, 60), 0))
+                    at = start + length - rng.randrange(90 * 60, 120 * 60, 60)
+                    breaks.append((empid, shiftid, "break", at, at + rng.randrange(10 * 60, 16 * 60, 60), 0))
+                yield (shiftid, empid, start, start + length, 0, date), breaks
+        day += 86400
+
+
+def generate(path, employees, shifts, seed=0, progress=None):
+    """
+    Function to create a database at path filled with synthetic employees and shifts. Any existing file is replaced.
+    Employee i has username "emp<i>" and password "pw"; employee 1 is an admin.
+
+    Args:
+        path (str): database file to create
+        employees (int): number of employees
+        shifts (int): number of shifts
+        seed (int): random seed
+        progress (callable): called with the number of shifts written so far after every batch
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(path)
+    conn = db.conn
+    conn.executemany("INSERT INTO employees VALUES (?, ?, ?, ?, 'pw', ?)",
+        ((i, f"emp{i}", f"First{i}", f"Last{i}", int(i == 1)) for i in range(1, employees + 1)))
+    conn.commit()
+
+    with deferred_indexes(conn, ("shifts", "breaks")):
+        shift_rows = []
+        break_rows = []
+        for shift, breaks in punches(employees, shifts, seed):
+            shift_rows.append(shift)
+            break_rows.extend(breaks)
+            if len(shift_rows) == BATCH:
+                conn.executemany(INSERT_SHIFT, shift_rows)
+                conn.executemany(INSERT_BREAK, break_rows)
+                if progress is not None:
+                    progress(shift[0])
+                shift_rows.clear()
+                break_rows.clear()
+        conn.executemany(INSERT_SHIFT, shift_rows)
+        conn.executemany(INSERT_BREAK, break_rows)
+    conn.execute("ANALYZE")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--shifts", type=int, default=10000)
+    parser.add_argument("--employees", type=int, help="defaults to one employee per 250 shifts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.employees or max(args.shifts // 250, 1), args.shifts, args.seed,
+             progress=lambda count: print(f"{count} shifts"))
+
+
+if __name__ == "__main__":
+    main()
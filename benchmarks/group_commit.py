@@ -0,0 +1,66 @@
+"""
+Benchmark for Database group commit mode.
+
+Simulates a shift change: many kiosk threads punching in and out at once against a fresh database file, once with a
+commit per punch and once with group commit. Prints punches per second for each mode.
+
+Usage:
+    python -m benchmarks.group_commit [--terminals 50] [--punches 40] [--synchronous FULL]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from db import Database
+
+
+def run(path, terminals, punches, **options):
+    """
+    Function to time terminals threads each making punches start_shift/end_shift pairs
+
+    Returns:
+        rate (float) : punches per second
+    """
+    db = Database(path, **options)
+    for i in range(terminals):
+        db.register(f"bench{i}", "Bench", str(i), "bench", 0)
+
+    def kiosk(empid):
+        for _ in range(punches // 2):
+            shiftid = db.start_shift(empid)
+            db.end_shift(shiftid)
+
+    threads = [threading.Thread(target=kiosk, args=(empid,)) for empid in range(1, terminals + 1)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    db.close()
+    return terminals * (punches // 2) * 2 / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=50, help="number of concurrent kiosk threads")
+    parser.add_argument("--punches", type=int, default=40, help="punches per kiosk")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous used for both runs")
+    parser.add_argument("--interval", type=int, default=10, help="group commit interval in milliseconds")
+    parser.add_argument("--batch", type=int, default=200, help="group commit batch size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = run(os.path.join(tmp, "single.db"), args.terminals, args.punches, synchronous=args.synchronous)
+        grouped = run(os.path.join(tmp, "grouped.db"), args.terminals, args.punches, synchronous=args.synchronous,
+                      group_commit=True, commit_interval=args.interval, commit_batch=args.batch)
+
+    print(f"{args.terminals} terminals x {args.punches} punches, synchronous={args.synchronous}")
+    print(f"commit per punch: {single:10.0f} punches/s")
+    print(f"group commit:     {grouped:10.0f} punches/s ({grouped / single:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Load test for server.py.
+
+Starts a server on a fresh database with one employee per terminal, then has every terminal log in and run full
+punch cycles (clock in, break, lunch, clock out) concurrently over keep-alive connections. Prints p50/p99 punch
+latency and overall punches per second.
+
+Usage:
+    python -m benchmarks.loadtest [--terminals 500] [--cycles 4] [--url http://127.0.0.1:8080]
+
+With --url the test runs against an already running server whose database has users load0..loadN-1 with password
+"load", for example one prepared with --setup.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from db import Database
+
+CYCLE = ("clock_in", "take_break", "end_break", "take_lunch", "end_lunch", "clock_out")
+
+
+def setup(path, terminals):
+    """
+    Function to register the load test users in the database at path
+    """
+    db = Database(path)
+    for i in range(terminals):
+        db.register(f"load{i}", "Load", str(i), "load", 0)
+    db.close()
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: timeclock\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def terminal(host, port, number, cycles, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, response = await request(reader, writer, "POST", "/login", {"username": f"load{number}", "password": "load"})
+        if status != 200:
+            errors.append(response)
+            return
+        token = response["token"]
+        for _ in range(cycles):
+            for action in CYCLE:
+                start = time.perf_counter()
+                status, response = await request(reader, writer, "POST", "/punch", {"token": token, "action": action})
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(response)
+    finally:
+        writer.close()
+
+
+async def run(host, port, terminals, cycles):
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(terminal(host, port, i, cycles, latencies, errors) for i in range(terminals)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def wait_for(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=500, help="number of concurrent terminals")
+    parser.add_argument("--cycles", type=int, default=4, help="punch cycles per terminal")
+    parser.add_argument("--url", help="run against an existing server instead of starting one")
+    parser.add_argument("--setup", metavar="DB", help="only register the load test users in DB and exit")
+    args = parser.parse_args()
+
+    if args.setup:
+        setup(args.setup, args.terminals)
+        return
+
+    server = None
+    tmp = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "loadtest.db")
+        setup(path, args.terminals)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            host, port = sock.getsockname()
+        server = subprocess.Popen([sys.executable, "server.py", "--db", path, "--host", host, "--port", str(port)])
+        wait_for(host, port)
+
+    try:
+        latencies, errors, elapsed = asyncio.run(run(host, port, args.terminals, args.cycles))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            tmp.cleanup()
+
+    print(f"{args.terminals} terminals x {args.cycles} cycles: {len(latencies)} punches in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} punches/s), {len(errors)} errors")
+    print(f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms   p99 {percentile(latencies, 0.99) * 1000:.1f} ms   "
+          f"max {max(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
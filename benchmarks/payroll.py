@@ -0,0 +1,73 @@
+"""
+Scaling benchmark for the parallel payroll run.
+
+Times the one-employee-at-a-time baseline, Database.shift_report(empid, "") for every employee in a single process,
+against payroll.run_payroll with 1, 2, 4 and 8 worker processes on a generated database, and checks every run writes
+the same report. Speedups are bounded by the number of CPUs on the machine.
+
+Usage:
+    python -m benchmarks.payroll [--shifts 200000] [--workers 1 2 4 8] [--data-dir bench_data] [--seed 0]
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import time
+
+from benchmarks.generate import generate
+from db import Database
+from payroll import run_payroll
+from report import COLUMNS
+
+
+def serial(path):
+    """
+    Function to build the same report with one shift_report call per employee
+
+    Returns:
+        text (str) : CSV report
+    """
+    db = Database(path, read_only=True)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS[:7])
+    for (empid,) in db.conn.execute("SELECT empid FROM employees ORDER BY empid").fetchall():
+        writer.writerows(db.shift_report(empid, ""))
+    db.close()
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shifts", type=int, default=200000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="directory for generated databases")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f"workforce_{args.shifts}_{args.seed}.db")
+    if not os.path.exists(path):
+        generate(path, max(args.shifts // 250, 1), args.shifts, args.seed)
+    #bring the schema up to date before opening it read-only
+    Database(path).close()
+
+    start = time.perf_counter()
+    expected = hashlib.sha256(serial(path).encode()).hexdigest()
+    baseline = time.perf_counter() - start
+    print(f"{os.cpu_count()} CPUs, {args.shifts} shifts")
+    print(f"serial shift_report  {baseline * 1000:10.1f} ms")
+
+    for workers in args.workers:
+        out = io.StringIO()
+        start = time.perf_counter()
+        run_payroll(path, out, workers=workers)
+        elapsed = time.perf_counter() - start
+        if hashlib.sha256(out.getvalue().encode()).hexdigest() != expected:
+            raise SystemExit(f"report with {workers} workers differs from the serial report")
+        print(f"{workers} workers{'':<12}{elapsed * 1000:10.1f} ms  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark suite timing every Database method against generated databases of increasing size.
+
+For each size a database is generated with benchmarks.generate (cached in --data-dir and reused when it already
+exists) and each method is timed --repeat times. Results are written as JSON so runs from different releases can be
+compared; --compare exits with status 1 when any median regressed by more than --threshold.
+
+Usage:
+    python -m benchmarks.run [--sizes 10000 1000000 10000000] [--repeat 20] [--out results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+from benchmarks.generate import generate
+from db import Database
+from report import ReportQuery
+
+
+def cases(db, employees, shifts, rng):
+    """
+    Function to build the benchmark cases for a database. Each case is a callable taking no arguments; write cases
+    run against a scratch employee so repeated runs do not change the data being read.
+
+    Returns:
+        cases (dict) : case name to (callable, repeat cap) where a cap of None means use --repeat
+    """
+    empid = lambda: rng.randint(1, employees)
+    shiftid = lambda: rng.randint(1, shifts)
+    scratch = db.login("bench", "bench")[0]
+    open_shift = {}
+
+    def start_shift():
+        open_shift["shift"] = db.start_shift(scratch)
+
+    def start_break():
+        open_shift["break"] = db.start_break(scratch, open_shift["shift"])
+
+    def start_lunch():
+        open_shift["lunch"] = db.start_lunch(scratch, open_shift["shift"])
+
+    #keys listed by report_keys_last_name, read a window at a time by report_rows_window
+    report_keys = {}
+
+    def report_keys_last_name():
+        report_keys["shiftids"] = db.report_keys(ReportQuery(), "Last Name")[0]
+
+    def report_rows_window():
+        start = rng.randint(0, max(len(report_keys["shiftids"]) - 200, 0))
+        db.report_rows(ReportQuery(), report_keys["shiftids"][start:start + 200])
+
+    registered = iter(range(10 ** 9))
+    return {
+        "login": (lambda: db.login(f"emp{empid()}", "pw"), None),
+        "register": (lambda: db.register(f"bench{next(registered)}_{time.time_ns()}", "Bench", "Bench", "bench", 0), None),
+        "start_shift": (start_shift, None),
+        "start_break": (start_break, None),
+        "end_break": (lambda: db.end_break(open_shift["break"]), None),
+        "start_lunch": (start_lunch, None),
+        "end_lunch": (lambda: db.end_lunch(open_shift["lunch"]), None),
+        "end_shift": (lambda: db.end_shift(open_shift["shift"]), None),
+        "shift_report_all": (lambda: db.shift_report("", ""), 3),
+        "shift_report_empid": (lambda: db.shift_report(empid(), ""), None),
+        "shift_report_shiftid": (lambda: db.shift_report("", shiftid()), None),
+        "shift_report_empid_shiftid": (lambda: db.shift_report(empid(), shiftid()), None),
+        "shift_report_page_all": (lambda: db.shift_report_page("", "", None, 500), None),
+        "report_keys_last_name": (report_keys_last_name, 3),
+        "report_rows_window": (report_rows_window, None),
+        "payroll_summary_week": (lambda: db.payroll_summary("2020-01-06", "2020-01-31", "week"), 5),
+    }
+
+
+def run_size(path, shifts, repeat, seed):
+    employees = max(shifts // 250, 1)
+    if not os.path.exists(path):
+        print(f"generating {shifts} shifts for {employees} employees in {path}", file=sys.stderr)
+        generate(path, employees, shifts, seed)
+
+    db = Database(path)
+    if db.login("bench", "bench") is None:
+        db.register("bench", "Bench", "Bench", "bench", 0)
+    suite = cases(db, employees, shifts, random.Random(seed))
+    results = []
+    #cases run in dictionary order, which keeps each break and lunch inside the scratch shift
+    timings = {}
+    for _ in range(repeat):
+        for name, (case, cap) in suite.items():
+            if cap is not None and len(timings.get(name, ())) >= cap:
+                continue
+            start = time.perf_counter()
+            case()
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+    for name, samples in timings.items():
+        samples.sort()
+        results.append({
+            "size": shifts,
+            "method": name,
+            "runs": len(samples),
+            "min": samples[0],
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)],
+        })
+        print(f"{shifts:>10} {name:<28} median {statistics.median(samples) * 1000:10.3f} ms", file=sys.stderr)
+    db.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Function to print median ratios against a baseline result file
+
+    Returns:
+        regressed (bool) : True when any median is more than threshold times slower than the baseline
+    """
+    previous = {(row["size"], row["method"]): row["median"] for row in baseline["results"]}
+    regressed = False
+    for row in results:
+        before = previous.get((row["size"], row["method"]))
+        if before is None:
+            continue
+        ratio = row["median"] / before
+        flag = ""
+        if ratio > threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"{row['size']:>10} {row['method']:<28} {ratio:6.2f}x{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000, 10000000], help="shift counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per method")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="directory for generated databases")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="baseline JSON results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="median ratio counted as a regression")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for size in args.sizes:
+        path = os.path.join(args.data_dir, f"workforce_{size}_{args.seed}.db")
+        results.extend(run_size(path, size, args.repeat, args.seed))
+
+    with open(args.out, "w") as out:
+        json.dump({
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "results": results,
+        }, out, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
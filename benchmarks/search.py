@@ -0,0 +1,81 @@
+"""
+Employee search benchmark.
+
+Fills a scratch database with --employees synthetic employees with pronounceable names, then times
+Database.search_employees for type-ahead prefixes of one to four characters and for two-word searches, against a
+LIKE '%text%' scan over the same columns as a baseline.
+
+Usage:
+    python -m benchmarks.search [--employees 100000] [--queries 200] [--seed 0]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from db import Database
+
+SYLLABLES = ["an", "bel", "car", "da", "el", "fer", "gar", "hal", "is", "jo", "ka", "lin", "mar", "no", "or", "pe",
+             "qui", "ro", "sa", "ta", "ul", "ve", "wil", "xa", "yo", "zu"]
+
+def name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+def populate(db, employees, rng):
+    """
+    Function to insert synthetic employees in one transaction
+
+    Returns:
+        names (list) : (firstname, lastname) of every employee
+    """
+    names = [(name(rng), name(rng)) for _ in range(employees)]
+    db.conn.execute("BEGIN")
+    db.conn.executemany("INSERT INTO employees VALUES (NULL, ?, ?, ?, 'pw', 0)",
+        ((f"{first[0]}{last}{i}".lower(), first, last) for i, (first, last) in enumerate(names)))
+    db.conn.commit()
+    return names
+
+def like(db, text, limit=20):
+    """
+    Function to search employees the way the report screen would without the index
+    """
+    pattern = f"%{text}%"
+    return db.conn.execute("""SELECT empid, username, firstname, lastname FROM employees
+        WHERE username LIKE ? OR firstname LIKE ? OR lastname LIKE ?
+        ORDER BY lastname, firstname LIMIT ?""", (pattern, pattern, pattern, limit)).fetchall()
+
+def timed(func, texts):
+    samples = []
+    for text in texts:
+        start = time.perf_counter()
+        func(text)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "search.db"))
+        start = time.perf_counter()
+        names = populate(db, args.employees, rng)
+        print(f"inserted {args.employees} employees in {time.perf_counter() - start:.2f} s, index kept in sync by triggers")
+
+        cases = {f"prefix {length}": [rng.choice(rng.choice(names))[:length] for _ in range(args.queries)] for length in (1, 2, 3, 4)}
+        cases["two words"] = [f"{first[:3]} {last[:2]}" for first, last in (rng.choice(names) for _ in range(args.queries))]
+        for case, texts in cases.items():
+            fts = timed(db.search_employees, texts)
+            scan = timed(lambda text: like(db, text), texts)
+            print(f"{case:<10} search_employees median {fts[0]:7.2f} ms p95 {fts[1]:7.2f} ms   LIKE median {scan[0]:7.2f} ms p95 {scan[1]:7.2f} ms")
+        db.close()
+
+if __name__ == "__main__":
+    main()
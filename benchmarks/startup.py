@@ -0,0 +1,121 @@
+"""
+Cold start benchmark for the headless command line.
+
+Runs each cli.py command in a fresh interpreter --repeat times against a copy of a generated database and compares the
+median wall time with its budget. The commands are also run once with -X importtime to check that tkinter is never
+imported. Exits with status 1 when a budget is exceeded or tkinter was imported.
+
+Usage:
+    python -m benchmarks.startup [--shifts 10000] [--repeat 20] [--data-dir bench_data] [--budget-scale 1.0]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import generate
+from db import Database
+from service import Session
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Median wall time budget of each command in milliseconds, interpreter start included
+BUDGETS = {
+    "help": 100,
+    "status": 200,
+    "punch": 200,
+    "report_employee": 200,
+}
+
+def commands(path):
+    """
+    Function to build the command line of each case
+
+    Returns:
+        commands (dict) : case name to cli.py arguments
+    """
+    user = ["--user", "bench", "--password", "bench"]
+    return {
+        "help": ["--help"],
+        "status": ["--db", path, "status"] + user,
+        #alternates between clocking in and out, so every run records a punch
+        "punch": ["--db", path, "punch", "in"] + user,
+        "report_employee": ["--db", path, "report", "--emp", "1", "--from", "2020-01-06", "--to", "2020-01-31"],
+    }
+
+def run(arguments, importtime=False):
+    """
+    Function to run cli.py in a new interpreter
+
+    Returns:
+        seconds (float) : wall time
+        result (CompletedProcess) : the finished process
+    """
+    interpreter = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    start = time.perf_counter()
+    result = subprocess.run(interpreter + [os.path.join(ROOT, "cli.py")] + arguments, cwd=ROOT, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shifts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. for slow machines")
+    args = parser.parse_args()
+
+    source = os.path.join(args.data_dir, f"workforce_{args.shifts}_0.db")
+    if not os.path.exists(source):
+        os.makedirs(args.data_dir, exist_ok=True)
+        generate(source, max(args.shifts // 250, 1), args.shifts, 0)
+    scratch = tempfile.mkdtemp()
+    path = os.path.join(scratch, "startup.db")
+    shutil.copy(source, path)
+    db = Database(path)
+    if db.login("bench", "bench") is None:
+        db.register("bench", "Bench", "Bench", "bench", 0)
+    #start clocked out, so the punch case can alternate clocking in and out
+    row = db.login("bench", "bench")
+    session = Session(db, row[0], row[2], row[3], row[5]).resume(*row[6:9])
+    if session.onbreak:
+        session.end_break()
+    if session.onlunch:
+        session.end_lunch()
+    if session.working:
+        session.clock_out()
+    db.close()
+
+    failed = False
+    try:
+        for name, arguments in commands(path).items():
+            _, result = run(arguments, importtime=True)
+            if "tkinter" in result.stderr:
+                print(f"{name}: imports tkinter")
+                failed = True
+            samples = []
+            for _ in range(args.repeat):
+                if name == "punch":
+                    arguments[3] = "out" if arguments[3] == "in" else "in"
+                seconds, result = run(arguments)
+                if result.returncode != 0:
+                    print(f"{name}: exited {result.returncode}: {result.stderr.strip()}")
+                    failed = True
+                    break
+                samples.append(seconds)
+            if not samples:
+                continue
+            median = statistics.median(samples) * 1000
+            budget = BUDGETS[name] * args.budget_scale
+            flag = "" if median <= budget else "  OVER BUDGET"
+            failed = failed or median > budget
+            print(f"{name:<16} median {median:8.1f} ms  budget {budget:6.0f} ms{flag}")
+    finally:
+        shutil.rmtree(scratch)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Bulk export and import of shifts and breaks.
+
+Exports stream one row per shift and break as CSV or JSON Lines in constant memory, for the nightly payroll dump,
+including the shifts of archived periods. Imports load history from the same format with executemany in large
+transactions, for migrating in old time clock data. Timestamps in both directions are "YYYY-MM-DD HH:MM:SS" local time, converted to and from the stored UTC.
+
+Usage:
+    python bulk.py export [--db timeclockdb.db] [--from 2022-10-01] [--to 2022-10-15] [--emp 1 --emp 2] [--format jsonl] out.csv
+    python bulk.py import [--db timeclockdb.db] [--format jsonl] in.csv
+"""
+import argparse
+import csv
+import heapq
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from db import Database, local_clock
+from report import ReportQuery, work_date
+
+#Columns of exported rows and of rows accepted by import_shifts
+COLUMNS = ("empid", "firstname", "lastname", "shiftid", "shift_start", "shift_end", "breakid", "breaktype", "break_start", "break_end")
+
+
+@contextmanager
+def deferred_indexes(conn, tables):
+    """
+    Context manager running a bulk load in one transaction with the plain secondary indexes on tables dropped, and
+    rebuilding them before it commits, which is much faster than maintaining them row by row. Unique and partial
+    indexes are kept, as punches and journal replay depend on them. Other connections never see the indexes missing,
+    and the whole load is rolled back if it raises or the process dies, so the load itself must not commit.
+
+    Args:
+        conn (Connection): connection the load runs on
+        tables (tuple): names of the tables being loaded
+    """
+    indexes = []
+    for table in tables:
+        for _, name, unique, origin, partial in conn.execute(f"PRAGMA index_list({table})").fetchall():
+            if not unique and not partial and origin == "c":
+                indexes.append((name, conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()[0]))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name, sql in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        yield
+        for name, sql in indexes:
+            conn.execute(sql)
+        conn.commit()
+    except:
+        conn.rollback()
+        raise
+
+
+def parse_local(text):
+    """
+    Function to convert an exported "YYYY-MM-DD HH:MM:SS" local time into the stored (utc, utc_offset, work_date)
+
+    Returns:
+        punch (tuple) : see db.clock, (None, None, None) for an empty value
+    """
+    if not text:
+        return None, None, None
+    return local_clock(datetime.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+def iter_shifts(db, start=None, end=None, empids=None, batch=1000):
+    """
+    Generator over shifts with their breaks, one dict per break (or per shift without breaks) in COLUMNS layout.
+    Shifts of archived periods are read from their archive files, see archive.py. Shifts are read batch at a time,
+    keyed on (shift_start, shiftid) like Database.report_page, so memory use does not grow with the result.
+
+    Args:
+        db (Database): database to export from
+        start (str): first shift date to include, "YYYY-MM-DD", None for no lower bound
+        end (str): last shift date to include, "YYYY-MM-DD", None for no upper bound
+        empids (list): employee ids to include, None for all employees
+        batch (int): shifts read from SQLite at a time
+
+    Yields:
+        row (dict) : shift and break columns
+    """
+    query = ReportQuery(empids=empids, start=start, end=end)
+    where = []
+    params = []
+    if start is not None:
+        where.append("shifts.work_date >= ?")
+        params.append(work_date(start))
+    if end is not None:
+        where.append("shifts.work_date <= ?")
+        params.append(work_date(end))
+    if empids is not None:
+        where.append("shifts.empid IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(query.empids))
+
+    after = None
+    while True:
+        clauses = where + (["(shifts.shift_start, shifts.shiftid) > (?, ?)"] if after is not None else [])
+        clause = "WHERE " + " AND ".join(clauses) if clauses else ""
+        page_params = params + (list(after) if after is not None else []) + [batch]
+        parts = []
+        for schemas in db._sources(query):
+            sql = "\nUNION ALL\n".join(f"""SELECT employees.empid, employees.firstname, employees.lastname, page.shiftid,
+                datetime(page.shift_start + page.utc_offset,'unixepoch'), datetime(page.shift_end + page.utc_offset,'unixepoch'),
+                breaks.breakid, breaks.breaktype, datetime(breaks.break_start + breaks.utc_offset,'unixepoch'),
+                datetime(breaks.break_end + breaks.utc_offset,'unixepoch'), page.shift_start
+                FROM (SELECT shifts.* FROM {schema}.shifts AS shifts {clause}
+                    ORDER BY shifts.shift_start, shifts.shiftid LIMIT ?) AS page
+                INNER JOIN main.employees AS employees
+                ON employees.empid = page.empid
+                LEFT JOIN {schema}.breaks AS breaks
+                ON breaks.shiftid = page.shiftid""" for schema in schemas)
+            parts.append(db.conn.execute(sql + "\nORDER BY 11, 4, 7", page_params * len(schemas)).fetchall())
+
+        #with archives each schema returns up to batch shifts, keep the first batch of the merged rows
+        shifts = set()
+        rows = []
+        for row in heapq.merge(*parts, key=lambda row: (row[10], row[3], row[6] or 0)):
+            if row[3] not in shifts:
+                if len(shifts) == batch:
+                    break
+                shifts.add(row[3])
+            rows.append(row)
+        for row in rows:
+            yield dict(zip(COLUMNS, row[:10]))
+        if len(shifts) < batch:
+            return
+        after = (rows[-1][10], rows[-1][3])
+
+
+def export_shifts(db, out, fmt="csv", start=None, end=None, empids=None, progress=None):
+    """
+    Function to write shifts with their breaks to a text file object as CSV or JSON Lines. See iter_shifts
+
+    Args:
+        db (Database): database to export from
+        out (file): text file object to write to
+        fmt (str): "csv" or "jsonl"
+        progress (callable): called with the number of rows written so far after every 10000 rows
+
+    Returns:
+        count (int) : number of rows written
+    """
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        write = lambda row: writer.writerow(row.values())
+    elif fmt == "jsonl":
+        write = lambda row: out.write(json.dumps(row) + "\n")
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}")
+
+    count = 0
+    for row in iter_shifts(db, start, end, empids):
+        write(row)
+        count += 1
+        if progress is not None and count % 10000 == 0:
+            progress(count)
+    if progress is not None:
+        progress(count)
+    return count
+
+
+def read_rows(file, fmt="csv"):
+    """
+    Generator over rows of an exported CSV or JSON Lines text file object as dicts
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(file):
+            yield {key: value if value != "" else None for key, value in row.items()}
+    elif fmt == "jsonl":
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown import format {fmt!r}")
+
+
+def import_shifts(db, rows, batch_size=50000, progress=None, defer_indexes=True):
+    """
+    Function to bulk load shifts and breaks in COLUMNS layout, e.g. from read_rows.
+
+    Rows sharing a source shiftid become one shift; they must be consecutive, as written by export_shifts. Shifts are
+    given new shiftids so imports never collide with existing punches. Rows are inserted with executemany and
+    committed every batch_size rows. With defer_indexes the plain secondary indexes on shifts and breaks are dropped for
+    the load and rebuilt once at the end, which is much faster than maintaining them row by row, and the whole load is
+    committed as one transaction instead. See deferred_indexes
+
+    Args:
+        db (Database): database to import into. Employees referenced by empid must already exist
+        rows (iterable): dicts with COLUMNS keys; firstname, lastname and breakid are ignored
+        batch_size (int): rows per transaction
+        progress (callable): called with the number of rows imported so far after every batch
+        defer_indexes (bool): drop and rebuild plain secondary indexes around the load, in one transaction
+
+    Returns:
+        count (int) : number of rows imported
+    """
+    conn = db.conn
+    with deferred_indexes(conn, ("shifts", "breaks") if defer_indexes else ()):
+        #above every id ever handed out, including shifts since archived. See the sqlite_sequence seeding in db.py migration 9
+        next_shiftid = conn.execute("""SELECT MAX(COALESCE(MAX(shiftid), 0),
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'shifts'), 0)) + 1 FROM shifts""").fetchone()[0]
+        source_shiftid = object()
+        shifts = []
+        breaks = []
+        count = 0
+
+        def flush():
+            conn.executemany("""INSERT INTO shifts (shiftid, empid, shift_start, shift_end, utc_offset, work_date)
+                VALUES (?, ?, ?, ?, ?, ?)""", shifts)
+            conn.executemany("""INSERT INTO breaks (empid, shiftid, breaktype, break_start, break_end, utc_offset)
+                VALUES (?, ?, ?, ?, ?, ?)""", breaks)
+            if not defer_indexes:
+                conn.commit()
+                if db.report_cache is not None:
+                    db.report_cache.clear()
+            shifts.clear()
+            breaks.clear()
+            if progress is not None:
+                progress(count)
+
+        for row in rows:
+            if row["shiftid"] != source_shiftid:
+                source_shiftid = row["shiftid"]
+                shiftid = next_shiftid
+                next_shiftid += 1
+                start, utc_offset, date = parse_local(row["shift_start"])
+                shifts.append((shiftid, int(row["empid"]), start, parse_local(row["shift_end"])[0], utc_offset, date))
+            if row.get("breaktype"):
+                start, utc_offset, date = parse_local(row["break_start"])
+                breaks.append((int(row["empid"]), shiftid, row["breaktype"], start, parse_local(row["break_end"])[0], utc_offset))
+            count += 1
+            if count % batch_size == 0:
+                flush()
+        flush()
+    if db.report_cache is not None:
+        db.report_cache.clear()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("file", help="file to export to or import from, - for stdout/stdin")
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--from", dest="start", help="export shifts starting on or after this date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="export shifts starting on or before this date, YYYY-MM-DD")
+    parser.add_argument("--emp", dest="empids", type=int, action="append", help="export only this employee id, repeatable")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    report = lambda count: print(f"{count} rows", file=sys.stderr)
+    if args.command == "export":
+        out = sys.stdout if args.file == "-" else open(args.file, "w", newline="")
+        with out:
+            export_shifts(db, out, args.format, args.start, args.end, args.empids, progress=report)
+    else:
+        file = sys.stdin if args.file == "-" else open(args.file, newline="")
+        with file:
+            import_shifts(db, read_rows(file, args.format), progress=report)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Headless SimpleTime command line for scripts and badge readers.
+
+Never imports tkinter, and only imports and opens the database once a command needs it, so --help costs no database
+work and an up to date database skips all schema DDL (see Database.migrate). Punches are written straight to the
+database rather than through a punch journal, so they are visible to every other process as soon as the command exits.
+
+Usage:
+    python cli.py punch in|out|break|end-break|lunch|end-lunch --user USERNAME [--password PASSWORD]
+    python cli.py status --user USERNAME [--password PASSWORD]
+    python cli.py report [--emp 1 --emp 2] [--shift 10] [--from 2022-10-01] [--to 2022-10-15] [--status open]
+                         [--breaks] [--sort "Last Name"] [--desc]
+
+The password is prompted for when --password is not given. report writes CSV with a header to stdout. Exit status is
+0 on success, 1 for invalid credentials or report filters and 2 for a punch not allowed in the employee's current state.
+"""
+import argparse
+import csv
+import getpass
+import sys
+
+#punch command words, mapped to Session methods
+PUNCHES = {
+    "in": "clock_in",
+    "out": "clock_out",
+    "break": "take_break",
+    "end-break": "end_break",
+    "lunch": "take_lunch",
+    "end-lunch": "end_lunch",
+}
+
+#Rows read per report_rows call when a report is sorted
+REPORT_WINDOW = 500
+
+def open_db(args):
+    """
+    Function to import and open the database on first use, so commands and --help that do not need it stay fast
+    """
+    from db import Database
+    return Database(args.db)
+
+def login(db, args):
+    """
+    Function to open a Session for the --user and --password arguments
+
+    Returns:
+        session (Session) : session resumed in the employee's live state, None if the credentials are invalid
+    """
+    from service import Session
+    password = args.password if args.password is not None else getpass.getpass()
+    row = db.login(args.user, password)
+    if row is None:
+        return None
+    return Session(db, row[0], row[2], row[3], row[5]).resume(*row[6:9])
+
+def punch(args):
+    from service import PunchError
+    db = open_db(args)
+    try:
+        session = login(db, args)
+        if session is None:
+            print("Invalid username or password", file=sys.stderr)
+            return 1
+        try:
+            getattr(session, PUNCHES[args.punch])()
+        except PunchError as error:
+            print(error.message, file=sys.stderr)
+            return 2
+        print(f"{session.firstname} {session.lastname}: {session.status()}")
+        return 0
+    finally:
+        db.close()
+
+def status(args):
+    db = open_db(args)
+    try:
+        session = login(db, args)
+        if session is None:
+            print("Invalid username or password", file=sys.stderr)
+            return 1
+        print(f"{session.firstname} {session.lastname}: {session.status()}")
+        return 0
+    finally:
+        db.close()
+
+def report(args):
+    from report import COLUMNS, ReportQuery
+    try:
+        query = ReportQuery(empids=args.empids, shiftids=args.shiftids, start=args.start, end=args.end,
+            status=args.status, breaks=args.breaks)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.sort is not None and args.sort not in (COLUMNS if query.breaks else COLUMNS[:7]):
+        print(f"Cannot sort this report by {args.sort!r}", file=sys.stderr)
+        return 1
+    db = open_db(args)
+    try:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(COLUMNS if query.breaks else COLUMNS[:7])
+        if args.sort is None:
+            #pages in shift start order, so only one page is held at a time
+            for rows in db.iter_report(query):
+                writer.writerows(rows)
+        else:
+            shiftids, breakids = db.report_keys(query, args.sort, args.desc)
+            for start in range(0, len(shiftids), REPORT_WINDOW):
+                stop = start + REPORT_WINDOW
+                rows = db.report_rows(query, shiftids[start:stop], None if breakids is None else breakids[start:stop])
+                #None stands in for a row that stopped matching since the keys were listed
+                writer.writerows(row for row in rows if row is not None)
+        return 0
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("punch", help="clock in or out, or start or end a break or lunch")
+    command.add_argument("punch", choices=PUNCHES)
+    command.add_argument("--user", required=True, help="username")
+    command.add_argument("--password", help="password, prompted for when not given")
+    command.set_defaults(run=punch)
+
+    command = commands.add_parser("status", help="show whether an employee is working, on break or on lunch")
+    command.add_argument("--user", required=True, help="username")
+    command.add_argument("--password", help="password, prompted for when not given")
+    command.set_defaults(run=status)
+
+    command = commands.add_parser("report", help="write the shift report as CSV")
+    command.add_argument("--emp", dest="empids", type=int, action="append", help="employee id, repeatable")
+    command.add_argument("--shift", dest="shiftids", type=int, action="append", help="shift id, repeatable")
+    command.add_argument("--from", dest="start", help="first shift date, YYYY-MM-DD")
+    command.add_argument("--to", dest="end", help="last shift date, YYYY-MM-DD")
+    command.add_argument("--status", choices=("open", "closed"), help="only open or only closed shifts")
+    command.add_argument("--breaks", action="store_true", help="list each shift's breaks")
+    command.add_argument("--sort", help="report column to sort by, e.g. \"Last Name\"")
+    command.add_argument("--desc", action="store_true", help="sort descending")
+    command.set_defaults(run=report)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
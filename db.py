@@ -1,35 +1,129 @@
+import argparse
+import heapq
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+import urllib.parse
+import weakref
+from array import array
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 
-class Database:
-    """ 
-    Database class for communication with SQLite database
+from instrument import InstrumentedConnection, timed
+from journal import PunchJournal
+from report import ReportQuery, work_date
 
+def clock(at=None):
     """
+    Function to describe a punch time in the stored format
 
-    def __init__(self, db):
-        """
-        Initialization of Database object creates required tables for use with simpletime.py
-        """
-        self.conn = sqlite3.connect(db)
-        self.cur = self.conn.cursor()
-        self.cur.execute("""CREATE TABLE IF NOT EXISTS employees (
+    Args:
+        at (int): UTC epoch seconds, None for now
+
+    Returns:
+        utc (int) : UTC epoch seconds
+        utc_offset (int) : local offset from UTC in seconds at that instant
+        work_date (int) : local date as YYYYMMDD
+    """
+    at = int(time.time()) if at is None else int(at)
+    local = datetime.fromtimestamp(at).astimezone()
+    return at, int(local.utcoffset().total_seconds()), int(local.strftime("%Y%m%d"))
+
+def local_clock(wall):
+    """
+    Function to describe a local wall clock time in the stored format. See clock
+
+    Args:
+        wall (datetime): naive local date and time
+    """
+    local = wall.astimezone()
+    return int(local.timestamp()), int(local.utcoffset().total_seconds()), int(wall.strftime("%Y%m%d"))
+
+def _read_only_uri(path):
+    """
+    Function to build the URI opening a database file read-only
+    """
+    return "file:" + urllib.parse.quote(os.path.abspath(path)) + "?mode=ro"
+
+def _convert_to_utc(conn):
+    """
+    Migration 5 step rewriting punches stored as local wall clock time encoded as an epoch into UTC epoch plus offset,
+    using this machine's time zone rules for each punch's date
+    """
+    wall = lambda value: datetime(1970, 1, 1) + timedelta(seconds=value)
+    conn.create_function("utc_of_local", 1, lambda value: None if value is None else local_clock(wall(value))[0], deterministic=True)
+    conn.create_function("offset_of_local", 1, lambda value: None if value is None else local_clock(wall(value))[1], deterministic=True)
+    conn.execute("""UPDATE shifts SET utc_offset = offset_of_local(shift_start),
+        work_date = CAST(strftime('%Y%m%d', shift_start, 'unixepoch') AS INTEGER),
+        shift_start = utc_of_local(shift_start), shift_end = utc_of_local(shift_end)""")
+    conn.execute("""UPDATE breaks SET utc_offset = offset_of_local(break_start),
+        break_start = utc_of_local(break_start), break_end = utc_of_local(break_end)""")
+
+def _autoincrement_ids(conn):
+    """
+    Migration 9 step rebuilding shifts and breaks with AUTOINCREMENT ids. Plain INTEGER PRIMARY KEY ids restart from the
+    largest id left in the table, so once archive.py moved the newest shifts out new punches reused archived ids. The
+    id high-water marks in sqlite_sequence are seeded from the live tables and every registered archive file
+    """
+    directory = os.path.dirname(os.path.abspath(conn.execute("PRAGMA database_list").fetchone()[2] or "."))
+    archived = {"shifts": 0, "breaks": 0}
+    for (path,) in conn.execute("SELECT path FROM archives").fetchall():
+        path = os.path.join(directory, path)
+        if not os.path.exists(path):
+            continue
+        archive = sqlite3.connect(_read_only_uri(path), uri=True)
+        try:
+            archived["shifts"] = max(archived["shifts"], archive.execute("SELECT COALESCE(MAX(shiftid), 0) FROM shifts").fetchone()[0])
+            archived["breaks"] = max(archived["breaks"], archive.execute("SELECT COALESCE(MAX(breakid), 0) FROM breaks").fetchone()[0])
+        finally:
+            archive.close()
+    archived["shifts"] = max([archived["shifts"]] + [row[0] for row in conn.execute("SELECT last_shiftid FROM archives")])
+
+    for table, key in (("shifts", "shiftid"), ("breaks", "breakid")):
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        dependents = [row[0] for row in conn.execute("""SELECT sql FROM sqlite_master
+            WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL""", (table,))]
+        columns = sql[sql.index("("):].replace(f"{key} INTEGER PRIMARY KEY", f"{key} INTEGER PRIMARY KEY AUTOINCREMENT", 1)
+        conn.execute(f"CREATE TABLE {table}_rebuild {columns}")
+        conn.execute(f"INSERT INTO {table}_rebuild SELECT * FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        #the legacy rename skips checking the triggers of other tables, which still name the dropped table
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        try:
+            conn.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+        finally:
+            conn.execute("PRAGMA legacy_alter_table = OFF")
+        for statement in dependents:
+            conn.execute(statement)
+        high = max(archived[table], conn.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}").fetchone()[0])
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, high))
+
+#Schema migrations. Each entry is the list of statements taking the schema from version n to n + 1, where the version
+#is stored in PRAGMA user_version. A step may also be a function called with the connection for changes SQL alone
+#cannot express. Only ever append to this list; never edit a migration that has shipped.
+MIGRATIONS = [
+    #1: initial schema
+    [
+        """CREATE TABLE IF NOT EXISTS employees (
             empid INTEGER PRIMARY KEY,
             username TEXT UNIQUE NOT NULL CHECK (username <> ""), 
             firstname TEXT NOT NULL CHECK (firstname <> ""), 
             lastname TEXT NOT NULL CHECK (lastname <> ""), 
             password TEXT NOT NULL CHECK (password <> ""), 
-            admin BOOLEAN NOT NULL CHECK (admin IN (0,1)))"""
-            )
+            admin BOOLEAN NOT NULL CHECK (admin IN (0,1)))""",
 
-        self.cur.execute("""CREATE TABLE IF NOT EXISTS shifts (
+        """CREATE TABLE IF NOT EXISTS shifts (
             shiftid INTEGER PRIMARY KEY, 
             empid INTEGER,
             shift_start INTEGER, 
             shift_end INTEGER,
-            FOREIGN KEY(empid) REFERENCES employees(empid))"""
-            )
+            FOREIGN KEY(empid) REFERENCES employees(empid))""",
 
-        self.cur.execute("""CREATE TABLE IF NOT EXISTS breaks (
+        """CREATE TABLE IF NOT EXISTS breaks (
             breakid INTEGER PRIMARY KEY,
             empid INTEGER,
             shiftid INTEGER,
@@ -37,11 +131,623 @@ class Database:
             break_start INTEGER,
             break_end INTEGER,
             FOREIGN KEY(empid) REFERENCES employees(empid),
-            FOREIGN KEY(shiftid) REFERENCES shifts(shiftid))"""
-            )
+            FOREIGN KEY(shiftid) REFERENCES shifts(shiftid))""",
+    ],
+    #2: indexes for shift_report filters and paging, the breaks join and per employee break lookups
+    [
+        "CREATE INDEX IF NOT EXISTS idx_shifts_empid_start ON shifts(empid, shift_start)",
+        "CREATE INDEX IF NOT EXISTS idx_shifts_start ON shifts(shift_start)",
+        "CREATE INDEX IF NOT EXISTS idx_breaks_shiftid ON breaks(shiftid)",
+        "CREATE INDEX IF NOT EXISTS idx_breaks_empid_start ON breaks(empid, break_start)",
+    ],
+    #3: daily_hours rollup of worked, break and lunch seconds per employee per shift date, maintained by triggers
+    #whenever a shift, break or lunch is ended or inserted already ended, and backfilled from existing punches
+    [
+        """CREATE TABLE IF NOT EXISTS daily_hours (
+            empid INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            shift_seconds INTEGER NOT NULL DEFAULT 0,
+            break_seconds INTEGER NOT NULL DEFAULT 0,
+            lunch_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (empid, work_date)) WITHOUT ROWID""",
+
+        "CREATE INDEX IF NOT EXISTS idx_daily_hours_date ON daily_hours(work_date)",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_shifts_end_rollup AFTER UPDATE OF shift_end ON shifts
+            WHEN NEW.shift_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                VALUES (NEW.empid, date(NEW.shift_start,'unixepoch'),
+                    (NEW.shift_end - NEW.shift_start) - COALESCE(OLD.shift_end - OLD.shift_start, 0))
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_shifts_insert_rollup AFTER INSERT ON shifts
+            WHEN NEW.shift_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                VALUES (NEW.empid, date(NEW.shift_start,'unixepoch'), NEW.shift_end - NEW.shift_start)
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_breaks_end_rollup AFTER UPDATE OF break_end ON breaks
+            WHEN NEW.break_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                VALUES (NEW.empid, (SELECT date(shift_start,'unixepoch') FROM shifts WHERE shiftid = NEW.shiftid),
+                    CASE NEW.breaktype WHEN 'break' THEN (NEW.break_end - NEW.break_start) - COALESCE(OLD.break_end - OLD.break_start, 0) ELSE 0 END,
+                    CASE NEW.breaktype WHEN 'lunch' THEN (NEW.break_end - NEW.break_start) - COALESCE(OLD.break_end - OLD.break_start, 0) ELSE 0 END)
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_breaks_insert_rollup AFTER INSERT ON breaks
+            WHEN NEW.break_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                VALUES (NEW.empid, (SELECT date(shift_start,'unixepoch') FROM shifts WHERE shiftid = NEW.shiftid),
+                    CASE NEW.breaktype WHEN 'break' THEN NEW.break_end - NEW.break_start ELSE 0 END,
+                    CASE NEW.breaktype WHEN 'lunch' THEN NEW.break_end - NEW.break_start ELSE 0 END)
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+            END""",
+
+        """INSERT INTO daily_hours (empid, work_date, shift_seconds)
+            SELECT empid, date(shift_start,'unixepoch'), SUM(shift_end - shift_start)
+            FROM shifts
+            WHERE shift_end IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = excluded.shift_seconds""",
+
+        """INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+            SELECT breaks.empid, date(shifts.shift_start,'unixepoch'),
+                SUM(CASE breaks.breaktype WHEN 'break' THEN breaks.break_end - breaks.break_start ELSE 0 END),
+                SUM(CASE breaks.breaktype WHEN 'lunch' THEN breaks.break_end - breaks.break_start ELSE 0 END)
+            FROM breaks
+            INNER JOIN shifts
+            ON shifts.shiftid = breaks.shiftid
+            WHERE breaks.break_end IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = excluded.break_seconds,
+                lunch_seconds = excluded.lunch_seconds""",
+    ],
+    #4: partial indexes covering only open shifts and breaks, so login can restore an employee's live state without
+    #scanning their punch history
+    [
+        "CREATE INDEX IF NOT EXISTS idx_shifts_open ON shifts(empid) WHERE shift_end IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_breaks_open ON breaks(shiftid, breaktype) WHERE break_end IS NULL",
+    ],
+    #5: punches stored as true UTC epoch plus the local utc_offset in seconds, and an indexed integer work_date
+    #(local YYYYMMDD of the shift start) so date-bounded queries are range scans. Existing punches are converted in
+    #place and the rollup triggers and contents are rebuilt on the new columns
+    [
+        "DROP TRIGGER IF EXISTS trg_shifts_end_rollup",
+        "DROP TRIGGER IF EXISTS trg_shifts_insert_rollup",
+        "DROP TRIGGER IF EXISTS trg_breaks_end_rollup",
+        "DROP TRIGGER IF EXISTS trg_breaks_insert_rollup",
+        "ALTER TABLE shifts ADD COLUMN utc_offset INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE shifts ADD COLUMN work_date INTEGER",
+        "ALTER TABLE breaks ADD COLUMN utc_offset INTEGER NOT NULL DEFAULT 0",
+        _convert_to_utc,
+        "CREATE INDEX IF NOT EXISTS idx_shifts_work_date ON shifts(work_date)",
+        "CREATE INDEX IF NOT EXISTS idx_shifts_empid_work_date ON shifts(empid, work_date)",
+
+        """CREATE TRIGGER trg_shifts_end_rollup AFTER UPDATE OF shift_end ON shifts
+            WHEN NEW.shift_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                VALUES (NEW.empid, date(NEW.shift_start + NEW.utc_offset,'unixepoch'),
+                    (NEW.shift_end - NEW.shift_start) - COALESCE(OLD.shift_end - OLD.shift_start, 0))
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+            END""",
+
+        """CREATE TRIGGER trg_shifts_insert_rollup AFTER INSERT ON shifts
+            WHEN NEW.shift_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                VALUES (NEW.empid, date(NEW.shift_start + NEW.utc_offset,'unixepoch'), NEW.shift_end - NEW.shift_start)
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+            END""",
+
+        """CREATE TRIGGER trg_breaks_end_rollup AFTER UPDATE OF break_end ON breaks
+            WHEN NEW.break_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                VALUES (NEW.empid, (SELECT date(shift_start + utc_offset,'unixepoch') FROM shifts WHERE shiftid = NEW.shiftid),
+                    CASE NEW.breaktype WHEN 'break' THEN (NEW.break_end - NEW.break_start) - COALESCE(OLD.break_end - OLD.break_start, 0) ELSE 0 END,
+                    CASE NEW.breaktype WHEN 'lunch' THEN (NEW.break_end - NEW.break_start) - COALESCE(OLD.break_end - OLD.break_start, 0) ELSE 0 END)
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+            END""",
+
+        """CREATE TRIGGER trg_breaks_insert_rollup AFTER INSERT ON breaks
+            WHEN NEW.break_end IS NOT NULL
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                VALUES (NEW.empid, (SELECT date(shift_start + utc_offset,'unixepoch') FROM shifts WHERE shiftid = NEW.shiftid),
+                    CASE NEW.breaktype WHEN 'break' THEN NEW.break_end - NEW.break_start ELSE 0 END,
+                    CASE NEW.breaktype WHEN 'lunch' THEN NEW.break_end - NEW.break_start ELSE 0 END)
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+            END""",
+
+        "DELETE FROM daily_hours",
+
+        """INSERT INTO daily_hours (empid, work_date, shift_seconds)
+            SELECT empid, date(shift_start + utc_offset,'unixepoch'), SUM(shift_end - shift_start)
+            FROM shifts
+            WHERE shift_end IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = excluded.shift_seconds""",
+
+        """INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+            SELECT breaks.empid, date(shifts.shift_start + shifts.utc_offset,'unixepoch'),
+                SUM(CASE breaks.breaktype WHEN 'break' THEN breaks.break_end - breaks.break_start ELSE 0 END),
+                SUM(CASE breaks.breaktype WHEN 'lunch' THEN breaks.break_end - breaks.break_start ELSE 0 END)
+            FROM breaks
+            INNER JOIN shifts
+            ON shifts.shiftid = breaks.shiftid
+            WHERE breaks.break_end IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = excluded.break_seconds,
+                lunch_seconds = excluded.lunch_seconds""",
+    ],
+    #6: registry of archive files holding closed shifts and breaks moved out of the live tables, with the work_date
+    #period and shiftid range each covers so reports only attach the archives they need. See archive.py
+    [
+        """CREATE TABLE IF NOT EXISTS archives (
+            path TEXT PRIMARY KEY,
+            first_date INTEGER NOT NULL,
+            last_date INTEGER NOT NULL,
+            first_shiftid INTEGER NOT NULL,
+            last_shiftid INTEGER NOT NULL,
+            shifts INTEGER NOT NULL,
+            archived_at INTEGER NOT NULL)""",
+    ],
+    #7: punch keys of shifts and breaks recorded through the punch journal, unique so replaying an entry twice is a
+    #no-op. See journal.py
+    [
+        "ALTER TABLE shifts ADD COLUMN punch_key TEXT",
+        "ALTER TABLE breaks ADD COLUMN punch_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_shifts_punch_key ON shifts(punch_key) WHERE punch_key IS NOT NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_breaks_punch_key ON breaks(punch_key) WHERE punch_key IS NOT NULL",
+    ],
+    #8: full text index over employee usernames and names for type-ahead employee search, kept in sync with employees
+    #by triggers so every insert, including Database.register, is searchable at once. Prefix indexes make 1 to 3
+    #character prefixes a single index lookup. See Database.search_employees
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(username, firstname, lastname,
+            content='employees', content_rowid='empid', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_employees_insert_fts AFTER INSERT ON employees
+            BEGIN
+                INSERT INTO employees_fts (rowid, username, firstname, lastname)
+                VALUES (NEW.empid, NEW.username, NEW.firstname, NEW.lastname);
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_employees_delete_fts AFTER DELETE ON employees
+            BEGIN
+                INSERT INTO employees_fts (employees_fts, rowid, username, firstname, lastname)
+                VALUES ('delete', OLD.empid, OLD.username, OLD.firstname, OLD.lastname);
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_employees_update_fts AFTER UPDATE OF username, firstname, lastname ON employees
+            BEGIN
+                INSERT INTO employees_fts (employees_fts, rowid, username, firstname, lastname)
+                VALUES ('delete', OLD.empid, OLD.username, OLD.firstname, OLD.lastname);
+                INSERT INTO employees_fts (rowid, username, firstname, lastname)
+                VALUES (NEW.empid, NEW.username, NEW.firstname, NEW.lastname);
+            END""",
+
+        "INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')",
+    ],
+    #9: shift and break ids that are never reused, even after the newest shifts were archived, so shiftid and breakid
+    #stay unique across the live tables and every archive
+    [
+        _autoincrement_ids,
+    ],
+    #10: daily_hours follows every change to a closed shift, break or lunch, not only the punch ending it: updates take
+    #the old row out of the rollup and add the new one, moving a shift's breaks along when its date changes, and
+    #deletes take the row out. Deletes inside an archived period are skipped, as archive.py registers the period before
+    #removing its rows and the rollup keeps them. Rows left all zero by an update or delete are removed
+    [
+        "DROP TRIGGER IF EXISTS trg_shifts_end_rollup",
+        "DROP TRIGGER IF EXISTS trg_breaks_end_rollup",
+
+        """CREATE TRIGGER trg_shifts_update_rollup AFTER UPDATE OF empid, shift_start, shift_end, utc_offset ON shifts
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                SELECT OLD.empid, date(OLD.shift_start + OLD.utc_offset,'unixepoch'), OLD.shift_start - OLD.shift_end
+                WHERE OLD.shift_end IS NOT NULL
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                SELECT NEW.empid, date(NEW.shift_start + NEW.utc_offset,'unixepoch'), NEW.shift_end - NEW.shift_start
+                WHERE NEW.shift_end IS NOT NULL
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT empid, date(OLD.shift_start + OLD.utc_offset,'unixepoch'),
+                    -SUM(CASE breaktype WHEN 'break' THEN break_end - break_start ELSE 0 END),
+                    -SUM(CASE breaktype WHEN 'lunch' THEN break_end - break_start ELSE 0 END)
+                FROM breaks
+                WHERE shiftid = OLD.shiftid AND break_end IS NOT NULL
+                AND date(OLD.shift_start + OLD.utc_offset,'unixepoch') != date(NEW.shift_start + NEW.utc_offset,'unixepoch')
+                GROUP BY empid
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT empid, date(NEW.shift_start + NEW.utc_offset,'unixepoch'),
+                    SUM(CASE breaktype WHEN 'break' THEN break_end - break_start ELSE 0 END),
+                    SUM(CASE breaktype WHEN 'lunch' THEN break_end - break_start ELSE 0 END)
+                FROM breaks
+                WHERE shiftid = NEW.shiftid AND break_end IS NOT NULL
+                AND date(OLD.shift_start + OLD.utc_offset,'unixepoch') != date(NEW.shift_start + NEW.utc_offset,'unixepoch')
+                GROUP BY empid
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                DELETE FROM daily_hours
+                WHERE empid IN (OLD.empid, NEW.empid)
+                AND work_date IN (date(OLD.shift_start + OLD.utc_offset,'unixepoch'), date(NEW.shift_start + NEW.utc_offset,'unixepoch'))
+                AND shift_seconds = 0 AND break_seconds = 0 AND lunch_seconds = 0;
+            END""",
+
+        """CREATE TRIGGER trg_shifts_delete_rollup AFTER DELETE ON shifts
+            WHEN NOT EXISTS (SELECT 1 FROM archives WHERE OLD.work_date BETWEEN archives.first_date AND archives.last_date)
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, shift_seconds)
+                SELECT OLD.empid, date(OLD.shift_start + OLD.utc_offset,'unixepoch'), OLD.shift_start - OLD.shift_end
+                WHERE OLD.shift_end IS NOT NULL
+                ON CONFLICT (empid, work_date) DO UPDATE SET shift_seconds = shift_seconds + excluded.shift_seconds;
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT empid, date(OLD.shift_start + OLD.utc_offset,'unixepoch'),
+                    -SUM(CASE breaktype WHEN 'break' THEN break_end - break_start ELSE 0 END),
+                    -SUM(CASE breaktype WHEN 'lunch' THEN break_end - break_start ELSE 0 END)
+                FROM breaks
+                WHERE shiftid = OLD.shiftid AND break_end IS NOT NULL
+                GROUP BY empid
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                DELETE FROM daily_hours
+                WHERE empid = OLD.empid AND work_date = date(OLD.shift_start + OLD.utc_offset,'unixepoch')
+                AND shift_seconds = 0 AND break_seconds = 0 AND lunch_seconds = 0;
+            END""",
+
+        """CREATE TRIGGER trg_breaks_update_rollup AFTER UPDATE OF empid, shiftid, breaktype, break_start, break_end, utc_offset ON breaks
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT OLD.empid, date(shift_start + utc_offset,'unixepoch'),
+                    CASE OLD.breaktype WHEN 'break' THEN OLD.break_start - OLD.break_end ELSE 0 END,
+                    CASE OLD.breaktype WHEN 'lunch' THEN OLD.break_start - OLD.break_end ELSE 0 END
+                FROM shifts
+                WHERE shiftid = OLD.shiftid AND OLD.break_end IS NOT NULL
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT NEW.empid, date(shift_start + utc_offset,'unixepoch'),
+                    CASE NEW.breaktype WHEN 'break' THEN NEW.break_end - NEW.break_start ELSE 0 END,
+                    CASE NEW.breaktype WHEN 'lunch' THEN NEW.break_end - NEW.break_start ELSE 0 END
+                FROM shifts
+                WHERE shiftid = NEW.shiftid AND NEW.break_end IS NOT NULL
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                DELETE FROM daily_hours
+                WHERE empid IN (OLD.empid, NEW.empid)
+                AND work_date IN (SELECT date(shift_start + utc_offset,'unixepoch') FROM shifts WHERE shiftid IN (OLD.shiftid, NEW.shiftid))
+                AND shift_seconds = 0 AND break_seconds = 0 AND lunch_seconds = 0;
+            END""",
+
+        """CREATE TRIGGER trg_breaks_delete_rollup AFTER DELETE ON breaks
+            BEGIN
+                INSERT INTO daily_hours (empid, work_date, break_seconds, lunch_seconds)
+                SELECT OLD.empid, date(shift_start + utc_offset,'unixepoch'),
+                    CASE OLD.breaktype WHEN 'break' THEN OLD.break_start - OLD.break_end ELSE 0 END,
+                    CASE OLD.breaktype WHEN 'lunch' THEN OLD.break_start - OLD.break_end ELSE 0 END
+                FROM shifts
+                WHERE shiftid = OLD.shiftid AND OLD.break_end IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM archives WHERE shifts.work_date BETWEEN archives.first_date AND archives.last_date)
+                ON CONFLICT (empid, work_date) DO UPDATE SET break_seconds = break_seconds + excluded.break_seconds,
+                    lunch_seconds = lunch_seconds + excluded.lunch_seconds;
+                DELETE FROM daily_hours
+                WHERE empid = OLD.empid
+                AND work_date IN (SELECT date(shift_start + utc_offset,'unixepoch') FROM shifts WHERE shiftid = OLD.shiftid)
+                AND shift_seconds = 0 AND break_seconds = 0 AND lunch_seconds = 0;
+            END""",
+    ],
+]
+
+#Prepared statements kept per connection. Large enough for every ReportQuery filter combination plus the punch statements
+STATEMENT_CACHE_SIZE = 512
+
+#Statements recomputing daily_hours from the raw punches. See Database.rebuild_rollup
+ROLLUP_REBUILD = MIGRATIONS[4][-2:]
+
+#Most archive databases attached to one connection at a time, below SQLite's default limit of 10. Reports needing
+#more archives than this read them in several statements
+ATTACH_LIMIT = 8
+
+#Pages copied per step of Database.backup, and seconds slept between steps so punches are not starved of the disk
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005
+
+class _ThreadOwner:
+    """
+    Placeholder kept only in a thread's Database._local, so it is collected when that thread ends
+    """
+
+def _release(database, conn):
+    """
+    Function to close the pooled connection of a thread that has ended and drop it from the pool
+
+    Args:
+        database (weakref): the Database the connection was pooled by
+        conn (sqlite3.Connection): the thread's connection
+    """
+    owner = database()
+    if owner is not None:
+        with owner._pool_lock:
+            if conn in owner._pool:
+                owner._pool.remove(conn)
+    conn.close()
+
+class Database:
+    """ 
+    Database class for communication with SQLite database
 
-        self.conn.commit()
+    """
+
+    def __init__(self, db, synchronous="NORMAL", cache_size=-16000, mmap_size=67108864, busy_timeout=5000, retries=5,
+                 retry_delay=0.05, group_commit=False, commit_interval=10, commit_batch=200, metrics=None, report_cache=None,
+                 read_only=False, journal=None, live=None, snapshots=None):
+        """
+        Initialization of Database object creates or upgrades the required tables for use with simpletime.py
+
+        The database runs in WAL mode so reports never block punches. Each thread gets its own connection from a pool,
+        so the object can be shared between kiosk and report threads.
+
+        Args:
+            db (str): path to the SQLite database file
+            synchronous (str): PRAGMA synchronous for every connection. NORMAL is durable across application crashes in WAL mode
+            cache_size (int): PRAGMA cache_size for every connection, negative values are KiB
+            mmap_size (int): PRAGMA mmap_size for every connection in bytes, 0 disables memory mapped I/O
+            busy_timeout (int): milliseconds a connection waits on a locked database before raising
+            retries (int): number of times a write is retried after the busy timeout expires
+            retry_delay (float): seconds to wait before the first retry, doubled on each further attempt
+            group_commit (bool): queue writes from every thread and commit them together in one transaction. See GroupCommitWriter
+            commit_interval (int): with group_commit, milliseconds a batch stays open waiting for more writes
+            commit_batch (int): with group_commit, maximum number of writes per transaction
+            metrics (Metrics): record method, statement and commit timings and slow queries. See instrument.py
+            report_cache (ReportCache): cache report, report_page and payroll_summary results, invalidated by the write
+                methods and cleared when another connection changes the database. See reportcache.py
+            read_only (bool): open the file and any archives read-only, e.g. for report workers. The schema must already
+                be up to date, as nothing is migrated
+            journal (str): path of a punch journal file. Punches are appended to it and replayed into the database in
+                the background, so they never wait on the database lock. See journal.py
+            live (LiveBoard): board of who is on the clock, loaded here and updated by service.Session. See live.py
+            snapshots (SnapshotSchedule): take online snapshots in the background while the database is open. See backup.py
+        """
+        self.db = db
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = metrics
+        self.report_cache = report_cache
+        self.read_only = read_only
+
+        self._local = threading.local()
+        self._pool = []
+        #reentrant, as a connection is released by a finalizer that may run while the pool is being changed
+        self._pool_lock = threading.RLock()
+
+        if read_only:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != len(MIGRATIONS):
+                raise sqlite3.OperationalError(f"{db} is at schema version {version}, expected {len(MIGRATIONS)}. Open it read-write once to migrate")
+        else:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.migrate()
+
+        self._writer = GroupCommitWriter(self, commit_interval, commit_batch) if group_commit else None
+        #replays any punches left in the journal by a crash before returning
+        self._journal = PunchJournal(self, journal) if journal is not None else None
+        self.live = live
+        if live is not None:
+            live.load(self)
+        self._snapshots = snapshots
+        if snapshots is not None:
+            snapshots.start(self)
+
+    def _connect(self):
+        """
+        Function to open a new pooled connection with the configured pragmas applied
+        """
+        #check_same_thread is off only so close() can release every pooled connection. Each connection is still only used by its own thread
+        options = dict(timeout=self.busy_timeout / 1000, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        path = self.db
+        if self.read_only:
+            path = _read_only_uri(path)
+            options["uri"] = True
+        if self.metrics is None:
+            conn = sqlite3.connect(path, **options)
+        else:
+            conn = sqlite3.connect(path, factory=InstrumentedConnection, **options)
+            conn.metrics = self.metrics
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        return conn
+
+    @property
+    def conn(self):
+        """
+        Connection belonging to the calling thread, opened on first use and closed once the thread has ended
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.cur = conn.cursor()
+            #a thread's _local values are dropped when it ends, which runs the finalizer releasing its connection, so
+            #short lived threads such as report workers do not leave connections behind in the pool
+            self._local.owner = _ThreadOwner()
+            weakref.finalize(self._local.owner, _release, weakref.ref(self), conn).atexit = False
+            with self._pool_lock:
+                self._pool.append(conn)
+        return conn
+
+    @property
+    def cur(self):
+        """
+        Cursor belonging to the calling thread's connection
+        """
+        self.conn
+        return self._local.cur
+
+    def close(self):
+        """
+        Function to close every pooled connection. Threads using the object afterwards get a fresh connection.
+        Pending group commit writes are committed first.
+        """
+        if self._snapshots is not None:
+            self._snapshots.close()
+            self._snapshots = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+        self._local = threading.local()
+
+    def _retry(self, func):
+        """
+        Function to call func, retrying with exponential backoff while the database is still locked once the busy
+        timeout has expired. The calling thread's connection is rolled back before each retry.
+        """
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                if attempt == self.retries or not ("locked" in str(e) or "busy" in str(e)):
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _write(self, sql, params):
+        """
+        Function to run a single write statement. The statement is committed in its own transaction, or handed to the
+        group commit writer when group_commit is enabled.
+
+        Args:
+            sql (str): statement to execute
+            params (tuple): parameters for the statement
+
+        Returns:
+            lastrowid (int): rowid of the inserted row for INSERT statements
+        """
+        if self._writer is not None:
+            return self._writer.submit(sql, params).result()
+
+        def execute():
+            self.cur.execute(sql, params)
+            self.conn.commit()
+            return self.cur.lastrowid
+        return self._retry(execute)
+
+    def _check_cache(self, cache):
+        """
+        Function to clear the report cache when the database was changed through another connection
+
+        PRAGMA data_version changes whenever another connection, in this process or any other, commits to the database
+        file, so punches recorded by other SimpleTime instances or by cli.py are noticed even though the write methods
+        never saw them. Commits on the calling thread's own connection leave it unchanged. A connection's first check
+        has nothing to compare against, so it clears the cache too.
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if getattr(self._local, "data_version", None) != version:
+            cache.clear()
+            self._local.data_version = version
+
+    def _invalidate(self, sql, params):
+        """
+        Function to drop the cached results a punch can change
+
+        Args:
+            sql (str): query returning the (empid, shiftid, work_date) of the punched shift
+            params (tuple): parameters for the query
+        """
+        cache = self.report_cache
+        if cache is None:
+            return
+        row = self.conn.execute(sql, params).fetchone() if len(cache) else None
+        if row is None:
+            cache.clear()
+        else:
+            cache.invalidate(*row)
+
+    def _invalidate_shift(self, shiftid):
+        self._invalidate("SELECT empid, shiftid, work_date FROM shifts WHERE shiftid = ?", (shiftid,))
+
+    def _invalidate_break(self, breakid):
+        self._invalidate("""SELECT shifts.empid, shifts.shiftid, shifts.work_date
+            FROM breaks
+            INNER JOIN shifts
+            ON shifts.shiftid = breaks.shiftid
+            WHERE breaks.breakid = ?""", (breakid,))
+
+    @timed
+    def migrate(self):
+        """
+        Function to bring the database schema up to date. The applied version is tracked in PRAGMA user_version, so
+        existing timeclockdb.db files are upgraded in place and up to date files skip all DDL.
+
+        Returns:
+            version (int) : schema version after migrating
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            #explicit BEGIN as sqlite3 does not open a transaction for DDL on its own
+            self.conn.execute("BEGIN")
+            try:
+                for statement in statements:
+                    if callable(statement):
+                        statement(self.conn)
+                    else:
+                        self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+        #indexes added by a migration have no planner statistics yet; without them the planner may prefer a new index
+        #over an analyzed one, so refresh the statistics of databases that were analyzed before
+        if version < len(MIGRATIONS) and self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+        return len(MIGRATIONS)
+
+    def query_plan(self, sql, params=()):
+        """
+        Function to retrieve the EXPLAIN QUERY PLAN output for a statement
+
+        Args:
+            sql (str): statement to explain
+            params (tuple): parameters for the statement
+
+        Returns:
+            plan (list) : detail column of each step of the query plan
+        """
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
 
+    @timed
     def register(self, username, firstname, lastname, password, admin):
 
         """ 
@@ -59,12 +765,12 @@ class Database:
             1 : registration was not successful
         """
         try:
-            self.cur.execute("INSERT INTO employees VALUES (NULL, ?, ?, ?, ?, ?)", (username, firstname, lastname, password, admin))
-            self.conn.commit()
+            self._write("INSERT INTO employees VALUES (NULL, ?, ?, ?, ?, ?)", (username, firstname, lastname, password, admin))
             return None
         except:
             return 1
 
+    @timed
     def login(self, username, password):
         """
         login function to validate user with database records
@@ -74,13 +780,56 @@ class Database:
             password (str): Password retrieved from simpletime text entry
 
         Returns:
-            row (tuple) : Row containing employee information for use in creating Employee instance in simpletime
+            row (tuple) : Row containing employee information for use in creating Employee instance in simpletime,
+                followed by the employee's live state: the open shiftid, open breakid and open lunch breakid, each None
+                when not open, see Session.resume, then the punch keys of that shift, break and lunch, None for rows
+                recorded without the punch journal. Punches still pending in the journal are applied to both
         """
 
-        self.cur.execute("SELECT * FROM employees WHERE username = ? AND password = ?", (username,password))
+        self.cur.execute("""SELECT employees.*, open_shift.shiftid, open_break.breakid, open_lunch.breakid,
+            open_shift.punch_key, open_break.punch_key, open_lunch.punch_key
+            FROM employees
+            LEFT JOIN shifts AS open_shift
+            ON open_shift.empid = employees.empid AND open_shift.shift_end IS NULL
+            LEFT JOIN breaks AS open_break
+            ON open_break.breakid = (SELECT MAX(breakid) FROM breaks WHERE breaks.shiftid = open_shift.shiftid AND breaks.breaktype = 'break' AND breaks.break_end IS NULL)
+            LEFT JOIN breaks AS open_lunch
+            ON open_lunch.breakid = (SELECT MAX(breakid) FROM breaks WHERE breaks.shiftid = open_shift.shiftid AND breaks.breaktype = 'lunch' AND breaks.break_end IS NULL)
+            WHERE employees.username = ? AND employees.password = ?
+            ORDER BY open_shift.shiftid DESC
+            LIMIT 1""", (username,password))
         row = self.cur.fetchone()
+        if row is not None and self._journal is not None:
+            row = row[:6] + self._journal.open_state(row[0], row[6:9], row[9:12])
         return row
 
+    @timed
+    def search_employees(self, text, limit=20):
+        """
+        Function for type-ahead employee search. Every word typed must start a word of the username, first name or last
+        name, so "mar esp" finds Marcos Espinosa. Matches come from the employees_fts index rather than a LIKE scan
+
+        Args:
+            text (str): search text as typed
+            limit (int): maximum number of employees returned
+
+        Returns:
+            rows (list) : (empid, username, firstname, lastname) tuples, best match first by bm25 then by name. Empty
+                when text has no words
+        """
+        #each word becomes a quoted prefix term, so punctuation typed by the user is never read as query syntax
+        terms = ['"' + word.replace('"', '""') + '"*' for word in text.split()]
+        if not terms:
+            return []
+        #rank inside the index first, so only the returned matches are joined to employees
+        self.cur.execute("""SELECT employees.empid, employees.username, employees.firstname, employees.lastname
+            FROM (SELECT rowid, rank FROM employees_fts WHERE employees_fts MATCH ? ORDER BY rank LIMIT ?) AS found
+            INNER JOIN employees
+            ON employees.empid = found.rowid
+            ORDER BY found.rank, employees.lastname, employees.firstname""", (" AND ".join(terms), limit))
+        return self.cur.fetchall()
+
+    @timed
     def start_shift(self, empid):
         """
         start_shift function to start a shift given employee id
@@ -89,14 +838,18 @@ class Database:
             empid (int): employee id to be related to shift
 
         Returns:
-            current_shift int: int value of current_shift's shiftid 
+            current_shift int: int value of current_shift's shiftid, or its punch key (str) when journaling
         """
 
-        self.cur.execute("INSERT INTO shifts VALUES (NULL, ?, strftime('%s', 'now', 'localtime'), NULL)", (empid,))
-        self.conn.commit()
-        current_shift = self.cur.lastrowid
+        at, utc_offset, work_date = clock()
+        if self._journal is not None:
+            return self._journal.punch("start_shift", empid=empid, at=at, utc_offset=utc_offset, work_date=work_date)
+        current_shift = self._write("INSERT INTO shifts (empid, shift_start, utc_offset, work_date) VALUES (?, ?, ?, ?)", (empid, at, utc_offset, work_date))
+        if self.report_cache is not None:
+            self.report_cache.invalidate(empid, current_shift, work_date)
         return current_shift
 
+    @timed
     def end_shift(self, shiftid):
         """
         end_shift function to end the current shift. Note: shift is already associated with employee.
@@ -104,9 +857,13 @@ class Database:
         Args:
             shiftid (int): value to search for current_shift and update endtime column
         """
-        self.cur.execute("UPDATE shifts SET shift_end = strftime('%s', 'now', 'localtime') WHERE shiftid = ?", (shiftid,))
-        self.conn.commit()
+        if self._journal is not None:
+            self._journal.punch("end_shift", shift=shiftid, at=clock()[0])
+            return
+        self._write("UPDATE shifts SET shift_end = ? WHERE shiftid = ?", (clock()[0], shiftid))
+        self._invalidate_shift(shiftid)
 
+    @timed
     def start_break(self, empid, shiftid):
         """start_break function to start a break. employee must be working a shift to start a break as breaks are associated to a shift.
 
@@ -115,22 +872,29 @@ class Database:
             shiftid (int): shift id to be related to break
 
         Returns:
-            current_break (int): primary key representing current break to be used for ending the break
+            current_break (int): primary key representing current break to be used for ending the break, or its punch key (str) when journaling
         """
-        self.cur.execute("INSERT INTO breaks VALUES (NULL, ?, ?, 'break', strftime('%s', 'now', 'localtime'), NULL)", (empid, shiftid))
-        self.conn.commit()
-        current_break = self.cur.lastrowid
+        at, utc_offset, work_date = clock()
+        if self._journal is not None:
+            return self._journal.punch("start_break", empid=empid, shift=shiftid, at=at, utc_offset=utc_offset)
+        current_break = self._write("INSERT INTO breaks (empid, shiftid, breaktype, break_start, utc_offset) VALUES (?, ?, 'break', ?, ?)", (empid, shiftid, at, utc_offset))
+        self._invalidate_shift(shiftid)
         return current_break
 
+    @timed
     def end_break(self, breakid):
         """end_break function to end break given breakid
 
         Args:
             breakid (int): break id corresponding to current break to be ended
         """
-        self.cur.execute("UPDATE breaks SET break_end = strftime('%s', 'now', 'localtime') WHERE breakid = ?", (breakid,))
-        self.conn.commit()
+        if self._journal is not None:
+            self._journal.punch("end_break", at=clock()[0], **{"break": breakid})
+            return
+        self._write("UPDATE breaks SET break_end = ? WHERE breakid = ?", (clock()[0], breakid))
+        self._invalidate_break(breakid)
         
+    @timed
     def start_lunch(self, empid, shiftid):
         """start_lunch function to start a lunch break. This function is essentially the same as the start_break function
 
@@ -139,13 +903,16 @@ class Database:
             shiftid (int): shift id to be related to lunch
 
         Returns:
-            current_lunch (int): primary key representing current lunch to be used for ending the lunch
+            current_lunch (int): primary key representing current lunch to be used for ending the lunch, or its punch key (str) when journaling
         """
-        self.cur.execute("INSERT INTO breaks VALUES (NULL, ?, ?, 'lunch', strftime('%s', 'now', 'localtime'), NULL)", (empid, shiftid))
-        current_lunch = self.cur.lastrowid
-        self.conn.commit()
+        at, utc_offset, work_date = clock()
+        if self._journal is not None:
+            return self._journal.punch("start_lunch", empid=empid, shift=shiftid, at=at, utc_offset=utc_offset)
+        current_lunch = self._write("INSERT INTO breaks (empid, shiftid, breaktype, break_start, utc_offset) VALUES (?, ?, 'lunch', ?, ?)", (empid, shiftid, at, utc_offset))
+        self._invalidate_shift(shiftid)
         return current_lunch
 
+    @timed
     def end_lunch(self, breakid):
         """end_lunch function to end lunch given breakid
 
@@ -153,13 +920,18 @@ class Database:
             breakid (int): breakid corresponding to active lunch to be ended
         """
         
-        self.cur.execute("UPDATE breaks SET break_end = strftime('%s', 'now', 'localtime') WHERE breakid = ?", (breakid,))
-        self.conn.commit()
+        if self._journal is not None:
+            self._journal.punch("end_lunch", at=clock()[0], **{"break": breakid})
+            return
+        self._write("UPDATE breaks SET break_end = ? WHERE breakid = ?", (clock()[0], breakid))
+        self._invalidate_break(breakid)
 
+    @timed
     def shift_report(self, empid, shiftid):
 
         """
-        Function for querying database for shift reports. See shift_report_search in simpletime.py
+        Function for querying database for shift reports. See ReportQuery.from_search for how the arguments map onto
+        report filters
 
         Args:
             empid (int): employee id used for queries
@@ -169,46 +941,472 @@ class Database:
             row (tuple) : Row containing shift information for display in simpletime shift report Treeview
         
         """
-        if empid == "" and shiftid == "":
-            self.cur.execute("""SELECT employees.empid, shifts.shiftid, employees.firstname, employees.lastname, 
-            date(shifts.shift_start,'unixepoch'),time(shifts.shift_start,'unixepoch'), time(shifts.shift_end,'unixepoch')
-            FROM shifts 
-            INNER JOIN employees
-            ON employees.empid = shifts.empid """
-            )
-            rows = self.cur.fetchall()
-            return rows
-        elif shiftid == "":
-            self.cur.execute("""SELECT employees.empid, shifts.shiftid, employees.firstname, employees.lastname, 
-            date(shifts.shift_start,'unixepoch'),time(shifts.shift_start,'unixepoch'), time(shifts.shift_end,'unixepoch')
-            FROM shifts 
-            INNER JOIN employees
-            ON employees.empid = shifts.empid
-            WHERE shifts.empid = ?""", (empid,))
-            rows = self.cur.fetchall()
-            return rows
-        elif empid == "":
-            self.cur.execute("""SELECT employees.empid, shifts.shiftid, employees.firstname, employees.lastname, 
-            date(shifts.shift_start,'unixepoch'),time(shifts.shift_start,'unixepoch'), time(shifts.shift_end,'unixepoch'), breaks.breakid, breaks.breaktype, time(breaks.break_start,'unixepoch'), time(breaks.break_end,'unixepoch')
-            FROM shifts 
-            INNER JOIN employees
-            ON employees.empid = shifts.empid
-            LEFT JOIN breaks
-            ON shifts.shiftid = breaks.shiftid
-            WHERE shifts.shiftid = ?""", (shiftid,))
-            rows = self.cur.fetchall()
-            return rows
+        return self.report(ReportQuery.from_search(empid, shiftid))
+
+    @timed
+    def report(self, query):
+        """
+        Function for querying the shift report for any combination of filters. Archives of closed shifts are attached
+        and read only when the filters can match their period, see archives
+
+        Args:
+            query (ReportQuery): report filters
+
+        Returns:
+            rows (list) : Rows in report.COLUMNS layout ordered by shift start
+        """
+        cache = self.report_cache
+        if cache is not None:
+            self._check_cache(cache)
+            key = ("report", query.key())
+            rows = cache.get(key)
+            if rows is not None:
+                return list(rows)
+            generation = cache.generation
+
+        parts = []
+        for schemas in self._sources(query):
+            self.cur.execute(*query.sql(schemas))
+            parts.append(self.cur.fetchall())
+        rows = parts[0] if len(parts) == 1 else heapq.merge(*parts, key=lambda row: (row[-1], row[1]))
+        rows = [row[:-1] for row in rows]
+        if cache is not None:
+            cache.put(key, rows, query.depends, generation)
+            rows = list(rows)
+        return rows
+
+    def archives(self, query=None):
+        """
+        Function to list the registered archives of closed shifts, see archive.py
+
+        Args:
+            query (ReportQuery): only list archives that can hold rows matching query, None for every archive
+
+        Returns:
+            rows (list) : (path, first_date, last_date, first_shiftid, last_shiftid, shifts) tuples ordered by first_date,
+                with path resolved against the database's directory
+        """
+        rows = self.conn.execute("""SELECT path, first_date, last_date, first_shiftid, last_shiftid, shifts
+            FROM archives ORDER BY first_date""").fetchall()
+        directory = os.path.dirname(os.path.abspath(self.db))
+        return [(os.path.join(directory, row[0]),) + row[1:] for row in rows if query is None or query.needs(*row[1:5])]
+
+    def _attach(self, paths):
+        """
+        Function to attach archive files to the calling thread's connection, detaching archives not in paths first
+        when the connection would go over ATTACH_LIMIT
+
+        Returns:
+            schemas (list) : schema name of each path
+        """
+        attached = getattr(self._local, "attached", None)
+        if attached is None:
+            attached = self._local.attached = {}
+        missing = [path for path in paths if path not in attached]
+        for path in [path for path in attached if path not in paths][:max(len(attached) + len(missing) - ATTACH_LIMIT, 0)]:
+            self.conn.execute(f"DETACH DATABASE {attached.pop(path)}")
+        for path in missing:
+            #reuse a fixed set of schema names so report statements stay in the statement cache
+            used = set(attached.values())
+            schema = next(f"archive_{i}" for i in range(1, ATTACH_LIMIT + 1) if f"archive_{i}" not in used)
+            self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (_read_only_uri(path) if self.read_only else path,))
+            attached[path] = schema
+        return [attached[path] for path in paths]
+
+    def _sources(self, query):
+        """
+        Generator over the schemas to read for a report: main and the archives whose period query needs, at most
+        ATTACH_LIMIT archives at a time, attached on demand
+
+        Yields:
+            schemas (list) : schema names for one statement
+        """
+        paths = [row[0] for row in self.archives(query)]
+        schemas = ["main"]
+        while True:
+            yield schemas + self._attach(paths[:ATTACH_LIMIT])
+            paths = paths[ATTACH_LIMIT:]
+            schemas = []
+            if not paths:
+                return
+
+    @timed
+    def payroll_summary(self, start, end, period="day", empids=None):
+        """
+        Function for querying worked hours per employee from the daily_hours rollup. Only the rollup is read, so the cost
+        depends on employees x days rather than on the number of punches.
+
+        Args:
+            start (str): first shift date to include, "YYYY-MM-DD"
+            end (str): last shift date to include, "YYYY-MM-DD"
+            period (str): "day" for one row per employee per date, "week" for one row per employee per week starting
+                Monday, "period" for one row per employee covering start to end
+            empids (list): employee ids to include, None for all employees
+
+        Returns:
+            rows (list) : (empid, firstname, lastname, period start date, total hours, break hours, lunch hours, net hours)
+                tuples, where net hours is total hours less lunches. Ordered by empid then period
+
+        Raises:
+            ValueError: start or end is not a YYYY-MM-DD date, or period is unknown
+        """
+        first, last = work_date(start), work_date(end)
+        cache = self.report_cache
+        if cache is not None:
+            self._check_cache(cache)
+            key = ("payroll_summary", start, end, period, None if empids is None else tuple(sorted({int(empid) for empid in empids})))
+            rows = cache.get(key)
+            if rows is not None:
+                return list(rows)
+            generation = cache.generation
+
+        if period == "day":
+            label = "daily_hours.work_date"
+        elif period == "week":
+            label = "date(daily_hours.work_date, 'weekday 0', '-6 days')"
+        elif period == "period":
+            label = "?"
         else:
-            self.cur.execute("""SELECT employees.empid, shifts.shiftid, employees.firstname, employees.lastname, 
-            date(shifts.shift_start,'unixepoch'),time(shifts.shift_start,'unixepoch'), time(shifts.shift_end,'unixepoch'), breaks.breakid, breaks.breaktype, time(breaks.break_start,'unixepoch'), time(breaks.break_end,'unixepoch')
-            FROM shifts 
+            raise ValueError(f"Unknown payroll period {period!r}")
+        params = [start] if period == "period" else []
+        params.extend((start, end))
+
+        employee_filter = ""
+        if empids is not None:
+            employee_filter = "AND daily_hours.empid IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps([int(empid) for empid in empids]))
+
+        self.cur.execute(f"""SELECT employees.empid, employees.firstname, employees.lastname, {label} AS period_start,
+            ROUND(SUM(daily_hours.shift_seconds) / 3600.0, 2),
+            ROUND(SUM(daily_hours.break_seconds) / 3600.0, 2),
+            ROUND(SUM(daily_hours.lunch_seconds) / 3600.0, 2),
+            ROUND(SUM(daily_hours.shift_seconds - daily_hours.lunch_seconds) / 3600.0, 2)
+            FROM daily_hours
             INNER JOIN employees
-            ON employees.empid = shifts.empid
-            LEFT JOIN breaks
-            ON shifts.shiftid = breaks.shiftid
-            WHERE shifts.empid = ? AND shifts.shiftid = ?""", (empid,shiftid))
-            rows = self.cur.fetchall()
-            return rows
+            ON employees.empid = daily_hours.empid
+            WHERE daily_hours.work_date BETWEEN ? AND ? {employee_filter}
+            GROUP BY employees.empid, period_start
+            ORDER BY employees.empid, period_start""", params)
+        rows = self.cur.fetchall()
+        if cache is not None:
+            selected = key[4]
+            depends = lambda empid, shiftid, date: (selected is None or empid in selected) and first <= date <= last
+            cache.put(key, rows, depends, generation)
+            rows = list(rows)
+        return rows
+
+    @timed
+    def rebuild_rollup(self):
+        """
+        Function to recompute the daily_hours rollup from the shifts and breaks tables, e.g. after a backfill that
+        bypassed the triggers or edited punches directly. Dates inside archived periods keep their rows, as their
+        punches are no longer in the live tables
+        """
+        def rebuild():
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("""DELETE FROM daily_hours WHERE NOT EXISTS (SELECT 1 FROM archives
+                WHERE CAST(replace(daily_hours.work_date, '-', '') AS INTEGER) BETWEEN archives.first_date AND archives.last_date)""")
+            for statement in ROLLUP_REBUILD:
+                self.conn.execute(statement)
+            self.conn.commit()
+        self._retry(rebuild)
+        if self.report_cache is not None:
+            self.report_cache.clear()
+
+    @timed
+    def backup(self, path, pages=BACKUP_PAGES, pause=BACKUP_PAUSE, progress=None):
+        """
+        Function to copy a consistent snapshot of the database to a file while punches continue, using SQLite's online
+        backup API. The copy is written to path + ".partial" and renamed into place once complete and synced, so path
+        is never a torn copy. Punches still in a punch journal are not included until replayed
+
+        The copy reads one snapshot through its own connection, holding a read transaction from the first page to the
+        last. In WAL mode that never blocks writers, but the WAL cannot be checkpointed past the snapshot, so it grows
+        by the punches committed during the copy and is trimmed by the next checkpoint.
+
+        Args:
+            path (str): snapshot file to write, replaced if it exists
+            pages (int): pages copied per step
+            pause (float): seconds slept between steps
+            progress (callable): called with (pages copied, total pages) after each step
+
+        Returns:
+            pages (int) : number of pages copied
+        """
+        partial = path + ".partial"
+        for suffix in ("", "-journal"):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        source = self._connect()
+        target = sqlite3.connect(partial)
+        copied = 0
+        try:
+            #without a read transaction pinning the snapshot, a punch committed by any other connection restarts the
+            #backup from the first page, so a busy database would never finish
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+            def step(status, remaining, total):
+                nonlocal copied
+                copied = total - remaining
+                if progress is not None:
+                    progress(copied, total)
+                if remaining:
+                    time.sleep(pause)
+            source.backup(target, pages=pages, progress=step)
+            source.rollback()
+            #the copy keeps the source's WAL mode, a snapshot file stands alone without a -wal file next to it
+            target.execute("PRAGMA journal_mode = DELETE")
+        except:
+            target.close()
+            source.close()
+            os.remove(partial)
+            raise
+        target.close()
+        source.close()
+        with open(partial, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(partial, path)
+        return copied
+
+    def shift_report_page(self, empid, shiftid, after=None, limit=500):
+        """
+        Function for querying a single page of the shift report. See report_page
+
+        Args:
+            empid (int): employee id used for queries, "" for all employees
+            shiftid (int): shift id used for queries, "" for all shifts
+        """
+        return self.report_page(ReportQuery.from_search(empid, shiftid), after, limit)
+
+    def iter_shift_report(self, empid, shiftid, page_size=500):
+        """
+        Generator over the shift report one page at a time. See iter_report
+
+        Args:
+            empid (int): employee id used for queries, "" for all employees
+            shiftid (int): shift id used for queries, "" for all shifts
+        """
+        return self.iter_report(ReportQuery.from_search(empid, shiftid), page_size)
+
+    @timed
+    def report_page(self, query, after=None, limit=500):
+        """
+        Function for querying a single page of a report. Pages are keyed on (shift_start, shiftid) so each page is an
+        index range scan rather than an OFFSET over every earlier row.
+
+        Args:
+            query (ReportQuery): report filters
+            after (tuple): (shift_start, shiftid) key of the last shift on the previous page, None for the first page
+            limit (int): maximum number of shifts on the page
+
+        Returns:
+            rows (list) : Rows in the same layout as report
+            next_key (tuple) : key to pass as after for the next page, None when there are no more pages
+        """
+        cache = self.report_cache
+        if cache is not None:
+            self._check_cache(cache)
+            key = ("report_page", query.key(), after, limit)
+            page = cache.get(key)
+            if page is not None:
+                return list(page[0]), page[1]
+            generation = cache.generation
+
+        parts = []
+        for schemas in self._sources(query):
+            parts.append(self.conn.execute(*query.page_sql(after, limit, schemas)).fetchall())
+
+        #with archives each statement returns up to limit shifts, keep the first limit of the merged rows
+        rows = []
+        shifts = set()
+        for row in (parts[0] if len(parts) == 1 else heapq.merge(*parts, key=lambda row: (row[-1], row[1]))):
+            if row[1] not in shifts:
+                if len(shifts) == limit:
+                    break
+                shifts.add(row[1])
+            rows.append(row)
+        next_key = (rows[-1][-1], rows[-1][1]) if len(shifts) == limit else None
+        rows = [row[:-1] for row in rows]
+        if cache is not None:
+            cache.put(key, (rows, next_key), query.depends, generation, rows)
+            rows = list(rows)
+        return rows, next_key
+
+    def iter_report(self, query, page_size=500):
+        """
+        Generator over a report one page at a time. Only one page is held in memory, so an unfiltered report over years
+        of shifts can be consumed incrementally.
+
+        Args:
+            query (ReportQuery): report filters
+            page_size (int): number of shifts per page
+
+        Yields:
+            rows (list) : Page of rows in the same layout as report
+        """
+        key = None
+        while True:
+            rows, key = self.report_page(query, key, page_size)
+            if rows:
+                yield rows
+            if key is None:
+                return
+
+    @timed
+    def report_keys(self, query, sort=None, descending=False):
+        """
+        Function for listing the key of every row of a report in a chosen order. A view can then read any window of the
+        report with report_rows by position, at the cost of one rowid lookup per row instead of an OFFSET scan over
+        every earlier row. The keys are a snapshot: shifts started afterwards are not listed until they are read again.
+        See VirtualTreeview in reportview.py
+
+        Args:
+            query (ReportQuery): report filters
+            sort (str): report column to order by, None for shift start order. See ReportQuery.keys_sql
+            descending (bool): reverse the order
+
+        Returns:
+            shiftids (array) : shift id of each row
+            breakids (array) : break id of each row, 0 for a shift without breaks. None when query lists no breaks
+        """
+        parts = []
+        for schemas in self._sources(query):
+            parts.append(self.conn.execute(*query.keys_sql(sort, descending, schemas)).fetchall())
+        rows = parts[0]
+        if len(parts) > 1:
+            #open shifts and breaks sort by a NULL end, which SQLite orders first
+            key = lambda row: (row[-1] is not None, row[-1], row[0])
+            rows = heapq.merge(*parts, key=key, reverse=descending)
+        shiftids = array("q")
+        breakids = array("q") if query.breaks else None
+        for row in rows:
+            shiftids.append(row[0])
+            if breakids is not None:
+                breakids.append(row[1] or 0)
+        return shiftids, breakids
+
+    @timed
+    def report_rows(self, query, shiftids, breakids=None):
+        """
+        Function for reading the rows of a window of report_keys
+
+        Args:
+            query (ReportQuery): report filters the keys were listed with
+            shiftids (list): shift id of each row, a slice of report_keys
+            breakids (list): break id of each row, the same slice of report_keys, None when query lists no breaks
+
+        Returns:
+            rows (list) : Rows in report.COLUMNS layout in the order of the keys, so row i belongs to key i. Keys whose
+                row no longer matches the filters, e.g. a shift closed since when only open shifts are listed, get None
+                in their place rather than being left out, which would move every later row of the window up by one
+        """
+        if not len(shiftids):
+            return []
+        window = query.restrict(sorted(set(shiftids)))
+        found = {}
+        for schemas in self._sources(window):
+            for row in self.conn.execute(*window.sql(schemas)):
+                found[(row[1], row[7] or 0) if query.breaks else row[1]] = row[:-1]
+        keys = shiftids if breakids is None else zip(shiftids, breakids)
+        return [found.get(key) for key in keys]
+
+class GroupCommitWriter:
+    """
+    Writer thread for Database group commit mode.
+
+    Writes submitted from any thread are queued and executed together in a single transaction once commit_batch writes
+    are waiting or commit_interval milliseconds have passed since the first one, so a burst of punches shares one fsync.
+    Each caller blocks on its Future until the transaction holding its write has committed.
+    """
+
+    def __init__(self, database, commit_interval, commit_batch):
+        self.database = database
+        self.commit_interval = commit_interval / 1000
+        self.commit_batch = commit_batch
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self.thread.start()
+
+    def submit(self, sql, params):
+        """
+        Function to queue a write statement
+
+        Returns:
+            future (Future) : resolves to the statement's lastrowid once committed, or raises the statement's error
+        """
+        future = Future()
+        self.queue.put((sql, params, future))
+        return future
+
+    def close(self):
+        """
+        Function to commit any queued writes and stop the writer thread
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.commit_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        db = self.database
+
+        def execute():
+            results = []
+            db.conn.execute("BEGIN IMMEDIATE")
+            for sql, params, future in batch:
+                #a failing statement is rolled back on its own by SQLite and reported only to its caller
+                try:
+                    db.cur.execute(sql, params)
+                    results.append(db.cur.lastrowid)
+                except sqlite3.OperationalError:
+                    raise
+                except sqlite3.Error as e:
+                    results.append(e)
+            db.conn.commit()
+            return results
+
+        try:
+            results = db._retry(execute)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (sql, params, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTime database maintenance")
+    parser.add_argument("command", choices=("migrate", "rebuild-rollup"),
+        help="migrate: upgrade the schema to the current version, rebuild-rollup: recompute the daily_hours rollup")
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.command == "rebuild-rollup":
+        db.rebuild_rollup()
+    db.close()
+
+if __name__ == "__main__":
+    main()
 
 #Can run below to instantiate a database with two test users and a test shift
 #db = Database('timeclockdb.db')
@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class DatabaseWorker:
+    """
+    DatabaseWorker class for running Database calls off the Tk main loop thread
+
+    Work runs in submission order on a single background thread, so a punch submitted after another always sees its
+    effects. Results come back to the Tk thread by polling the future with after(), as tkinter itself is not thread
+    safe. on_pending is called on the Tk thread with the number of outstanding calls whenever it changes and can be
+    used to show a pending indicator.
+
+    Polling runs on the root window rather than on the widget a call is made for, so closing that widget, e.g. a login
+    Toplevel, while the call runs neither leaves the call pending forever nor loses its error.
+
+    """
+
+    def __init__(self, on_pending=None, poll_interval=20, on_error=None):
+        """
+        Args:
+            on_pending (callable): called with the number of outstanding calls whenever it changes
+            poll_interval (int): milliseconds between checks for a finished call
+            on_error (callable): called on the Tk thread with the exception of a failed call that has no errback, or
+                whose widget was closed before it finished. None to raise it into Tk's callback error handler
+        """
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-worker")
+        self.on_pending = on_pending
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.pending = 0
+
+    def submit(self, func, *args):
+        """
+        Function to run func(*args) on the worker thread
+
+        Returns:
+            future (Future) : future for the result of the call
+        """
+        return self.executor.submit(func, *args)
+
+    def call(self, widget, func, *args, callback=None, errback=None):
+        """
+        Function to run func(*args) on the worker thread and hand the result to callback on the Tk thread
+
+        Args:
+            widget (Misc): Tk widget the result is for. callback and errback are skipped once it has been destroyed
+            func (callable): function to run on the worker thread
+            callback (callable): called with the result of func on the Tk thread
+            errback (callable): called with the exception on the Tk thread if func raises, see on_error
+
+        Returns:
+            future (Future) : future for the result of the call
+        """
+        future = self.submit(func, *args)
+        self._set_pending(self.pending + 1)
+        root = widget._root()
+
+        def check():
+            if not future.done():
+                root.after(self.poll_interval, check)
+                return
+            self._set_pending(self.pending - 1)
+            exists = widget.winfo_exists()
+            error = future.exception()
+            if error is not None:
+                if errback is not None and exists:
+                    errback(error)
+                elif self.on_error is not None:
+                    self.on_error(error)
+                else:
+                    raise error
+            elif callback is not None and exists:
+                callback(future.result())
+
+        root.after(self.poll_interval, check)
+        return future
+
+    def shutdown(self):
+        """
+        Function to finish outstanding calls and stop the worker thread
+        """
+        self.executor.shutdown(wait=True)
+
+    def _set_pending(self, pending):
+        self.pending = pending
+        if self.on_pending is not None:
+            self.on_pending(pending)
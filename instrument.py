@@ -0,0 +1,251 @@
+"""
+Opt-in instrumentation for Database.
+
+Pass a Metrics object as Database(..., metrics=Metrics()) to record per-method call counts and latency histograms,
+per-statement latency, commit (fsync) time and a slow-query log holding the SQL and its EXPLAIN QUERY PLAN. Without
+metrics the Database methods run uninstrumented apart from one attribute check per call.
+"""
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+#Upper bounds in seconds of the histogram buckets. Observations above the last bound go in a final overflow bucket
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    """
+    Histogram class of latencies in fixed logarithmic buckets. Not thread safe on its own; Metrics holds a lock.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Function to estimate a percentile as the upper bound of the bucket containing it
+
+        Returns:
+            seconds (float) : estimated percentile, the maximum for the overflow bucket and 0 when empty
+        """
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["inf"], self.counts)),
+        }
+
+class Metrics:
+    """
+    Metrics class collecting Database instrumentation. Safe to share between threads.
+
+    Statements taking longer than slow_query_ms are kept in a bounded slow-query log together with the method that
+    ran them and their EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, slow_query_ms=100, slow_log_size=200):
+        self.slow_query = slow_query_ms / 1000
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.methods = {}
+        self.statements = {}
+        self.commits = Histogram()
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def observe_method(self, name, seconds):
+        with self.lock:
+            self.methods.setdefault(name, Histogram()).observe(seconds)
+
+    def observe_commit(self, seconds):
+        with self.lock:
+            self.commits.observe(seconds)
+
+    def observe_statement(self, conn, sql, params, seconds):
+        key = " ".join(sql.split())
+        with self.lock:
+            self.statements.setdefault(key, Histogram()).observe(seconds)
+        if seconds >= self.slow_query and not key.upper().startswith(("EXPLAIN", "BEGIN", "PRAGMA")):
+            try:
+                plan = [row[3] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params)]
+            except sqlite3.Error as e:
+                plan = [f"unavailable: {e}"]
+            with self.lock:
+                self.slow_queries.append({
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "method": getattr(self.local, "method", None),
+                    "seconds": seconds,
+                    "sql": key,
+                    "plan": plan,
+                })
+
+    def snapshot(self):
+        """
+        Function to copy the current metrics
+
+        Returns:
+            metrics (dict) : methods, statements and commits histograms and the slow-query log
+        """
+        with self.lock:
+            return {
+                "methods": {name: histogram.snapshot() for name, histogram in self.methods.items()},
+                "statements": {sql: histogram.snapshot() for sql, histogram in self.statements.items()},
+                "commits": self.commits.snapshot(),
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def dump(self, path):
+        """
+        Function to write a snapshot of the metrics to path as JSON
+        """
+        with open(path, "w") as out:
+            json.dump(self.snapshot(), out, indent=2)
+
+    def reset(self):
+        with self.lock:
+            self.methods.clear()
+            self.statements.clear()
+            self.commits = Histogram()
+            self.slow_queries.clear()
+
+def timed(func):
+    """
+    Decorator recording the latency of a Database method in self.metrics when instrumentation is enabled
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if metrics is None:
+            return func(self, *args, **kwargs)
+        outer = getattr(metrics.local, "method", None)
+        metrics.local.method = outer or func.__name__
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            metrics.observe_method(func.__name__, time.perf_counter() - start)
+            metrics.local.method = outer
+    return wrapper
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor recording the time of each statement, including fetching its rows, in the connection's Metrics
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._statement = None
+
+    def _finish(self):
+        if self._statement is not None:
+            sql, params, elapsed = self._statement
+            self._statement = None
+            self.connection.metrics.observe_statement(self.connection, sql, params, elapsed)
+
+    def _timed(self, sql, params, call, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            self._statement = (sql, params, time.perf_counter() - start)
+            if self.description is None:
+                self._finish()
+
+    def _fetch(self, call, *args):
+        start = time.perf_counter()
+        rows = call(*args)
+        if self._statement is not None:
+            sql, params, elapsed = self._statement
+            self._statement = (sql, params, elapsed + time.perf_counter() - start)
+        return rows
+
+    def execute(self, sql, params=()):
+        return self._timed(sql, params, super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(sql, (), super().executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        #cursors from Connection.execute are usually dropped after fetchone without reaching the end of their rows
+        self._finish()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors and commits are recorded in metrics. Created through the factory argument of
+    sqlite3.connect; Database sets metrics after connecting.
+    """
+
+    metrics = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    #Connection.execute and executemany open their cursor internally rather than through cursor(), so without these
+    #statements run on the connection would never be recorded
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.metrics.observe_commit(time.perf_counter() - start)
@@ -0,0 +1,364 @@
+"""
+Append-only punch journal.
+
+Pass a file path as Database(..., journal="timeclockdb.journal") to record punches in the journal instead of writing
+them to shifts and breaks directly. A punch is one appended JSON line. Appends from every thread are fsynced together
+in batches and each punch returns as soon as its line is durable, however long a report or backup holds the database
+lock. A replayer thread then applies the entries to shifts and breaks in journal order.
+
+Every entry carries a punch key that is stored with the row it creates, and end punches only close rows still open,
+so applying an entry twice has no effect. On startup the entries left in the journal by a crash are replayed before
+new punches are accepted, and the journal is truncated whenever the replayer has caught up. Replayed entries are
+committed at PRAGMA synchronous = FULL first, so a power cut cannot lose both the row and its journal line.
+
+Only a locked database is waited out. Any other error applying entries, e.g. a read-only file, keeps the journal as
+it is: at startup Database raises it, later the replayer records it once in errors, stops and refuses new punches.
+
+New shifts, breaks and lunches are identified by their punch key (str) rather than an id until replayed; end punches
+accept either.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+#Punch operations, the breaks table breaktype of the break operations and whether they open a row
+OPERATIONS = {
+    "start_shift": (None, True),
+    "end_shift": (None, False),
+    "start_break": ("break", True),
+    "end_break": ("break", False),
+    "start_lunch": ("lunch", True),
+    "end_lunch": ("lunch", False),
+}
+
+def _ref(value):
+    #rows written before journaling, or already replayed and reloaded at login, are referenced by id
+    return ("shiftid" if isinstance(value, int) else "punch_key"), value
+
+def apply_entry(conn, entry):
+    """
+    Function to apply one journal entry to shifts and breaks. Applying an entry again changes nothing.
+
+    Args:
+        conn (Connection): connection inside the transaction applying the entry
+        entry (dict): journal entry, see PunchJournal.punch
+
+    Returns:
+        affected (tuple) : (sql, params) looking up the (empid, shiftid, work_date) the entry changed, see Database._invalidate
+    """
+    op = entry["op"]
+    if op == "start_shift":
+        conn.execute("""INSERT INTO shifts (empid, shift_start, utc_offset, work_date, punch_key) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (punch_key) WHERE punch_key IS NOT NULL DO NOTHING""",
+            (entry["empid"], entry["at"], entry["utc_offset"], entry["work_date"], entry["key"]))
+        return "SELECT empid, shiftid, work_date FROM shifts WHERE punch_key = ?", (entry["key"],)
+    if op == "end_shift":
+        column, value = _ref(entry["shift"])
+        conn.execute(f"UPDATE shifts SET shift_end = ? WHERE {column} = ? AND shift_end IS NULL", (entry["at"], value))
+        return f"SELECT empid, shiftid, work_date FROM shifts WHERE {column} = ?", (value,)
+    breaktype, opens = OPERATIONS[op]
+    if opens:
+        column, value = _ref(entry["shift"])
+        conn.execute(f"""INSERT INTO breaks (empid, shiftid, breaktype, break_start, utc_offset, punch_key)
+            SELECT ?, shiftid, ?, ?, ?, ? FROM shifts WHERE {column} = ?
+            ON CONFLICT (punch_key) WHERE punch_key IS NOT NULL DO NOTHING""",
+            (entry["empid"], breaktype, entry["at"], entry["utc_offset"], entry["key"], value))
+        return f"SELECT empid, shiftid, work_date FROM shifts WHERE {column} = ?", (value,)
+    column, value = ("breakid" if isinstance(entry["break"], int) else "punch_key"), entry["break"]
+    conn.execute(f"UPDATE breaks SET break_end = ? WHERE {column} = ? AND break_end IS NULL", (entry["at"], value))
+    return f"""SELECT shifts.empid, shifts.shiftid, shifts.work_date
+        FROM breaks
+        INNER JOIN shifts
+        ON shifts.shiftid = breaks.shiftid
+        WHERE breaks.{column} = ?""", (value,)
+
+def read_journal(path):
+    """
+    Function to read every complete entry of a journal file. A torn last line left by a crash mid-append is cut off.
+
+    Returns:
+        entries (list) : journal entries in append order
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as file:
+        data = file.read()
+    entries = []
+    good = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            break
+        good += len(line)
+    if good < len(data):
+        with open(path, "r+b") as file:
+            file.truncate(good)
+            os.fsync(file.fileno())
+    return entries
+
+class PunchJournal:
+    """
+    PunchJournal class owning a journal file, the writer thread appending to it and the replayer thread applying it.
+    Created by Database when a journal path is given.
+
+    Appends are batched like GroupCommitWriter: once sync_batch punches are waiting or sync_interval milliseconds have
+    passed since the first, the batch is written with one write and one fsync. Punches that are durable but not yet
+    replayed are kept in pending, so login can report an employee's live state before the database has caught up.
+    """
+
+    def __init__(self, database, path, sync_interval=5, sync_batch=200):
+        self.database = database
+        self.path = path
+        self.sync_interval = sync_interval / 1000
+        self.sync_batch = sync_batch
+        self.pending = []
+        self.errors = []
+        #error that stopped the replayer, see _replay
+        self.failure = None
+        self.lock = threading.Condition()
+        self.epoch = 0
+
+        self.recover()
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.offset = os.fstat(self.fd).st_size
+
+        self.queue = queue.Queue()
+        self.replay_queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write, name="journal-writer", daemon=True)
+        self.replayer = threading.Thread(target=self._replay, name="journal-replayer", daemon=True)
+        self.writer.start()
+        self.replayer.start()
+
+    def recover(self):
+        """
+        Function to apply every entry found in the journal file, then empty it. Run at startup, before new punches
+        """
+        entries = read_journal(self.path)
+        if entries:
+            self._apply(entries)
+        if os.path.exists(self.path):
+            with open(self.path, "r+b") as file:
+                file.truncate(0)
+                os.fsync(file.fileno())
+
+    def punch(self, op, **fields):
+        """
+        Function to append a punch and wait until it is durable
+
+        Args:
+            op (str): one of OPERATIONS
+            fields: the entry's values; at, plus utc_offset, empid and shift for opening punches, shift or break for
+                end punches
+
+        Returns:
+            key (str) : punch key of the entry, which identifies the shift, break or lunch an opening punch starts
+        """
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown punch {op!r}")
+        if self.failure is not None:
+            raise sqlite3.OperationalError(f"Punch journal replay stopped: {self.failure}")
+        entry = dict(fields, op=op, key=uuid.uuid4().hex)
+        future = Future()
+        self.queue.put((entry, future))
+        future.result()
+        return entry["key"]
+
+    def open_state(self, empid, state, keys=(None, None, None)):
+        """
+        Function to apply the pending punches to an employee's live state read from the database
+
+        Pending punches name a shift, break or lunch by its id or by its punch key, as a session keeps the key of a
+        row it opened through the journal even after that row was replayed, so both are matched.
+
+        Args:
+            empid (int): employee id
+            state (tuple): (open shift, open break, open lunch) as returned by Database.login
+            keys (tuple): punch keys of that shift, break and lunch, None where there is no row or no key
+
+        Returns:
+            state (tuple) : the same state after the pending punches, followed by the same keys after them
+        """
+        shift, onbreak, onlunch = state
+        shift_key, break_key, lunch_key = keys
+        #whether a pending entry's reference names the open row, by id or by punch key
+        names = lambda value, row, key: row is not None and (value == row or key is not None and value == key)
+        with self.lock:
+            for entry in self.pending:
+                op = entry["op"]
+                if op == "start_shift" and entry["empid"] == empid:
+                    shift, onbreak, onlunch = entry["key"], None, None
+                    shift_key, break_key, lunch_key = entry["key"], None, None
+                elif op == "end_shift" and names(entry["shift"], shift, shift_key):
+                    shift, onbreak, onlunch = None, None, None
+                    shift_key, break_key, lunch_key = None, None, None
+                elif op == "start_break" and names(entry["shift"], shift, shift_key):
+                    onbreak = break_key = entry["key"]
+                elif op == "end_break" and names(entry["break"], onbreak, break_key):
+                    onbreak = break_key = None
+                elif op == "start_lunch" and names(entry["shift"], shift, shift_key):
+                    onlunch = lunch_key = entry["key"]
+                elif op == "end_lunch" and names(entry["break"], onlunch, lunch_key):
+                    onlunch = lunch_key = None
+        return shift, onbreak, onlunch, shift_key, break_key, lunch_key
+
+    def flush(self, timeout=None):
+        """
+        Function to wait until every durable punch has been replayed into the database
+
+        Returns:
+            replayed (bool) : False when timeout seconds passed first or the replayer stopped on an error
+        """
+        with self.lock:
+            self.lock.wait_for(lambda: not self.pending or self.failure is not None, timeout)
+            return not self.pending
+
+    def close(self):
+        """
+        Function to sync queued punches, wait for the replayer to apply them and stop both threads
+        """
+        self.queue.put(None)
+        self.writer.join()
+        self.replay_queue.put(None)
+        self.replayer.join()
+        with self.lock:
+            if not self.pending:
+                os.ftruncate(self.fd, 0)
+        os.close(self.fd)
+
+    def _write(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            if isinstance(item[0], int):
+                self._checkpoint(*item)
+                continue
+            batch = [item]
+            deadline = time.monotonic() + self.sync_interval
+            while len(batch) < self.sync_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item[0], int):
+                    self._checkpoint(*item)
+                    continue
+                batch.append(item)
+            self._sync(batch)
+
+    def _sync(self, batch):
+        data = b"".join(json.dumps(entry, separators=(",", ":")).encode() + b"\n" for entry, future in batch)
+        try:
+            os.write(self.fd, data)
+            os.fsync(self.fd)
+        except OSError as e:
+            for entry, future in batch:
+                future.set_exception(e)
+            return
+        self.offset += len(data)
+        entries = [entry for entry, future in batch]
+        with self.lock:
+            self.pending.extend(entries)
+        self.replay_queue.put((entries, self.epoch, self.offset))
+        for entry, future in batch:
+            future.set_result(entry["key"])
+
+    def _checkpoint(self, epoch, offset):
+        #only empty the file when nothing was appended since the replayer caught up
+        if epoch == self.epoch and offset == self.offset:
+            os.ftruncate(self.fd, 0)
+            self.offset = 0
+            self.epoch += 1
+
+    def _replay(self):
+        while True:
+            item = self.replay_queue.get()
+            if item is None:
+                return
+            entries, epoch, offset = item
+            #apply everything already durable in one transaction
+            while True:
+                try:
+                    item = self.replay_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.replay_queue.put(None)
+                    break
+                entries = entries + item[0]
+                epoch, offset = item[1], item[2]
+            try:
+                affected = self._apply(entries)
+            except sqlite3.OperationalError as e:
+                #the entries stay in the journal, recover replays them on the next start once the cause is fixed
+                with self.lock:
+                    self.failure = e
+                    self.errors.append((None, repr(e)))
+                    self.lock.notify_all()
+                return
+            with self.lock:
+                del self.pending[:len(entries)]
+                self.lock.notify_all()
+            cache = self.database.report_cache
+            if cache is not None:
+                for sql, params in affected:
+                    self.database._invalidate(sql, params)
+            if self.replay_queue.empty():
+                self.queue.put((epoch, offset))
+
+    def _apply(self, entries):
+        """
+        Function to apply entries in one transaction, waiting out a locked database for as long as it takes. The commit
+        runs at PRAGMA synchronous = FULL, as the journal is emptied once it returns and a WAL commit at NORMAL can be
+        lost to a power cut
+
+        Returns:
+            affected (list) : (sql, params) lookups of the rows changed, see apply_entry
+
+        Raises:
+            sqlite3.OperationalError: an error other than a locked database, e.g. a read-only file or a missing
+                punch_key index. Nothing is applied
+        """
+        db = self.database
+        delay = db.retry_delay
+        db.conn.execute("PRAGMA synchronous = FULL")
+        try:
+            while True:
+                try:
+                    affected = []
+                    db.conn.execute("BEGIN IMMEDIATE")
+                    for entry in entries:
+                        #a bad entry is rolled back on its own and recorded rather than blocking every later punch
+                        try:
+                            db.conn.execute("SAVEPOINT entry")
+                            affected.append(apply_entry(db.conn, entry))
+                            db.conn.execute("RELEASE entry")
+                        except sqlite3.OperationalError:
+                            raise
+                        except (sqlite3.Error, KeyError) as e:
+                            db.conn.execute("ROLLBACK TO entry")
+                            db.conn.execute("RELEASE entry")
+                            self.errors.append((entry, repr(e)))
+                    db.conn.commit()
+                    return affected
+                except sqlite3.OperationalError as e:
+                    db.conn.rollback()
+                    #punches are already durable in the journal, so wait out a locked database rather than drop them
+                    if not ("locked" in str(e) or "busy" in str(e)):
+                        raise
+                    time.sleep(delay)
+                    delay = min(delay * 2, 1)
+        finally:
+            db.conn.execute(f"PRAGMA synchronous = {db.synchronous}")
@@ -0,0 +1,195 @@
+"""
+In-memory board of who is on the clock.
+
+Pass a LiveBoard as Database(..., live=LiveBoard()) to load every employee with an open shift once, when the database
+is opened. From then on service.Session updates the board after each punch it records, so reading the board never
+queries SQLite. Each punch is an O(1) update, and employees are kept per status in the order they entered it, so
+"on lunch for more than an hour" reads only the employees it returns. Punches recorded by other processes, or through
+the Database punch methods without a Session, are not seen until the board is loaded again.
+
+Worked hours follow payroll_summary: breaks are paid, lunches are not.
+"""
+import threading
+import time
+
+#Statuses on the board, as returned by Session.status
+STATUSES = ("Working", "On break", "On lunch")
+
+class LiveBoard:
+    """
+    LiveBoard class holding the live state of every employee on the clock. Safe to share between threads.
+
+    An employee both on break and on lunch, which only admins can be, is listed as on lunch like Session.status. The
+    per-status order assumes punches arrive in time order, which holds for punches stamped as they are recorded.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #empid to the employee's entry, see _entry
+        self.employees = {}
+        #status to {empid: since} in the order employees entered the status, so the longest in a status come first
+        self.statuses = {status: {} for status in STATUSES}
+
+    def load(self, db):
+        """
+        Function to replace the board with the open shifts, breaks and lunches in the database
+
+        Args:
+            db (Database): database to read, called by Database when opened with live
+
+        Returns:
+            count (int) : number of employees on the clock
+        """
+        conn = db.conn
+        shifts = conn.execute("""SELECT shifts.empid, employees.firstname, employees.lastname, shifts.shiftid, shifts.shift_start
+            FROM shifts
+            INNER JOIN employees
+            ON employees.empid = shifts.empid
+            WHERE shifts.shift_end IS NULL
+            ORDER BY shifts.shiftid""").fetchall()
+        breaks = conn.execute("""SELECT breaks.shiftid, breaks.breaktype, breaks.break_start, breaks.break_end
+            FROM breaks
+            INNER JOIN shifts
+            ON shifts.shiftid = breaks.shiftid
+            WHERE shifts.shift_end IS NULL
+            ORDER BY breaks.breakid""").fetchall()
+
+        #like Database.login, an employee's latest open shift is the live one
+        employees = {}
+        for empid, firstname, lastname, shiftid, shift_start in shifts:
+            employees[empid] = (shiftid, self._entry(firstname, lastname, shift_start))
+        live = {shiftid: entry for shiftid, entry in employees.values()}
+        for shiftid, breaktype, break_start, break_end in breaks:
+            entry = live.get(shiftid)
+            if entry is None:
+                continue
+            if break_end is None:
+                entry[breaktype + "_start"] = break_start
+                continue
+            entry["working_since"] = max(entry["working_since"], break_end)
+            if breaktype == "lunch":
+                entry["lunch_seconds"] += break_end - break_start
+
+        with self.lock:
+            self.employees = {}
+            self.statuses = {status: {} for status in STATUSES}
+            for empid, entry in sorted(((empid, entry) for empid, (_, entry) in employees.items()), key=lambda item: self._since(item[1])):
+                self.employees[empid] = entry
+                self.statuses[self._status(entry)][empid] = self._since(entry)
+        return len(employees)
+
+    def clock_in(self, empid, firstname, lastname, at=None):
+        """
+        Function to put an employee on the board, called by Session.clock_in
+
+        Args:
+            empid (int): employee clocking in
+            firstname (str): first name shown on the board
+            lastname (str): last name shown on the board
+            at (float): time of the punch, seconds since the epoch. Defaults to now
+        """
+        at = time.time() if at is None else at
+        with self.lock:
+            self._remove(empid)
+            entry = self._entry(firstname, lastname, at)
+            self.employees[empid] = entry
+            self.statuses["Working"][empid] = at
+
+    def clock_out(self, empid, at=None):
+        """
+        Function to take an employee off the board, called by Session.clock_out
+        """
+        with self.lock:
+            self._remove(empid)
+
+    def start_break(self, empid, at=None):
+        self._punch(empid, "break_start", True, at)
+
+    def end_break(self, empid, at=None):
+        self._punch(empid, "break_start", False, at)
+
+    def start_lunch(self, empid, at=None):
+        self._punch(empid, "lunch_start", True, at)
+
+    def end_lunch(self, empid, at=None):
+        self._punch(empid, "lunch_start", False, at)
+
+    def board(self, status=None, longer_than=None, now=None):
+        """
+        Function to list the employees on the clock
+
+        Args:
+            status (str): only list employees in this status, one of STATUSES. None for every status
+            longer_than (float): only list employees in their status for more than this many seconds
+            now (float): time to measure durations to, seconds since the epoch. Defaults to now
+
+        Returns:
+            rows (list) : (empid, firstname, lastname, status, shift start, status since, minutes in status, worked hours)
+                tuples ordered by status in STATUSES order, longest in the status first. Times are seconds since the epoch
+        """
+        now = time.time() if now is None else now
+        rows = []
+        with self.lock:
+            for name in (STATUSES if status is None else (status,)):
+                for empid, since in self.statuses[name].items():
+                    if longer_than is not None and now - since <= longer_than:
+                        break
+                    entry = self.employees[empid]
+                    lunch = entry["lunch_seconds"] + (now - entry["lunch_start"] if entry["lunch_start"] is not None else 0)
+                    rows.append((empid, entry["firstname"], entry["lastname"], name, entry["shift_start"], since,
+                                 round((now - since) / 60, 1), round((now - entry["shift_start"] - lunch) / 3600, 2)))
+        return rows
+
+    def counts(self):
+        """
+        Function to count the employees in each status
+
+        Returns:
+            counts (dict) : status to number of employees, for every status in STATUSES
+        """
+        with self.lock:
+            return {status: len(self.statuses[status]) for status in STATUSES}
+
+    def _entry(self, firstname, lastname, shift_start):
+        return {"firstname": firstname, "lastname": lastname, "shift_start": shift_start, "working_since": shift_start,
+                "break_start": None, "lunch_start": None, "lunch_seconds": 0}
+
+    def _status(self, entry):
+        if entry["lunch_start"] is not None:
+            return "On lunch"
+        if entry["break_start"] is not None:
+            return "On break"
+        return "Working"
+
+    def _since(self, entry):
+        if entry["lunch_start"] is not None:
+            return entry["lunch_start"]
+        if entry["break_start"] is not None:
+            return entry["break_start"]
+        return entry["working_since"]
+
+    def _punch(self, empid, field, starting, at):
+        """
+        Function to start or end an employee's break or lunch and move the employee to the end of its new status.
+        Punches for employees not on the board are ignored
+        """
+        at = time.time() if at is None else at
+        with self.lock:
+            entry = self.employees.get(empid)
+            if entry is None:
+                return
+            del self.statuses[self._status(entry)][empid]
+            if starting:
+                entry[field] = at
+            else:
+                if field == "lunch_start" and entry["lunch_start"] is not None:
+                    entry["lunch_seconds"] += at - entry["lunch_start"]
+                entry[field] = None
+                entry["working_since"] = at
+            self.statuses[self._status(entry)][empid] = self._since(entry)
+
+    def _remove(self, empid):
+        entry = self.employees.pop(empid, None)
+        if entry is not None:
+            del self.statuses[self._status(entry)][empid]
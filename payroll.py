@@ -0,0 +1,113 @@
+"""
+Parallel end-of-period payroll report run.
+
+Produces the shift report of every employee for a pay period as one CSV file, grouped by employee id. Employees are
+split into contiguous partitions that a ProcessPoolExecutor works through, each worker holding its own read-only
+Database. A worker runs the report of each employee in its partition and formats the CSV rows itself, so the parent
+only concatenates finished partitions in employee order.
+
+Usage:
+    python payroll.py [--db timeclockdb.db] --from 2022-10-01 --to 2022-10-15 [--workers 4] [--breaks] out.csv
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from db import Database
+from report import COLUMNS, ReportQuery
+
+#Read-only Database of the current worker process, opened by _open_worker
+_worker_db = None
+
+def _open_worker(path):
+    global _worker_db
+    _worker_db = Database(path, read_only=True)
+
+def _run_partition(empids, start, end, breaks):
+    """
+    Function run in a worker to produce the CSV rows of one partition of employees
+
+    Returns:
+        text (str) : CSV rows without a header, grouped by employee id in shift start order
+        count (int) : number of rows
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    count = 0
+    #one indexed query per employee is cheaper than one query for the partition sorted back into employee order
+    for empid in empids:
+        rows = _worker_db.report(ReportQuery(empids=[empid], start=start, end=end, breaks=breaks))
+        writer.writerows(rows)
+        count += len(rows)
+    return out.getvalue(), count
+
+def partitions(empids, count):
+    """
+    Function to split sorted employee ids into at most count contiguous partitions of near equal size
+    """
+    size, extra = divmod(len(empids), count)
+    start = 0
+    for i in range(count):
+        end = start + size + (i < extra)
+        if end > start:
+            yield empids[start:end]
+        start = end
+
+def run_payroll(path, out, start=None, end=None, empids=None, breaks=False, workers=None, partition_count=None):
+    """
+    Function to write the shift report of every employee to out as CSV with a COLUMNS header
+
+    Args:
+        path (str): database file
+        out (file): text file to write
+        start (str): first shift date of the pay period, "YYYY-MM-DD", None for no lower bound
+        end (str): last shift date of the pay period, "YYYY-MM-DD", None for no upper bound
+        empids (list): employee ids to report, None for every employee
+        breaks (bool): list each shift's breaks
+        workers (int): worker processes, defaults to the number of CPUs
+        partition_count (int): number of partitions, defaults to four per worker so a slow partition does not hold
+            up the others
+
+    Returns:
+        count (int) : number of rows written
+    """
+    workers = workers or os.cpu_count() or 1
+    if empids is None:
+        db = Database(path, read_only=True)
+        empids = [row[0] for row in db.conn.execute("SELECT empid FROM employees ORDER BY empid")]
+        db.close()
+    empids = sorted({int(empid) for empid in empids})
+
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS if breaks else COLUMNS[:7])
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker, initargs=(path,)) as executor:
+        chunks = list(partitions(empids, partition_count or workers * 4))
+        #map yields in submission order, so partitions are written in employee order as soon as each is ready
+        for text, rows in executor.map(_run_partition, chunks, repeat(start), repeat(end), repeat(breaks)):
+            out.write(text)
+            count += rows
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="CSV file to write, - for stdout")
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    parser.add_argument("--from", dest="start", help="first shift date of the pay period, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last shift date of the pay period, YYYY-MM-DD")
+    parser.add_argument("--emp", dest="empids", type=int, action="append", help="report only this employee id, repeatable")
+    parser.add_argument("--breaks", action="store_true", help="list each shift's breaks")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    out = sys.stdout if args.file == "-" else open(args.file, "w", newline="")
+    with out:
+        count = run_payroll(args.db, out, args.start, args.end, args.empids, args.breaks, args.workers)
+    print(f"{count} rows", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import calendar
+import copy
+import datetime
+import json
+
+#Report columns in the order rows are returned. Reports without breaks stop after 'Shift End'
+COLUMNS = ('Employee ID', 'Shift ID', 'First Name', 'Last Name', 'Shift Date', 'Shift Start', 'Shift End', 'Break ID', 'Break Type', 'Break Start', 'Break End')
+
+BREAK_TYPES = ("break", "lunch")
+STATUSES = ("open", "closed")
+
+#Expression each report column sorts by in ReportQuery.keys_sql. Dates and times sort by the stored instant rather than
+#by the displayed local text, so Shift Date and Shift Start both sort chronologically
+SORT_KEYS = {
+    'Employee ID': "shifts.empid",
+    'Shift ID': "shifts.shiftid",
+    'First Name': "employees.firstname",
+    'Last Name': "employees.lastname",
+    'Shift Date': "shifts.shift_start",
+    'Shift Start': "shifts.shift_start",
+    'Shift End': "shifts.shift_end",
+    'Break ID': "breaks.breakid",
+    'Break Type': "breaks.breaktype",
+    'Break Start': "breaks.break_start",
+    'Break End': "breaks.break_end",
+}
+
+#Widest UTC offsets in seconds. A work_date's shifts start within these of its UTC midnight, see ReportQuery._where
+EARLIEST_OFFSET = 14 * 3600
+LATEST_OFFSET = 12 * 3600
+
+def work_date(date):
+    """
+    Function to convert a "YYYY-MM-DD" date into the integer YYYYMMDD stored in shifts.work_date
+
+    Raises:
+        ValueError: date is not a real calendar date written as YYYY-MM-DD
+    """
+    try:
+        parsed = datetime.date.fromisoformat(date)
+    except (TypeError, ValueError):
+        parsed = None
+    #newer Pythons also accept forms like "20260101" or "2026-W01-1", so only the exact YYYY-MM-DD spelling is taken
+    if parsed is None or parsed.isoformat() != date:
+        raise ValueError(f"Dates must be real dates in YYYY-MM-DD format, not {date!r}")
+    return int(parsed.strftime("%Y%m%d"))
+
+def _midnight(date):
+    #UTC epoch of midnight UTC starting a "YYYY-MM-DD" date
+    return calendar.timegm(datetime.date.fromisoformat(date).timetuple())
+
+class ReportQuery:
+    """
+    ReportQuery class building a single shift report statement from a set of optional filters. See Database.report
+
+    Each filter only adds its own predicate, and list filters are passed as one JSON array parameter read with json_each
+    rather than a variable number of placeholders. The statement text therefore depends only on which filters are set,
+    so every search reuses one of a handful of prepared statements from the connection's statement cache, and the
+    predicates stay index friendly: date ranges are range scans on idx_shifts_start in report order, employee lists
+    search idx_shifts_empid_start or idx_shifts_empid_work_date, shift ids search the rowid and open shifts search
+    idx_shifts_open. tests/test_query_plans.py checks every combination against EXPLAIN QUERY PLAN.
+
+    """
+
+    def __init__(self, empids=None, shiftids=None, start=None, end=None, breaktypes=None, status=None, breaks=False):
+        """
+        Args:
+            empids (list): employee ids to include, None for all employees
+            shiftids (list): shift ids to include, None for all shifts
+            start (str): first shift date to include, "YYYY-MM-DD", None for no lower bound
+            end (str): last shift date to include, "YYYY-MM-DD", None for no upper bound
+            breaktypes (list): break types to list with each shift, any of BREAK_TYPES. Implies breaks
+            status (str): "open" for shifts still in progress, "closed" for ended shifts, None for both
+            breaks (bool): list each shift's breaks, one row per break
+        """
+        if status not in (None,) + STATUSES:
+            raise ValueError(f"Unknown shift status {status!r}")
+        if breaktypes is not None and not set(breaktypes) <= set(BREAK_TYPES):
+            raise ValueError(f"Unknown break types {breaktypes!r}")
+        for date in (start, end):
+            if date is not None:
+                work_date(date)
+        self.empids = None if empids is None else [int(empid) for empid in empids]
+        self.shiftids = None if shiftids is None else [int(shiftid) for shiftid in shiftids]
+        self.start = start
+        self.end = end
+        self.breaktypes = None if breaktypes is None else list(breaktypes)
+        self.status = status
+        self.breaks = breaks or breaktypes is not None
+
+    @classmethod
+    def from_search(cls, empid, shiftid):
+        """
+        Function to build the query for the original Employee ID / Shift ID search, where "" means no filter and breaks
+        are listed only when a shift id is given
+
+        Returns:
+            query (ReportQuery) : equivalent query
+        """
+        return cls(empids=None if empid == "" else [empid], shiftids=None if shiftid == "" else [shiftid], breaks=shiftid != "")
+
+    def key(self):
+        """
+        Function to normalize the filters into a hashable value; equal keys select the same rows
+        """
+        normalize = lambda values: None if values is None else tuple(sorted(set(values)))
+        return (normalize(self.empids), normalize(self.shiftids), self.start, self.end, normalize(self.breaktypes), self.status, self.breaks)
+
+    def restrict(self, shiftids):
+        """
+        Function to narrow the query to a set of shift ids, e.g. one window of report_keys
+
+        Returns:
+            query (ReportQuery) : copy of the query also filtered on shiftids
+        """
+        query = copy.copy(self)
+        query.shiftids = [int(shiftid) for shiftid in shiftids]
+        return query
+
+    def _ordered(self, column):
+        #with a filter on employees, shift ids or open shifts the order column is wrapped in a no-op +, so the planner
+        #searches the filter's index and sorts the matches rather than walking idx_shifts_start over every shift, which
+        #it prefers once the tables are analyzed as it cannot tell how many values a json_each list holds. Date filters
+        #keep the order, as their shift_start bounds make walking idx_shifts_start a range search
+        selective = self.empids is not None or self.shiftids is not None or self.status == "open"
+        return "+" + column if selective else column
+
+    def _where(self, after):
+        clauses = []
+        params = []
+        if self.empids is not None:
+            clauses.append("shifts.empid IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(self.empids))
+        if self.shiftids is not None:
+            clauses.append("shifts.shiftid IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(self.shiftids))
+        #work_date bounds, plus the shift_start range they imply so idx_shifts_start can be range searched in report order
+        if self.start is not None:
+            clauses.append("shifts.work_date >= ? AND shifts.shift_start >= ?")
+            params.extend([work_date(self.start), _midnight(self.start) - EARLIEST_OFFSET])
+        if self.end is not None:
+            clauses.append("shifts.work_date <= ? AND shifts.shift_start < ?")
+            params.extend([work_date(self.end), _midnight(self.end) + 86400 + LATEST_OFFSET])
+        if self.status == "open":
+            clauses.append("shifts.shift_end IS NULL")
+        elif self.status == "closed":
+            clauses.append("shifts.shift_end IS NOT NULL")
+        if after is not None:
+            clauses.append("(shifts.shift_start, shifts.shiftid) > (?, ?)")
+            params.extend(after)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def depends(self, empid, shiftid, date):
+        """
+        Function to decide whether a punch on a shift can change the rows matching the filters. See reportcache.py
+
+        Args:
+            empid (int): employee punched
+            shiftid (int): shift punched or holding the break punched
+            date (int): work_date of that shift, YYYYMMDD
+        """
+        if self.empids is not None and empid not in self.empids:
+            return False
+        if self.shiftids is not None and shiftid not in self.shiftids:
+            return False
+        if self.start is not None and date < work_date(self.start):
+            return False
+        if self.end is not None and date > work_date(self.end):
+            return False
+        return True
+
+    def needs(self, first_date, last_date, first_shiftid, last_shiftid):
+        """
+        Function to decide whether rows in an archive of closed shifts can match the filters
+
+        Args:
+            first_date (int): earliest work_date in the archive, YYYYMMDD
+            last_date (int): latest work_date in the archive, YYYYMMDD
+            first_shiftid (int): lowest shift id in the archive
+            last_shiftid (int): highest shift id in the archive
+
+        Returns:
+            needed (bool) : False when no archived shift can match
+        """
+        if self.status == "open":
+            return False
+        if self.start is not None and work_date(self.start) > last_date:
+            return False
+        if self.end is not None and work_date(self.end) < first_date:
+            return False
+        if self.shiftids is not None and not any(first_shiftid <= shiftid <= last_shiftid for shiftid in self.shiftids):
+            return False
+        return True
+
+    def _breaks_join(self, table, schema):
+        if not self.breaks:
+            return "", []
+        join = f"LEFT JOIN {schema}.breaks AS breaks ON breaks.shiftid = {table}.shiftid"
+        if self.breaktypes is not None:
+            return join + " AND breaks.breaktype IN (SELECT value FROM json_each(?))", [json.dumps(self.breaktypes)]
+        return join, []
+
+    def _columns(self, table, names):
+        columns = f"""{table}.empid, {table}.shiftid, {names}.firstname, {names}.lastname,
+            date({table}.shift_start + {table}.utc_offset,'unixepoch'), time({table}.shift_start + {table}.utc_offset,'unixepoch'),
+            time({table}.shift_end + {table}.utc_offset,'unixepoch')"""
+        if self.breaks:
+            columns += """, breaks.breakid, breaks.breaktype, time(breaks.break_start + breaks.utc_offset,'unixepoch'),
+            time(breaks.break_end + breaks.utc_offset,'unixepoch')"""
+        return columns + f", {self._ordered(table + '.shift_start')}"
+
+    def _order(self):
+        #output positions of the raw shift_start, shiftid and breakid, so the order applies across a UNION ALL
+        return f"{len(COLUMNS if self.breaks else COLUMNS[:7]) + 1}, 2" + (", 8" if self.breaks else "")
+
+    def sql(self, schemas=("main",)):
+        """
+        Function to build the statement for the whole report
+
+        Args:
+            schemas (tuple): databases holding shifts and breaks tables to read, main for the live tables and the
+                names of attached archives. Employees are always read from main
+
+        Returns:
+            sql (str) : statement returning rows in COLUMNS layout followed by the raw shift_start, ordered by shift start
+            params (list) : parameters for the statement
+        """
+        parts = []
+        params = []
+        for schema in schemas:
+            where, where_params = self._where(None)
+            join, join_params = self._breaks_join("shifts", schema)
+            parts.append(f"""SELECT {self._columns("shifts", "employees")}
+                FROM {schema}.shifts AS shifts
+                INNER JOIN main.employees AS employees
+                ON employees.empid = shifts.empid
+                {join}
+                {where}""")
+            params.extend(join_params + where_params)
+        return "\nUNION ALL\n".join(parts) + f"\nORDER BY {self._order()}", params
+
+    def page_sql(self, after, limit, schemas=("main",)):
+        """
+        Function to build the statement for one page of the report, keyed on (shift_start, shiftid). With several
+        schemas each contributes up to limit shifts, so the caller keeps only the first limit shifts of the result
+
+        Args:
+            after (tuple): (shift_start, shiftid) of the last shift on the previous page, None for the first page
+            limit (int): maximum number of shifts on the page
+            schemas (tuple): databases to read, see sql
+
+        Returns:
+            sql (str) : statement returning rows in COLUMNS layout followed by the raw shift_start
+            params (list) : parameters for the statement
+        """
+        parts = []
+        params = []
+        for schema in schemas:
+            where, where_params = self._where(after)
+            join, join_params = self._breaks_join("page", schema)
+            parts.append(f"""SELECT {self._columns("page", "page")}
+                FROM (SELECT shifts.*, employees.firstname, employees.lastname
+                    FROM {schema}.shifts AS shifts
+                    INNER JOIN main.employees AS employees
+                    ON employees.empid = shifts.empid
+                    {where}
+                    ORDER BY {self._ordered("shifts.shift_start")}, shifts.shiftid LIMIT ?) AS page
+                {join}""")
+            params.extend(where_params + [limit] + join_params)
+        return "\nUNION ALL\n".join(parts) + f"\nORDER BY {self._order()}", params
+
+    def keys_sql(self, sort=None, descending=False, schemas=("main",)):
+        """
+        Function to build the statement listing the key of every report row in a chosen order. Only the keys and the
+        sort value are read, see Database.report_keys
+
+        Args:
+            sort (str): report column to order by, one of COLUMNS, None for shift start order
+            descending (bool): reverse the order
+            schemas (tuple): databases to read, see sql
+
+        Returns:
+            sql (str) : statement returning (shiftid, sort value) rows, or (shiftid, breakid, sort value) when breaks
+                are listed, with ties ordered by shiftid then breakid
+            params (list) : parameters for the statement
+        """
+        sort = sort or 'Shift Start'
+        if sort not in (COLUMNS if self.breaks else COLUMNS[:7]):
+            raise ValueError(f"Cannot sort this report by {sort!r}")
+        keys = ["shiftid", "breakid"] if self.breaks else ["shiftid"]
+        parts = []
+        params = []
+        for schema in schemas:
+            where, where_params = self._where(None)
+            join, join_params = self._breaks_join("shifts", schema)
+            parts.append(f"""SELECT shifts.shiftid{", breaks.breakid" if self.breaks else ""}, {self._ordered(SORT_KEYS[sort])} AS sort_key
+                FROM {schema}.shifts AS shifts
+                INNER JOIN main.employees AS employees
+                ON employees.empid = shifts.empid
+                {join}
+                {where}""")
+            params.extend(join_params + where_params)
+        direction = " DESC" if descending else ""
+        order = ", ".join(f"{column}{direction}" for column in ["sort_key"] + keys)
+        return f"SELECT {', '.join(keys)}, sort_key FROM ({' UNION ALL '.join(parts)}) ORDER BY {order}", params
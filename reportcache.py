@@ -0,0 +1,138 @@
+"""
+In-process LRU cache for report results.
+
+Pass a ReportCache as Database(..., report_cache=ReportCache()) to keep the rows of recent report, report_page and
+payroll_summary calls. Each entry remembers which punches it depends on, and the Database write methods invalidate
+only the entries a punch for that employee, shift and work date could change. Before each lookup the Database reads
+PRAGMA data_version and clears the whole cache when another connection, e.g. another process, has committed since its
+last lookup, see Database._check_cache.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+def _size(rows):
+    """
+    Function to estimate the memory held by a list of row tuples in bytes
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+class ReportCache:
+    """
+    ReportCache class mapping a normalized query key to its rows, least recently used first. Safe to share between threads.
+
+    Bounded both by number of entries and by the estimated size of the cached rows; results larger than max_bytes on
+    their own are never cached.
+
+    """
+
+    def __init__(self, max_entries=128, max_bytes=32 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): most results kept
+            max_bytes (int): most estimated bytes of rows kept
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        #bumped by every invalidation, so a result computed while a punch was written is not cached
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Function to look up a cached result
+
+        Returns:
+            value (object) : cached value, None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, depends, generation, rows=None):
+        """
+        Function to cache a result
+
+        Args:
+            key (tuple): normalized query key
+            value (object): result to return from get
+            depends (callable): called with (empid, shiftid, work_date) of a written punch, returns True when the
+                result may have changed
+            generation (int): value of generation read before the result was computed
+            rows (list): the rows held by value, for the size estimate. Defaults to value
+        """
+        size = _size(value if rows is None else rows)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[2]
+            self.entries[key] = (value, depends, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def invalidate(self, empid, shiftid, work_date):
+        """
+        Function to drop every entry depending on a punch
+
+        Args:
+            empid (int): employee punched
+            shiftid (int): shift punched or holding the break punched
+            work_date (int): work_date of that shift, YYYYMMDD
+        """
+        with self.lock:
+            self.generation += 1
+            stale = [key for key, (_, depends, _) in self.entries.items() if depends(empid, shiftid, work_date)]
+            for key in stale:
+                self.bytes -= self.entries.pop(key)[2]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """
+        Function to drop every entry, e.g. after punches were changed outside the Database write methods
+        """
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Function to copy the cache counters
+
+        Returns:
+            stats (dict) : hits, misses, hit_rate, entries, bytes, evictions and invalidations
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,150 @@
+"""
+Virtual scrolling Treeview for reports far larger than Tk can hold as items.
+
+Only the rows in view exist as Treeview items, and scrolling reuses them with new values. Rows are read in blocks on
+demand through a fetch function and the most recently used blocks are kept, along with the blocks either side of the
+view, so scrolling back and forth and paging ahead do not wait on the database. Clicking a column heading asks the
+owner to re-sort through on_sort rather than sorting items in Tk. See shift_report in simpletime.py
+"""
+from collections import OrderedDict
+from tkinter import *
+from tkinter.ttk import Treeview
+
+class VirtualTreeview(Frame):
+    """
+    VirtualTreeview class showing rows 0 to total - 1 of a source read by position.
+
+    fetch(start, stop, callback) must read rows start to stop - 1 and later call callback(rows) on the Tk thread, e.g.
+    through DatabaseWorker.call, or callback(None) if the read failed so the block is read again when next in view.
+    Results from a source replaced by show since the fetch was made are dropped.
+
+    """
+
+    def __init__(self, master, columns, height=8, block_size=200, blocks=20, on_sort=None):
+        """
+        Args:
+            master (Misc): parent widget
+            columns (tuple): column names, also used as headings
+            height (int): number of rows in view
+            block_size (int): number of rows read per fetch
+            blocks (int): most blocks kept in memory
+            on_sort (callable): called with (column, descending) when a heading is clicked, None to disable sorting
+        """
+        super().__init__(master)
+        self.columns = columns
+        self.height = height
+        self.block_size = block_size
+        self.max_blocks = max(blocks, 3)
+        self.on_sort = on_sort
+
+        self.tree = Treeview(self, columns=columns, show='headings', height=height, selectmode='browse')
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda column=column: self._heading_clicked(column))
+        self.scrollbar = Scrollbar(self, command=self._scroll)
+        self.tree.pack(fill=X, side=LEFT)
+        self.scrollbar.pack(fill=Y, side=LEFT)
+        #Windows and macOS report wheel motion in <MouseWheel>, X11 as buttons 4 and 5
+        self.tree.bind('<MouseWheel>', lambda event: self._scroll('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda event: self._scroll('scroll', -1, 'units'))
+        self.tree.bind('<Button-5>', lambda event: self._scroll('scroll', 1, 'units'))
+
+        self.items = []
+        self.show(0, None)
+
+    def show(self, total, fetch, sort=None, descending=False):
+        """
+        Function to replace the rows shown and scroll back to the top
+
+        Args:
+            total (int): number of rows in the source
+            fetch (callable): reads rows by position, see VirtualTreeview
+            sort (str): column the source is ordered by, marked in its heading. None for no mark
+            descending (bool): whether that order is descending
+        """
+        self.total = total
+        self.fetch = fetch
+        self.sort = sort
+        self.descending = descending
+        self.top = 0
+        self.blocks = OrderedDict()
+        self.loading = set()
+        #identifies the current source, so blocks fetched for an earlier one are dropped
+        self.source = object()
+        for column in self.columns:
+            mark = (" ▼" if descending else " ▲") if column == sort else ""
+            self.tree.heading(column, text=column + mark)
+        self._render()
+
+    def _heading_clicked(self, column):
+        if self.on_sort is not None:
+            self.on_sort(column, column == self.sort and not self.descending)
+
+    def _scroll(self, action, amount, unit=None):
+        """
+        Scrollbar command and mouse wheel handler, moving the view to a position rather than scrolling items
+        """
+        if action == 'moveto':
+            top = int(float(amount) * self.total)
+        elif unit == 'pages':
+            top = self.top + int(amount) * self.height
+        else:
+            top = self.top + int(amount)
+        top = max(min(top, self.total - self.height), 0)
+        if top != self.top:
+            self.top = top
+            self.tree.selection_remove(self.tree.selection())
+            self._render()
+
+    def _render(self):
+        """
+        Function to show the rows in view on the reused Treeview items and fetch the blocks around them
+        """
+        count = max(min(self.height, self.total - self.top), 0)
+        while len(self.items) < count:
+            self.items.append(self.tree.insert('', END))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        for offset, item in enumerate(self.items):
+            row = self._row(self.top + offset)
+            self.tree.item(item, values=row if row is not None else ())
+        if self.total:
+            self.scrollbar.set(self.top / self.total, (self.top + count) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+        first = self.top // self.block_size
+        last = (self.top + max(count - 1, 0)) // self.block_size
+        #the blocks in view first, then one either side so the next scroll finds its rows already read
+        for block in list(range(first, last + 1)) + [last + 1, first - 1]:
+            self._load(block)
+
+    def _row(self, position):
+        block = self.blocks.get(position // self.block_size)
+        if block is None:
+            return None
+        offset = position % self.block_size
+        return block[offset] if offset < len(block) else None
+
+    def _load(self, block):
+        start = block * self.block_size
+        if self.fetch is None or block < 0 or start >= self.total or block in self.loading:
+            return
+        if block in self.blocks:
+            self.blocks.move_to_end(block)
+            return
+        self.loading.add(block)
+        source = self.source
+
+        def loaded(rows):
+            if source is not self.source:
+                return
+            self.loading.discard(block)
+            if rows is None:
+                return
+            self.blocks[block] = rows
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+            if start < self.top + self.height and start + self.block_size > self.top:
+                self._render()
+
+        self.fetch(start, min(start + self.block_size, self.total), loaded)
@@ -0,0 +1,172 @@
+"""
+Headless SimpleTime server exposing the punch service as a local HTTP/JSON API.
+
+One server process owns the database file and every kiosk or payroll job talks to it, rather than each opening
+timeclockdb.db. Punches from concurrent terminals are written through Database group commit.
+
+Endpoints (request and response bodies are JSON):
+    POST /login   {"username", "password"}  -> {"token", "state"}
+    POST /punch   {"token", "action"}       -> {"id", "state"}     action is one of TimeclockService.ACTIONS
+    POST /logout  {"token"}                 -> {}
+    GET  /health                            -> {"status": "ok"}
+
+Errors are returned as {"error", "message"} with status 400 (bad request), 401 (bad credentials or token),
+404 (unknown path) or 409 (punch not allowed in the current state).
+
+Usage:
+    python server.py [--db timeclockdb.db] [--host 127.0.0.1] [--port 8080]
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from db import Database
+from service import PunchError, TimeclockService
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    """
+    Raised by request handlers to return an error response
+    """
+
+    def __init__(self, status, error, message):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+        self.message = message
+
+class TimeclockServer:
+    """
+    TimeclockServer class serving a TimeclockService over HTTP/1.1 with keep-alive.
+
+    Requests are parsed on the asyncio loop; service calls, which block on SQLite, run on a thread pool so the loop
+    keeps accepting requests from other terminals while punches wait for their group commit.
+
+    """
+
+    def __init__(self, service, threads=64):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="timeclock")
+
+    async def serve(self, host, port):
+        """
+        Function to accept connections until cancelled
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        """
+        Function to route a request to its handler
+
+        Returns:
+            status (int) : HTTP status code
+            payload (dict) : JSON response body
+        """
+        routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/login"): self.login,
+            ("POST", "/punch"): self.punch,
+            ("POST", "/logout"): self.logout,
+        }
+        try:
+            handler = routes.get((method, path))
+            if handler is None:
+                raise HTTPError(404, "Not Found", f"No endpoint {method} {path}")
+            try:
+                request = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "Bad Request", "Request body is not valid JSON")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "Bad Request", "Request body must be a JSON object")
+            return 200, await handler(request)
+        except HTTPError as e:
+            return e.status, {"error": e.error, "message": e.message}
+        except Exception as e:
+            return 500, {"error": "Internal Server Error", "message": str(e)}
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def health(self, request):
+        return {"status": "ok"}
+
+    async def login(self, request):
+        token, session = await self.run(self.service.login, request.get("username", ""), request.get("password", ""))
+        if token is None:
+            raise HTTPError(401, "Unsuccessful Login", "Login unsuccessful")
+        return {"token": token, "state": session.state()}
+
+    async def punch(self, request):
+        try:
+            punch_id, session = await self.run(self.service.punch, request.get("token"), request.get("action"))
+        except KeyError:
+            raise HTTPError(401, "Unknown Session", "Token does not belong to an open session")
+        except ValueError as e:
+            raise HTTPError(400, "Bad Request", str(e))
+        except PunchError as e:
+            raise HTTPError(409, e.title, e.message)
+        return {"id": punch_id, "state": session.state()}
+
+    async def logout(self, request):
+        self.service.logout(request.get("token"))
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="timeclockdb.db", help="database file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=64, help="threads running service calls")
+    parser.add_argument("--commit-interval", type=int, default=5, help="group commit interval in milliseconds")
+    args = parser.parse_args()
+
+    db = Database(args.db, group_commit=True, commit_interval=args.commit_interval)
+    server = TimeclockServer(TimeclockService(db), threads=args.threads)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
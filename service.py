@@ -0,0 +1,228 @@
+import secrets
+import threading
+
+class PunchError(Exception):
+    """
+    Raised when a punch is not allowed in the employee's current state. title and message are suitable for showing to
+    the employee as-is.
+    """
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+
+class Session:
+    """
+    Session class holding an employee's punch state machine, independent of any UI.
+
+    Class properties includes employee information corresponding to database and bool variables for decision making.
+    Each punch method checks the current state, records the punch in the database and only then updates the state, so
+    a failed database call leaves the session unchanged. Invalid punches raise PunchError. Recorded punches are also
+    applied to the database's LiveBoard, when it has one. See live.py
+
+    """
+
+    def __init__(self, db, empID, firstname, lastname, admin: bool, working=False, onbreak=False, onlunch=False):
+
+        self.db = db
+        self.empID = empID
+        self.firstname = firstname
+        self.lastname = lastname
+        self.admin = admin
+        self.working = working
+        self.onbreak = onbreak
+        self.onlunch = onlunch
+        self.current_shift = ''
+        self.current_break = ''
+        self.current_lunch = ''
+
+    def resume(self, shiftid, breakid, lunchid):
+        """
+        Function to restore the live state returned by Database.login, so a session reopened after logging out or a
+        kiosk restart continues the open shift, break or lunch
+
+        Args:
+            shiftid (int): open shift, None if clocked out
+            breakid (int): open break on that shift, None if not on break
+            lunchid (int): open lunch on that shift, None if not on lunch
+        """
+        self.working = shiftid is not None
+        self.onbreak = breakid is not None
+        self.onlunch = lunchid is not None
+        self.current_shift = shiftid if shiftid is not None else ''
+        self.current_break = breakid if breakid is not None else ''
+        self.current_lunch = lunchid if lunchid is not None else ''
+        return self
+
+    def status(self):
+        """
+        Function to describe the current state for display
+
+        Returns:
+            status (str) : "On lunch", "On break", "Working" or "Clocked out"
+        """
+        if self.onlunch:
+            return "On lunch"
+        if self.onbreak:
+            return "On break"
+        if self.working:
+            return "Working"
+        return "Clocked out"
+
+    def clock_in(self):
+        if self.working:
+            raise PunchError("Clock In Error", "You are already clocked in")
+        self.current_shift = self.db.start_shift(self.empID)
+        self.working = True
+        if self.db.live is not None:
+            self.db.live.clock_in(self.empID, self.firstname, self.lastname)
+        return self.current_shift
+
+    def clock_out(self):
+        if self.working and (not self.onbreak and not self.onlunch or self.admin):
+            self.db.end_shift(self.current_shift)
+            self.working = False
+            if self.db.live is not None:
+                self.db.live.clock_out(self.empID)
+            return self.current_shift
+        elif self.onbreak:
+            raise PunchError("Clock Out Error", "Clock Out Error.\nPlease end your break before clocking out.")
+        elif self.onlunch:
+            raise PunchError("Clock Out Error", "Clock Out Error.\nPlease end your lunch before clocking out.")
+        else:
+            raise PunchError("Clock Out Error", "You must be clocked in to be able to clock out")
+
+    def take_break(self):
+        if (self.working and not self.onbreak and not self.onlunch) or self.admin:
+            self.current_break = self.db.start_break(self.empID, self.current_shift)
+            self.onbreak = True
+            if self.db.live is not None:
+                self.db.live.start_break(self.empID)
+            return self.current_break
+        elif not self.working:
+            raise PunchError("Break Error", "You must be clocked in to be able to take a break")
+        elif self.onlunch:
+            raise PunchError("Break Error", "You are on currently on lunch. Unable to take break")
+        else:
+            raise PunchError("Break Error", "You are already on break")
+
+    def end_break(self):
+        if not self.onbreak:
+            raise PunchError("Break Error", "You are not currently taking a break")
+        self.db.end_break(self.current_break)
+        self.onbreak = False
+        if self.db.live is not None:
+            self.db.live.end_break(self.empID)
+        return self.current_break
+
+    def take_lunch(self):
+        if (self.working and not self.onbreak and not self.onlunch) or self.admin:
+            self.current_lunch = self.db.start_lunch(self.empID, self.current_shift)
+            self.onlunch = True
+            if self.db.live is not None:
+                self.db.live.start_lunch(self.empID)
+            return self.current_lunch
+        elif not self.working:
+            raise PunchError("Lunch Error", "You must be clocked in to be able to take a lunch")
+        elif self.onbreak:
+            raise PunchError("Lunch Error", "You are currently on break. Unable to take a lunch")
+        else:
+            raise PunchError("Lunch Error", "You are already on lunch")
+
+    def end_lunch(self):
+        if not self.onlunch:
+            raise PunchError("Lunch Error", "You are not currently taking a lunch")
+        self.db.end_lunch(self.current_lunch)
+        self.onlunch = False
+        if self.db.live is not None:
+            self.db.live.end_lunch(self.empID)
+        return self.current_lunch
+
+    def state(self):
+        """
+        Function to describe the session for API responses
+
+        Returns:
+            state (dict) : employee information and current punch state
+        """
+        return {
+            "empid": self.empID,
+            "firstname": self.firstname,
+            "lastname": self.lastname,
+            "admin": bool(self.admin),
+            "working": self.working,
+            "onbreak": self.onbreak,
+            "onlunch": self.onlunch,
+            "status": self.status(),
+            "current_shift": self.current_shift or None,
+            "current_break": self.current_break or None,
+            "current_lunch": self.current_lunch or None,
+        }
+
+    def __str__(self):
+        return f"Employee ID: {self.empID}\tEmployee Name: {self.firstname} {self.lastname} {self.admin}"
+
+class TimeclockService:
+    """
+    TimeclockService class managing sessions for many terminals sharing one Database. See server.py
+
+    Logins hand out an opaque token per session. Punches on the same session are serialized with a per-session lock,
+    punches on different sessions may run concurrently from any thread.
+
+    """
+
+    #Punch actions accepted by punch, mapped to Session methods
+    ACTIONS = ("clock_in", "clock_out", "take_break", "end_break", "take_lunch", "end_lunch")
+
+    def __init__(self, db):
+        self.db = db
+        self.sessions = {}
+        self.locks = {}
+
+    def login(self, username, password):
+        """
+        Function to validate credentials and open a session
+
+        Returns:
+            token (str) : token identifying the session, None if the credentials are invalid
+            session (Session) : the new session, None if the credentials are invalid
+        """
+        row = self.db.login(username, password)
+        if row is None:
+            return None, None
+        session = Session(self.db, row[0], row[2], row[3], row[5]).resume(*row[6:9])
+        token = secrets.token_urlsafe(16)
+        self.locks[token] = threading.Lock()
+        self.sessions[token] = session
+        return token, session
+
+    def logout(self, token):
+        """
+        Function to discard a session. Unknown tokens are ignored.
+        """
+        self.sessions.pop(token, None)
+        self.locks.pop(token, None)
+
+    def punch(self, token, action):
+        """
+        Function to perform a punch on a session
+
+        Args:
+            token (str): token returned by login
+            action (str): one of ACTIONS
+
+        Returns:
+            id (int) : shiftid or breakid affected by the punch
+            session (Session) : the session after the punch
+
+        Raises:
+            KeyError: token does not belong to an open session
+            ValueError: action is not one of ACTIONS
+            PunchError: punch is not allowed in the session's current state
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown action {action!r}")
+        session = self.sessions[token]
+        with self.locks[token]:
+            return getattr(session, action)(), session
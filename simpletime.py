@@ -1,21 +1,60 @@
 from tkinter import *
 import tkinter.messagebox as messagebox
+import tkinter.filedialog as filedialog
+import time
 from datetime import datetime
 from tkinter.ttk import Treeview
+from backup import SnapshotSchedule
 from db import Database
-
-
-#Establish database for use with this application. Change filename if needed.
-db = Database('timeclockdb.db')
-
-class Employee():
+from instrument import Metrics
+from live import STATUSES as LIVE_STATUSES, LiveBoard
+from reportcache import ReportCache
+from dbworker import DatabaseWorker
+from service import PunchError, Session
+from report import BREAK_TYPES, COLUMNS, STATUSES, ReportQuery, work_date
+from reportview import VirtualTreeview
+
+
+#Database for use with this application, opened by main so importing this module has no side effects. Change
+#filename in main if needed.
+#metrics collects timings for the Diagnostics screen; pass metrics=None to turn instrumentation off.
+#report_cache keeps recent report results so repeated searches skip the query; pass report_cache=None to turn it off
+metrics = Metrics()
+report_cache = ReportCache()
+#live_board tracks who is on the clock for the On The Clock screen, updated by every punch without querying the database
+live_board = LiveBoard()
+db = None
+
+#All database calls from the UI run on this worker so a slow commit or large report never freezes the Tk main loop.
+#status_text is shown on each screen while calls are outstanding. Started by main
+worker = None
+status_text = None
+
+#Number of rows read per block in the shift report and most blocks kept; see reportview.py
+REPORT_BLOCK_SIZE = 200
+REPORT_BLOCKS = 20
+#Query of the current shift report search, and the row keys it listed for the current sort
+report_search = None
+report_keys = None
+#Pending after() id of the report screen's employee search, and the matches listed
+search_after = None
+search_matches = []
+
+#Milliseconds the report screen's employee search waits after the last keystroke, and most matches listed
+SEARCH_DELAY = 150
+SEARCH_LIMIT = 8
+
+#Milliseconds between refreshes of the On The Clock screen, and most employees listed on it
+LIVE_REFRESH = 1000
+LIVE_ROWS = 500
+
+class Employee(Session):
 
     """ 
     Employee class used following log in verification. 
     
-    Class properties includes employee information corresponding to database and bool variables for decision making.
-
-    Class methods connect to database to perform clock in/clock out etc. functions.
+    The punch state machine lives in service.Session; this class runs each punch on the background database worker
+    so the Tk main loop never blocks, and reports the outcome.
 
     Tkinter message boxes used here for confirmation rather than augmenting the relevant TopLevel screens.
 
@@ -23,89 +62,47 @@ class Employee():
     
     def __init__(self,empID,firstname, lastname, admin: bool, working=False,onbreak=False,onlunch=False,):
 
-        self.empID = empID
-        self.firstname = firstname
-        self.lastname = lastname
-        self.admin = admin
-        self.working = working
-        self.onbreak = onbreak
-        self.onlunch = onlunch
-        self.current_shift = ''
-        self.current_break = ''
-        self.current_lunch = ''
+        super().__init__(db, empID, firstname, lastname, admin, working, onbreak, onlunch)
+
+    def _punch(self, punch, title, message):
+        """
+        Runs punch on the database worker. Punches run one at a time in the order clicked, so the state checks always
+        see the result of the previous punch. Shows the confirmation once the punch completes, or the error if it is
+        not allowed or the database call fails.
+        """
+        def failed(error):
+            if isinstance(error, PunchError):
+                messagebox.showerror(error.title, error.message)
+            else:
+                messagebox.showerror("Database Error", f"{title} failed: {error}\nPlease try again.")
+
+        def done(result):
+            state_text.set(f"Status: {self.status()}")
+            messagebox.showinfo(title, message + datetime.now().strftime("%H:%M"))
+
+        worker.call(screen, punch, callback=done, errback=failed)
 
-        
     def clock_in(self):
+        self._punch(super().clock_in, "Shift started", "Successfully clocked in at ")
 
-        if not self.working:
-            self.working = True
-            self.current_shift = db.start_shift(self.empID)
-            messagebox.showinfo("Shift started", "Successfully clocked in at " + datetime.now().strftime("%H:%M"))
-        else:
-            messagebox.showerror("Clock In Error", "You are already clocked in")
-        
-    
     def clock_out(self):
-        if self.working and (not self.onbreak and not self.onlunch or self.admin):
-            self.working = False
-            db.end_shift(self.current_shift)
-            messagebox.showinfo("Clocked Out", "Successfully clocked out at " + datetime.now().strftime("%H:%M"))
-        elif self.onbreak:
-            messagebox.showerror("Clock Out Error", "Clock Out Error.\nPlease end your break before clocking out.")
-        elif self.onlunch:
-            messagebox.showerror("Clock Out Error", "Clock Out Error.\nPlease end your lunch before clocking out.")
-        else:
-           messagebox.showerror("Clock Out Error", "You must be clocked in to be able to clock out")
-    
-    def take_break(self):
-        if (self.working and not self.onbreak and not self.onlunch) or self.admin:
-            self.onbreak = True
-            self.current_break = db.start_break(self.empID,self.current_shift)
-            messagebox.showinfo("Break Start", "Successfully started break at " + datetime.now().strftime("%H:%M"))
-
-        elif not self.working:
-            messagebox.showerror("Break Error", "You must be clocked in to be able to take a break")
+        self._punch(super().clock_out, "Clocked Out", "Successfully clocked out at ")
 
-        elif self.onlunch:
-            messagebox.showerror("Break Error", "You are on currently on lunch. Unable to take break")
+    def take_break(self):
+        self._punch(super().take_break, "Break Start", "Successfully started break at ")
 
-        else:
-            messagebox.showerror("Break Error", "You are already on break")
-    
     def end_break(self):
-        if self.onbreak:
-            self.onbreak = False
-            db.end_break(self.current_break)
-            messagebox.showinfo("Break Ended", "Successfully ended break at " + datetime.now().strftime("%H:%M"))
-        else:
-            messagebox.showerror("Break Error", "You are not currently taking a break")
-            
+        self._punch(super().end_break, "Break Ended", "Successfully ended break at ")
+
     def take_lunch(self):
-        if (self.working and not self.onbreak and not self.onlunch) or self.admin:
-            self.onlunch = True
-            self.current_lunch = db.start_lunch(self.empID, self.current_shift)
-            messagebox.showinfo("Lunch Start", "Successfully started lunch at " + datetime.now().strftime("%H:%M"))
-        elif not self.working:
-            messagebox.showerror("Lunch Error", "You must be clocked in to be able to take a lunch")
-        elif self.onbreak:
-            messagebox.showerror("Lunch Error", "You are currently on break. Unable to take a lunch")
-        else:
-            messagebox.showerror("Lunch Error", "You are already on lunch")
-    
+        self._punch(super().take_lunch, "Lunch Start", "Successfully started lunch at ")
+
     def end_lunch(self):
-        if self.onlunch:
-            self.onlunch = False
-            db.end_lunch(self.current_lunch)
-            messagebox.showinfo("Lunch Ended", "Successfully ended lunch at " + datetime.now().strftime("%H:%M"))
-        else:
-            messagebox.showerror("Lunch Error", "You are not currently taking a lunch")
+        self._punch(super().end_lunch, "Lunch Ended", "Successfully ended lunch at ")
 
     def get_report(self):
         pass
 
-    def __str__(self):
-        return f"Employee ID: {self.empID}\tEmployee Name: {self.firstname} {self.lastname} {self.admin}"
-
 def main_screen(): 
     """
     This function creates the main screen for the application.
@@ -113,7 +110,9 @@ def main_screen():
     Program is laid out with additional screens as TopLevel objects over the main_screen. Consider using OOP approach for additional screens.
     """
     global screen
+    global status_text
     screen = Tk()
+    status_text = StringVar()
     screen.geometry("300x250")
     screen.title("SimpleTime")
     Label(text = "SimpleTime", bg = "grey", width = "300", height = "2", font = ("Calibri", 14)).pack()
@@ -166,6 +165,7 @@ def register():
     admin_entry = Checkbutton(screen1, text = "Admin Account?", variable=admin, onvalue =1, offvalue = 0, height = 1, width = 30)
     admin_entry.pack()
     Button(screen1, text = "Register", width = 10, height =1, command=register_user).pack()
+    Label(screen1, textvariable = status_text).pack()
     
 def register_user():
     """
@@ -180,8 +180,13 @@ def register_user():
     password_info = password.get()
     admin_info = admin.get()
 
-    registration = db.register(username = username_info, firstname= firstname_info,lastname = lastname_info, password= password_info,admin = admin_info)
+    worker.call(screen1, lambda: db.register(username = username_info, firstname= firstname_info,lastname = lastname_info, password= password_info,admin = admin_info),
+                callback=registered, errback=lambda error: messagebox.showerror("Registration Error", f"Registration failed: {error}\nPlease try again."))
 
+def registered(registration):
+    """
+    Function called with the result of db.register once the registration has been written
+    """
     if registration == 1:
         messagebox.showerror("Registration Error", "Registration Error.\nPlease try again.")
     else:
@@ -218,6 +223,7 @@ def login():
     password_entry.pack()
     Label(screen2, text = "").pack()
     Button(screen2, text = "Login", width = 10, height = 1, command = login_verify).pack()
+    Label(screen2, textvariable = status_text).pack()
     
 def login_verify():
     """
@@ -229,13 +235,18 @@ def login_verify():
 
     username_info = username_verify.get()
     password_info = password_verify.get()
-    session = db.login(username_info,password_info)
+    worker.call(screen2, db.login, username_info, password_info, callback=login_session,
+        errback=lambda error: messagebox.showerror("Login Error", f"Login failed: {error}\nPlease try again."))
 
+def login_session(session):
+    """
+    Function called with the result of db.login once the credentials have been checked
+    """
     if session is not None:
 
         #messagebox.showinfo("Login Successful", "Login Successful")
         global current_user
-        current_user = Employee(session[0], session[2], session[3], session[5])
+        current_user = Employee(session[0], session[2], session[3], session[5]).resume(*session[6:9])
         screen2.destroy()
         timeclock()
     
@@ -253,9 +264,13 @@ def timeclock():
     screen3 = Toplevel(screen)
     screen3.grab_set()
     screen3.title("SimpleTime - Time Clock")
-    screen3.geometry("300x500")
+    screen3.geometry("300x550")
     Label(screen3, text = "SimpleTime", bg = "grey", width = "300", height = "2", font = ("Calibri", 14)).pack()
     Label(screen3, text = f"Welcome {current_user.firstname} {current_user.lastname}\nSelect from the below options:").pack()
+    #state_text shows the live state restored at login and is updated after each punch
+    global state_text
+    state_text = StringVar(value = f"Status: {current_user.status()}")
+    Label(screen3, textvariable = state_text).pack()
     Label(screen3, text = "").pack()
     Button(screen3, text = "Start Shift", width = 10, height = 1, command = lambda : current_user.clock_in()).pack()
     Label(screen3, text = "").pack()
@@ -270,9 +285,131 @@ def timeclock():
     Button(screen3, text = "End Lunch", width = 10, height = 1, command = lambda : current_user.end_lunch()).pack()
     Label(screen3, text = "").pack()
     Button(screen3, text = "Report", width = 10, height = 1, command = lambda : shift_report()).pack()
+    Button(screen3, text = "Diagnostics", width = 10, height = 1, command = lambda : diagnostics()).pack()
+    Button(screen3, text = "On The Clock", width = 10, height = 1, command = lambda : on_the_clock()).pack()
     Label(screen3, text = "").pack()
     Button(screen3, text = "Log Out", width = 10, height = 1, command = lambda : screen3.destroy()).pack()
-    Label(screen3, text = "").pack()
+    Label(screen3, textvariable = status_text).pack()
+
+def diagnostics():
+    """
+    Function to generate the diagnostics screen showing database method latencies, commit times and the slow-query log
+    collected by metrics. Admin only.
+    """
+
+    if not current_user.admin:
+        messagebox.showerror("Diagnostics Error", "You do not have sufficient permissions to access this feature.")
+        return
+    if metrics is None:
+        messagebox.showerror("Diagnostics Error", "Database instrumentation is turned off.")
+        return
+
+    screen5 = Toplevel(screen)
+    screen5.grab_set()
+    screen5.title("SimpleTime - Diagnostics")
+    screen5.geometry("900x560")
+    Label(screen5, text = "SimpleTime", bg = "grey", width = "300", height = "2", font = ("Calibri", 14)).pack()
+
+    columns = ('Method', 'Calls', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)')
+    methods_box = Treeview(screen5, columns = columns, show='headings', height=10)
+    for column in columns:
+        methods_box.column(column, anchor=CENTER, stretch=YES, width=160 if column == 'Method' else 100)
+        methods_box.heading(column, text=column)
+    methods_box.pack(fill = X)
+
+    commit_text = StringVar()
+    Label(screen5, textvariable = commit_text).pack()
+    cache_text = StringVar()
+    Label(screen5, textvariable = cache_text).pack()
+
+    Label(screen5, text = "Slow queries").pack()
+    columns = ('Time', 'Method', 'Seconds', 'SQL', 'Plan')
+    slow_box = Treeview(screen5, columns = columns, show='headings', height=6)
+    for column, width in zip(columns, (130, 110, 70, 330, 250)):
+        slow_box.column(column, anchor=W, stretch=YES, width=width)
+        slow_box.heading(column, text=column)
+    slow_box.pack(fill = X)
+
+    def refresh():
+        snapshot = metrics.snapshot()
+        methods_box.delete(*methods_box.get_children())
+        for name, stats in sorted(snapshot["methods"].items()):
+            methods_box.insert('', END, values=(name, stats["count"], *(f"{stats[key] * 1000:.2f}" for key in ("mean", "p50", "p95", "p99", "max"))))
+        commits = snapshot["commits"]
+        commit_text.set(f"Commits: {commits['count']}   mean {commits['mean'] * 1000:.2f} ms   p95 {commits['p95'] * 1000:.2f} ms   max {commits['max'] * 1000:.2f} ms")
+        if report_cache is not None:
+            cache = report_cache.stats()
+            cache_text.set(f"Report cache: {cache['hits']} hits   {cache['misses']} misses   {cache['entries']} entries   {cache['bytes'] // 1024} KiB   {cache['invalidations']} invalidated")
+        slow_box.delete(*slow_box.get_children())
+        for query in reversed(snapshot["slow_queries"]):
+            slow_box.insert('', END, values=(query["time"], query["method"], f"{query['seconds']:.3f}", query["sql"], "; ".join(query["plan"])))
+
+    def dump():
+        path = filedialog.asksaveasfilename(parent=screen5, defaultextension=".json", initialfile="diagnostics.json")
+        if path:
+            metrics.dump(path)
+            messagebox.showinfo("Diagnostics", f"Diagnostics written to {path}")
+
+    Button(screen5, text = "Refresh", width = 10, height = 1, command = refresh).pack(side=LEFT, padx=5, pady=5)
+    Button(screen5, text = "Save...", width = 10, height = 1, command = dump).pack(side=LEFT, padx=5, pady=5)
+    Button(screen5, text = "Reset", width = 10, height = 1, command = lambda : (metrics.reset(), refresh())).pack(side=LEFT, padx=5, pady=5)
+    Button(screen5, text = "Close", width = 10, height = 1, command = lambda : screen5.destroy()).pack(side=RIGHT, padx=5, pady=5)
+    refresh()
+
+def on_the_clock():
+    """
+    Function to generate the On The Clock screen listing who is working, on break or on lunch right now with their
+    running hours. Read from live_board on the Tk thread every LIVE_REFRESH milliseconds, so it never waits on the
+    database. Admin only.
+    """
+
+    if not current_user.admin:
+        messagebox.showerror("On The Clock Error", "You do not have sufficient permissions to access this feature.")
+        return
+
+    screen6 = Toplevel(screen)
+    screen6.grab_set()
+    screen6.title("SimpleTime - On The Clock")
+    screen6.geometry("900x420")
+    Label(screen6, text = "SimpleTime", bg = "grey", width = "300", height = "2", font = ("Calibri", 14)).pack()
+
+    status_filter = StringVar(value = "All")
+    minutes_filter = StringVar()
+    filters = Frame(screen6)
+    filters.pack()
+    Label(filters, text = "Status").grid(row = 0, column = 0, sticky = E)
+    OptionMenu(filters, status_filter, "All", *LIVE_STATUSES).grid(row = 0, column = 1, sticky = W, padx = 5)
+    Label(filters, text = "In status longer than (minutes)").grid(row = 0, column = 2, sticky = E)
+    Entry(filters, textvariable = minutes_filter, width = 6).grid(row = 0, column = 3, padx = 5)
+    counts_text = StringVar()
+    Label(screen6, textvariable = counts_text).pack()
+
+    columns = ('Employee ID', 'First Name', 'Last Name', 'Status', 'Shift Start', 'Since', 'Minutes', 'Hours Worked')
+    board_box = Treeview(screen6, columns = columns, show='headings', height=12)
+    for column in columns:
+        board_box.column(column, anchor=CENTER, stretch=YES, width=110)
+        board_box.heading(column, text=column)
+    board_box.pack(fill = X)
+
+    def refresh():
+        if not screen6.winfo_exists():
+            return
+        status = status_filter.get()
+        try:
+            longer_than = float(minutes_filter.get()) * 60 if minutes_filter.get().strip() else None
+        except ValueError:
+            longer_than = None
+        rows = live_board.board(None if status == "All" else status, longer_than)
+        counts = live_board.counts()
+        counts_text.set("   ".join(f"{name}: {counts[name]}" for name in LIVE_STATUSES) + f"   Listed: {len(rows)}")
+        board_box.delete(*board_box.get_children())
+        for empid, firstname, lastname, name, shift_start, since, minutes, hours in rows[:LIVE_ROWS]:
+            board_box.insert('', END, values=(empid, firstname, lastname, name, time.strftime("%H:%M", time.localtime(shift_start)),
+                time.strftime("%H:%M", time.localtime(since)), minutes, hours))
+        screen6.after(LIVE_REFRESH, refresh)
+
+    Button(screen6, text = "Close", width = 10, height = 1, command = lambda : screen6.destroy()).pack(pady=5)
+    refresh()
 
 def shift_report():
     """
@@ -286,80 +423,228 @@ def shift_report():
 
         global empid_search
         global shiftid_search
+        global from_search
+        global to_search
+        global breaktype_search
+        global status_search
 
         empid_search = StringVar()
         shiftid_search = StringVar()
+        from_search = StringVar()
+        to_search = StringVar()
+        breaktype_search = StringVar(value = "All")
+        status_search = StringVar(value = "All")
         
 
         #Buttons and Entry fields for shift_report_search function. Note globalization of variables above.
 
         screen4.title("SimpleTime - Shift Report")
-        screen4.geometry("1100x500")
+        screen4.geometry("1100x520")
         Label(screen4, text = "SimpleTime", bg = "grey", width = "300", height = "2", font = ("Calibri", 14)).pack()
         Label(screen4, text = "Enter below information to see shift reports").pack()
-        Label(screen4, text = "Employee ID").pack()
-        empid_search_entry = Entry(screen4, textvariable = empid_search)
-        empid_search_entry.pack()
-        Label(screen4, text = "").pack()
-        Label(screen4, text = "Shift ID").pack()
-        shiftid_search_entry = Entry(screen4, textvariable= shiftid_search)
-        shiftid_search_entry.pack()
+
+        filters = Frame(screen4)
+        filters.pack()
+        Label(filters, text = "Employee ID(s)").grid(row = 0, column = 0, sticky = E)
+        Entry(filters, textvariable = empid_search).grid(row = 0, column = 1, padx = 5)
+        Label(filters, text = "Shift ID").grid(row = 0, column = 2, sticky = E)
+        Entry(filters, textvariable = shiftid_search).grid(row = 0, column = 3, padx = 5)
+        Label(filters, text = "From (YYYY-MM-DD)").grid(row = 1, column = 0, sticky = E)
+        Entry(filters, textvariable = from_search).grid(row = 1, column = 1, padx = 5)
+        Label(filters, text = "To (YYYY-MM-DD)").grid(row = 1, column = 2, sticky = E)
+        Entry(filters, textvariable = to_search).grid(row = 1, column = 3, padx = 5)
+        Label(filters, text = "Break Type").grid(row = 2, column = 0, sticky = E)
+        OptionMenu(filters, breaktype_search, "All", "None", *BREAK_TYPES).grid(row = 2, column = 1, sticky = W, padx = 5)
+        Label(filters, text = "Shift Status").grid(row = 2, column = 2, sticky = E)
+        OptionMenu(filters, status_search, "All", *STATUSES).grid(row = 2, column = 3, sticky = W, padx = 5)
+
+        #Type-ahead employee search. Double click or Enter on a match adds its id to Employee ID(s)
+        global name_search
+        name_search = StringVar()
+        Label(filters, text = "Find Employee").grid(row = 3, column = 0, sticky = E)
+        name_entry = Entry(filters, textvariable = name_search)
+        name_entry.grid(row = 3, column = 1, padx = 5)
+        matches_box = Listbox(filters, height = 4, width = 60)
+        matches_box.grid(row = 3, column = 2, columnspan = 2, sticky = W, padx = 5)
+        name_entry.bind('<KeyRelease>', lambda event: employee_search_typed(matches_box))
+        matches_box.bind('<Double-Button-1>', lambda event: employee_search_chosen(matches_box))
+        matches_box.bind('<Return>', lambda event: employee_search_chosen(matches_box))
+
         Button(screen4, text = "Search", width = 10, height = 1, command = lambda : shift_report_search()).pack()
         Label(screen4, text = "").pack()
         Button(screen4, text = "Close", width = 10, height = 1, command = lambda : screen4.destroy()).pack()
+        Label(screen4, textvariable = status_text).pack()
         
-        #Creation of Treeview object for displaying SQL query results
+        #Creation of VirtualTreeview object for displaying SQL query results. Only the rows in view are Treeview items,
+        #so the report scrolls the same however many shifts match. Clicking a heading sorts by that column
         global results_box
-        columns = ('Employee ID', 'Shift ID', 'First Name', 'Last Name', 'Shift Date', 'Shift Start', 'Shift End', 'Break ID', 'Break Type', 'Break Start', 'Break End')
-        results_box = Treeview(screen4, columns = columns, show='headings', height=8)
+        results_box = VirtualTreeview(screen4, COLUMNS, height=8, block_size=REPORT_BLOCK_SIZE, blocks=REPORT_BLOCKS,
+            on_sort=report_sort)
         
-        results_box.column('Employee ID', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Employee ID', text='Employee ID')
-        results_box.column('Shift ID', anchor=CENTER, stretch=YES, width=80)
-        results_box.heading('Shift ID', text='Shift ID')
-        results_box.column('First Name', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('First Name', text='First Name')
-        results_box.column('Last Name', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Last Name', text='Last Name')
-        results_box.column('Shift Date', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Shift Date', text='Shift Date')
-        results_box.column('Shift Start', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Shift Start', text='Shift Start')
-        results_box.column('Shift End', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Shift End', text='Shift End')
-        results_box.column('Break ID', anchor=CENTER, stretch=YES, width=80)
-        results_box.heading('Break ID', text='Break ID')
-        results_box.column('Break Type', anchor=CENTER, stretch=YES, width=80)
-        results_box.heading('Break Type', text='Break Type')
-        results_box.column('Break Start', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Break Start', text='Break Start')
-        results_box.column('Break End', anchor=CENTER, stretch=YES, width=100)
-        results_box.heading('Break End', text='Break End')
-
-        #Create scrollbar and associate with Treeview object
-        scrollbar = Scrollbar(screen4)
-        results_box.configure(yscrollcommand=scrollbar.set)
-        scrollbar.configure(command=results_box.yview)
-        results_box.pack(fill = X, side=LEFT)
-        scrollbar.pack(side=LEFT)
+        results_box.tree.column('Employee ID', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Shift ID', anchor=CENTER, stretch=YES, width=80)
+        results_box.tree.column('First Name', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Last Name', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Shift Date', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Shift Start', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Shift End', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Break ID', anchor=CENTER, stretch=YES, width=80)
+        results_box.tree.column('Break Type', anchor=CENTER, stretch=YES, width=80)
+        results_box.tree.column('Break Start', anchor=CENTER, stretch=YES, width=100)
+        results_box.tree.column('Break End', anchor=CENTER, stretch=YES, width=100)
+        results_box.pack(fill = X)
         
     
     else:
         #Only administrators have access to report function
         messagebox.showerror("Report Error", "You do not have sufficient permissions to access this feature.")
 
+def employee_search_typed(matches_box):
+    """
+    Function to search employees by name once typing pauses for SEARCH_DELAY milliseconds. Runs on the database
+    worker; results for text that has since changed are dropped.
+    """
+    global search_after
+    if search_after is not None:
+        matches_box.after_cancel(search_after)
+
+    def search():
+        global search_after
+        search_after = None
+        text = name_search.get()
+        if not text.strip():
+            matches_box.delete(0, END)
+            return
+
+        def found(rows):
+            global search_matches
+            if text != name_search.get():
+                return
+            search_matches = rows
+            matches_box.delete(0, END)
+            for empid, username, firstname, lastname in rows:
+                matches_box.insert(END, f"{empid}  {firstname} {lastname} ({username})")
+
+        worker.call(matches_box, db.search_employees, text, SEARCH_LIMIT, callback=found,
+            errback=lambda error: messagebox.showerror("Search Error", f"Employee search failed: {error}"))
+
+    search_after = matches_box.after(SEARCH_DELAY, search)
+
+def employee_search_chosen(matches_box):
+    """
+    Function to add the selected search match to the Employee ID(s) filter
+    """
+    selection = matches_box.curselection()
+    if not selection:
+        return
+    empid = str(search_matches[selection[0]][0])
+    empids = [value.strip() for value in empid_search.get().split(",") if value.strip()]
+    if empid not in empids:
+        empid_search.set(", ".join(empids + [empid]))
+
+def report_query():
+    """
+    Function to build a ReportQuery from the values entered in shift_report. Raises ValueError describing the first invalid field.
+
+    Note: empty fields do not filter. Employee IDs may be a comma separated list. Breaks are listed when a shift id or
+    a break type is entered; "None" lists shifts only.
+    """
+    empids = [empid.strip() for empid in empid_search.get().split(",") if empid.strip()]
+    if not all(empid.isdigit() for empid in empids):
+        raise ValueError("Employee IDs must be numbers separated by commas")
+    shiftid = shiftid_search.get().strip()
+    if shiftid and not shiftid.isdigit():
+        raise ValueError("Shift ID must be a number")
+    dates = []
+    for name, value in (("From", from_search.get().strip()), ("To", to_search.get().strip())):
+        if value:
+            try:
+                work_date(value)
+            except ValueError:
+                raise ValueError(f"{name} date must be in YYYY-MM-DD format")
+        dates.append(value or None)
+    breaktype = breaktype_search.get()
+    status = status_search.get()
+
+    return ReportQuery(
+        empids = empids or None,
+        shiftids = [shiftid] if shiftid else None,
+        start = dates[0],
+        end = dates[1],
+        breaktypes = [breaktype] if breaktype in BREAK_TYPES else None,
+        status = status if status in STATUSES else None,
+        breaks = bool(shiftid) and breaktype != "None",
+    )
+
 def shift_report_search():
     """
-    Function that uses values obtained from shift_report to query database.
+    Function that uses values obtained from shift_report to query database. See report_query for the filters.
     Note: if no values entered: db will select all shifts for all employees
-    if only one variable is entered e.g. employeeid or shiftid query everything matching entered id
-    if both variables entered will find a specific shift with associated breaks
     """
-    empid_info = empid_search.get()
-    shiftid_info = shiftid_search.get()
-    results = db.shift_report(empid_info, shiftid_info)
-    results_box.delete(*results_box.get_children())
-    for row in results:
-        results_box.insert('', END, values=row)
+    global report_search
+    try:
+        query = report_query()
+    except ValueError as error:
+        messagebox.showerror("Report Error", str(error))
+        return
+    report_search = query
+    load_report(query)
+
+def report_sort(column, descending):
+    """
+    on_sort callback of results_box. Lists the current search again in the order of column, sorted by the database
+    """
+    if report_search is None:
+        return
+    if not report_search.breaks and column not in COLUMNS[:7]:
+        messagebox.showerror("Report Error", f"{column} is only listed when searching a shift id or break type")
+        return
+    load_report(report_search, column, descending)
+
+def load_report(query, sort=None, descending=False):
+    """
+    Function to list the row keys of a search on the database worker, then show them in results_box, which reads the
+    rows in view by position. Keys from a superseded search are dropped.
+    """
+    def listed(keys):
+        global report_keys
+        if query is not report_search:
+            return
+        report_keys = keys
+        shiftids, breakids = keys
+        results_box.show(len(shiftids), lambda start, stop, callback: fetch_report_rows(query, keys, start, stop, callback),
+            sort, descending)
 
-main_screen()
+    def failed(error):
+        messagebox.showerror("Report Error", f"Shift report failed: {error}")
+
+    worker.call(results_box, db.report_keys, query, sort, descending, callback=listed, errback=failed)
+
+def fetch_report_rows(query, keys, start, stop, callback):
+    """
+    fetch function of results_box. Reads rows start to stop - 1 of the keys listed for query on the database worker.
+    Rows that stopped matching since the keys were listed come back as None and show as blank rows
+    """
+    shiftids, breakids = keys
+
+    def failed(error):
+        callback(None)
+        if keys is report_keys:
+            messagebox.showerror("Report Error", f"Shift report failed: {error}")
+
+    worker.call(results_box, db.report_rows, query, shiftids[start:stop],
+        None if breakids is None else breakids[start:stop], callback=callback, errback=failed)
+
+def main():
+    """
+    Function to open the database, start the database worker and show the main screen. For headless use see cli.py
+    """
+    global db, worker
+    db = Database('timeclockdb.db', metrics=metrics, report_cache=report_cache, journal='timeclockdb.journal', live=live_board,
+                  snapshots=SnapshotSchedule('backups'))
+    worker = DatabaseWorker(on_pending=lambda pending: status_text.set("Pending..." if pending else ""),
+                            on_error=lambda error: messagebox.showerror("Database Error", f"Database call failed: {error}"))
+    main_screen()
+
+if __name__ == "__main__":
+    main()
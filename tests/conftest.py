@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+#the application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    Path of a migrated database with one employee, empid 1
+    """
+    path = str(tmp_path / "timeclockdb.db")
+    db = Database(path)
+    db.register("test", "Winnie", "Espinosa", "123", 0)
+    db.close()
+    return path
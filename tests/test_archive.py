@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+from archive import archive_period
+from benchmarks.generate import generate
+from bulk import export_shifts
+from db import Database
+from report import ReportQuery
+
+#the generated shifts run from Monday 2020-01-06 to 2020-03-27, 10 employees each working day
+PERIODS = [("2020-01-06", "2020-01-19"), ("2020-01-20", "2020-02-02")]
+QUERIES = [
+    ReportQuery(),
+    ReportQuery(breaks=True),
+    ReportQuery(empids=[2, 7], breaks=True),
+    ReportQuery(start="2020-01-15", end="2020-01-24"),
+    ReportQuery(shiftids=[1, 55, 150, 420]),
+    ReportQuery(start="2020-01-01", end="2020-01-31", breaktypes=["lunch"]),
+    ReportQuery(status="closed", end="2020-02-10"),
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "timeclockdb.db")
+    generate(path, 10, 600, 0)
+    db = Database(path)
+    yield db
+    db.close()
+
+
+def everything(db):
+    """
+    Every result the archive has to leave unchanged
+    """
+    results = {}
+    for i, query in enumerate(QUERIES):
+        results["report", i] = db.report(query)
+        results["pages", i] = [row for rows in db.iter_report(query, page_size=37) for row in rows]
+        shiftids, breakids = db.report_keys(query, "Last Name", descending=True)
+        results["keys", i] = (list(shiftids), None if breakids is None else list(breakids))
+        results["rows", i] = db.report_rows(query, shiftids, breakids)
+    for period in ("day", "week", "period"):
+        results["payroll", period] = db.payroll_summary("2020-01-01", "2020-03-31", period)
+    out = io.StringIO()
+    export_shifts(db, out)
+    results["export"] = out.getvalue()
+    return results
+
+
+def test_archiving_leaves_reports_unchanged(db):
+    before = everything(db)
+    for start, end in PERIODS:
+        path, count = archive_period(db, start, end)
+        assert count == 100
+    assert len(db.archives()) == 2
+    assert db.conn.execute("SELECT MIN(work_date) FROM shifts").fetchone()[0] == 20200203
+    assert everything(db) == before
+
+
+def test_rebuild_rollup_keeps_archived_dates(db):
+    for start, end in PERIODS:
+        archive_period(db, start, end)
+    payroll = db.payroll_summary("2020-01-01", "2020-03-31", "day")
+    assert payroll[0][3] == "2020-01-06"
+    db.rebuild_rollup()
+    assert db.payroll_summary("2020-01-01", "2020-03-31", "day") == payroll
+
+
+def test_ids_are_not_reused_after_archiving_the_tail(db):
+    shiftid, breakid = db.conn.execute("SELECT MAX(shiftid), (SELECT MAX(breakid) FROM breaks) FROM shifts").fetchone()
+    path, count = archive_period(db, "2020-01-06", "2020-03-31")
+    assert count == 600
+    assert db.conn.execute("SELECT COUNT(*) FROM shifts").fetchone()[0] == 0
+
+    newest = db.start_shift(1)
+    assert newest > shiftid
+    assert db.start_break(1, newest) > breakid
+    #and again once reopened, as the high water mark is stored rather than read from the live rows
+    db.close()
+    db = Database(db.db)
+    try:
+        assert db.start_shift(2) > newest
+        assert db.report(ReportQuery(shiftids=[shiftid]))[0][1] == shiftid
+    finally:
+        db.close()
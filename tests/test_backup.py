@@ -0,0 +1,106 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from backup import SNAPSHOT_NAME, prune, restore, snapshot, snapshots, verify
+from db import Database
+
+
+def counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("employees", "shifts", "breaks")}
+    finally:
+        conn.close()
+
+
+def test_snapshot_of_live_database_restores(db_path, tmp_path):
+    db = Database(db_path)
+    writer = sqlite3.connect(db_path)
+    try:
+        for _ in range(50):
+            shiftid = db.start_shift(1)
+            db.start_break(1, shiftid)
+            db.end_shift(shiftid)
+        committed = counts(db_path)
+        #committed to the WAL but not checkpointed into the database file
+        assert os.path.getsize(db_path + "-wal") > 0
+
+        #a writer holding uncommitted rows while the snapshot is taken
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO shifts (empid, shift_start, utc_offset, work_date) VALUES (1, 0, 0, 19700101)")
+        path = snapshot(db, "backups", pages=8, pause=0)
+        writer.rollback()
+    finally:
+        writer.close()
+        db.close()
+
+    assert verify(path) == []
+    target = str(tmp_path / "restored" / "timeclockdb.db")
+    os.makedirs(os.path.dirname(target))
+    restore(path, target)
+    assert not os.path.exists(target + ".pre-restore")
+
+    conn = sqlite3.connect(target)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchall() == [("ok",)]
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+    assert counts(target) == committed
+    restored = Database(target)
+    try:
+        assert restored.login("test", "123")[0] == 1
+    finally:
+        restored.close()
+
+
+def test_restore_keeps_the_replaced_database(db_path, tmp_path):
+    db = Database(db_path)
+    try:
+        path = snapshot(db, "backups", pause=0)
+        db.start_shift(1)
+    finally:
+        db.close()
+    restore(path, db_path)
+    assert counts(db_path)["shifts"] == 0
+    assert counts(db_path + ".pre-restore")["shifts"] == 1
+
+
+def test_restore_refuses_a_bad_snapshot(db_path, tmp_path):
+    bad = tmp_path / "timeclock_20260101_000000.db"
+    bad.write_bytes(b"not a database" * 100)
+    before = counts(db_path)
+    with pytest.raises(ValueError):
+        restore(str(bad), db_path)
+    assert counts(db_path) == before
+
+
+def test_prune_keeps_the_newest_snapshots(tmp_path):
+    now = datetime(2026, 10, 18, 12, 0, 0)
+    taken = [now - timedelta(hours=hours) for hours in range(0, 30 * 24, 6)]
+    for at in taken:
+        (tmp_path / at.strftime(SNAPSHOT_NAME)).write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("not a snapshot")
+
+    removed = prune(str(tmp_path), keep=5, days=0, now=now)
+    assert [at for at, path in snapshots(str(tmp_path))] == taken[:5]
+    assert len(removed) == len(taken) - 5
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_prune_keeps_one_snapshot_per_day(tmp_path):
+    now = datetime(2026, 10, 18, 12, 0, 0)
+    taken = [now - timedelta(hours=hours) for hours in range(0, 30 * 24, 6)]
+    for at in taken:
+        (tmp_path / at.strftime(SNAPSHOT_NAME)).write_bytes(b"")
+
+    prune(str(tmp_path), keep=2, days=7, now=now)
+    kept = [at for at, path in snapshots(str(tmp_path))]
+    #the newest two, then the newest of each earlier day within the last 7 days
+    assert kept[:2] == taken[:2]
+    assert len({at.date() for at in kept[2:]}) == len(kept[2:])
+    assert all(now - at < timedelta(days=7) for at in kept)
+    assert {at.date() for at in kept} == {at.date() for at in taken if now - at < timedelta(days=7)}
@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from bulk import deferred_indexes, import_shifts
+from db import Database
+
+
+def index_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name IN ('shifts', 'breaks')")}
+
+
+def test_deferred_indexes_hidden_from_other_connections(db_path):
+    db = Database(db_path)
+    other = sqlite3.connect(db_path)
+    before = index_names(other)
+    try:
+        with deferred_indexes(db.conn, ("shifts", "breaks")):
+            kept = index_names(db.conn)
+            assert {"idx_shifts_punch_key", "idx_breaks_punch_key", "idx_shifts_open", "idx_breaks_open"} <= kept
+            assert "idx_shifts_start" not in kept
+            assert index_names(other) == before
+        assert index_names(other) == before
+    finally:
+        other.close()
+        db.close()
+
+
+def test_deferred_indexes_rolled_back_on_error(db_path):
+    db = Database(db_path)
+    before = index_names(db.conn)
+    with pytest.raises(RuntimeError):
+        with deferred_indexes(db.conn, ("shifts", "breaks")):
+            db.conn.execute("INSERT INTO shifts (empid, shift_start, utc_offset, work_date) VALUES (1, 0, 0, 19700101)")
+            raise RuntimeError("load failed")
+    assert index_names(db.conn) == before
+    assert db.conn.execute("SELECT COUNT(*) FROM shifts").fetchone()[0] == 0
+    db.close()
+
+
+def test_import_is_one_transaction(db_path):
+    db = Database(db_path)
+    rows = [{"empid": 1, "shiftid": i, "shift_start": "2022-10-11 09:00:00", "shift_end": "2022-10-11 17:00:00",
+             "breaktype": "break", "break_start": "2022-10-11 11:00:00", "break_end": "2022-10-11 11:15:00"} for i in range(10)]
+    assert import_shifts(db, rows, batch_size=3) == 10
+    assert db.conn.execute("SELECT COUNT(*), COUNT(DISTINCT shiftid) FROM shifts").fetchone() == (10, 10)
+    assert db.conn.execute("SELECT COUNT(*) FROM breaks").fetchone()[0] == 10
+    assert db.conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    db.close()
@@ -0,0 +1,177 @@
+import datetime
+import gc
+import threading
+import time
+
+import pytest
+
+from db import Database
+
+
+def test_connections_of_ended_threads_are_released(db_path):
+    db = Database(db_path)
+    try:
+        def read():
+            db.login("test", "123")
+
+        for _ in range(20):
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+        gc.collect()
+        #only the connection of the thread that opened the database is left
+        assert len(db._pool) == 1
+        assert db.login("test", "123")[0] == 1
+    finally:
+        db.close()
+
+
+def test_close_after_threads_ended(db_path):
+    db = Database(db_path)
+    thread = threading.Thread(target=lambda: db.login("test", "123"))
+    thread.start()
+    thread.join()
+    db.close()
+    assert db._pool == []
+    assert db.login("test", "123")[0] == 1
+    db.close()
+
+
+#2022-10-10, a Monday, at midnight UTC
+MONDAY = 1665360000
+HOUR = 3600
+
+
+def add_shift(db, empid, start, end, utc_offset=0, breaks=()):
+    """
+    Inserts a shift and its (breaktype, start, end) breaks the way bulk imports do, with times in hours after MONDAY
+    """
+    conn = db.conn
+    start, end = MONDAY + int(start * HOUR), None if end is None else MONDAY + int(end * HOUR)
+    work_date = int(time.strftime("%Y%m%d", time.gmtime(start + utc_offset)))
+    shiftid = conn.execute("INSERT INTO shifts (empid, shift_start, shift_end, utc_offset, work_date) VALUES (?, ?, ?, ?, ?)",
+        (empid, start, end, utc_offset, work_date)).lastrowid
+    for breaktype, break_start, break_end in breaks:
+        conn.execute("""INSERT INTO breaks (empid, shiftid, breaktype, break_start, break_end, utc_offset)
+            VALUES (?, ?, ?, ?, ?, ?)""", (empid, shiftid, breaktype, MONDAY + int(break_start * HOUR),
+            None if break_end is None else MONDAY + int(break_end * HOUR), utc_offset))
+    conn.commit()
+    return shiftid
+
+
+def expected_summary(db, period):
+    """
+    payroll_summary rows computed straight from the shifts and breaks tables
+    """
+    totals = {}
+    for empid, date, seconds in db.conn.execute("""SELECT empid, date(shift_start + utc_offset, 'unixepoch'),
+            shift_end - shift_start FROM shifts WHERE shift_end IS NOT NULL"""):
+        totals.setdefault((empid, date), [0, 0, 0])[0] += seconds
+    for empid, date, breaktype, seconds in db.conn.execute("""SELECT breaks.empid,
+            date(shifts.shift_start + shifts.utc_offset, 'unixepoch'), breaks.breaktype, breaks.break_end - breaks.break_start
+            FROM breaks INNER JOIN shifts ON shifts.shiftid = breaks.shiftid WHERE breaks.break_end IS NOT NULL"""):
+        totals.setdefault((empid, date), [0, 0, 0])[1 if breaktype == "break" else 2] += seconds
+    periods = {}
+    for (empid, date), seconds in totals.items():
+        if period == "week":
+            day = datetime.date.fromisoformat(date)
+            date = (day - datetime.timedelta(days=day.weekday())).isoformat()
+        summed = periods.setdefault((empid, date), [0, 0, 0])
+        for i in range(3):
+            summed[i] += seconds[i]
+    names = dict((row[0], row[1:]) for row in db.conn.execute("SELECT empid, firstname, lastname FROM employees"))
+    return sorted((empid, *names[empid], date, round(shift / 3600, 2), round(breaks / 3600, 2), round(lunch / 3600, 2),
+                   round((shift - lunch) / 3600, 2)) for (empid, date), (shift, breaks, lunch) in periods.items())
+
+
+def assert_rollup_matches(db):
+    for period in ("day", "week"):
+        assert db.payroll_summary("2022-10-01", "2022-10-31", period) == expected_summary(db, period)
+    rollup = db.conn.execute("SELECT * FROM daily_hours ORDER BY empid, work_date").fetchall()
+    db.rebuild_rollup()
+    assert db.conn.execute("SELECT * FROM daily_hours ORDER BY empid, work_date").fetchall() == rollup
+
+
+@pytest.fixture
+def payroll_db(db_path):
+    db = Database(db_path)
+    db.register("other", "Ada", "Byron", "456", 0)
+    yield db
+    db.close()
+
+
+def test_rollup_follows_inserts_and_ended_punches(payroll_db):
+    db = payroll_db
+    add_shift(db, 1, 9, 17, breaks=[("break", 10, 10.25), ("lunch", 12, 12.5)])
+    #22:00 to 02:00 counts towards the day the shift started
+    add_shift(db, 1, 22 + 24, 26 + 24, breaks=[("break", 25 + 24, 25.5 + 24)])
+    #a UTC-5 shift starting 01:00 UTC on Tuesday is a Monday evening shift
+    add_shift(db, 2, 25, 29, utc_offset=-5 * HOUR, breaks=[("lunch", 26, 27)])
+    #a shift in the following week
+    add_shift(db, 2, 7 * 24 + 9, 7 * 24 + 12)
+    assert_rollup_matches(db)
+
+    shiftid = add_shift(db, 1, 3 * 24 + 9, None, breaks=[("break", 3 * 24 + 10, None)])
+    breakid = db.conn.execute("SELECT breakid FROM breaks WHERE shiftid = ?", (shiftid,)).fetchone()[0]
+    assert_rollup_matches(db)
+    db.conn.execute("UPDATE breaks SET break_end = break_start + 900 WHERE breakid = ?", (breakid,))
+    db.conn.execute("UPDATE shifts SET shift_end = shift_start + 8 * 3600 WHERE shiftid = ?", (shiftid,))
+    db.conn.commit()
+    assert_rollup_matches(db)
+
+
+def test_rollup_follows_edits_of_closed_punches(payroll_db):
+    db = payroll_db
+    shiftid = add_shift(db, 1, 9, 17, breaks=[("break", 10, 10.25), ("lunch", 12, 12.5)])
+    add_shift(db, 2, 9, 17)
+    conn = db.conn
+
+    conn.execute("UPDATE shifts SET shift_end = shift_end + 1800 WHERE shiftid = ?", (shiftid,))
+    conn.commit()
+    assert_rollup_matches(db)
+
+    #moving the shift to Wednesday moves its breaks along
+    conn.execute("UPDATE shifts SET shift_start = shift_start + 2 * 86400, shift_end = shift_end + 2 * 86400 WHERE shiftid = ?",
+        (shiftid,))
+    conn.commit()
+    assert_rollup_matches(db)
+    assert db.payroll_summary("2022-10-10", "2022-10-10", "day", [1]) == []
+
+    conn.execute("UPDATE breaks SET breaktype = 'lunch' WHERE shiftid = ? AND breaktype = 'break'", (shiftid,))
+    conn.execute("UPDATE breaks SET break_end = break_end + 600 WHERE shiftid = ? AND breaktype = 'lunch'", (shiftid,))
+    conn.execute("UPDATE shifts SET empid = 2 WHERE shiftid = ?", (shiftid,))
+    conn.commit()
+    assert_rollup_matches(db)
+
+    #the evening shift now runs past midnight, and stays on the day it started
+    conn.execute("UPDATE shifts SET shift_start = shift_start + 12 * 3600, shift_end = shift_end + 14 * 3600 WHERE shiftid = ?",
+        (shiftid,))
+    conn.commit()
+    assert_rollup_matches(db)
+
+
+def test_rollup_follows_deletes(payroll_db):
+    db = payroll_db
+    first = add_shift(db, 1, 9, 17, breaks=[("break", 10, 10.25), ("lunch", 12, 12.5)])
+    second = add_shift(db, 1, 24 + 9, 24 + 17, breaks=[("lunch", 24 + 12, 24 + 13)])
+    add_shift(db, 2, 9, 12)
+    conn = db.conn
+
+    conn.execute("DELETE FROM breaks WHERE shiftid = ? AND breaktype = 'lunch'", (first,))
+    conn.commit()
+    assert_rollup_matches(db)
+
+    #the shift before its breaks, and the breaks before their shift
+    conn.execute("DELETE FROM shifts WHERE shiftid = ?", (first,))
+    conn.execute("DELETE FROM breaks WHERE shiftid = ?", (first,))
+    conn.execute("DELETE FROM breaks WHERE shiftid = ?", (second,))
+    conn.execute("DELETE FROM shifts WHERE shiftid = ?", (second,))
+    conn.commit()
+    assert_rollup_matches(db)
+    assert conn.execute("SELECT COUNT(*) FROM daily_hours WHERE empid = 1").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("start, end", [("2022-13-45", "2022-10-31"), ("2022-10-01", "2022-10-32"), ("2022-10-1", "2022-10-31")])
+def test_payroll_summary_rejects_invalid_dates(payroll_db, start, end):
+    with pytest.raises(ValueError):
+        payroll_db.payroll_summary(start, end)
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from dbworker import DatabaseWorker
+
+
+class FakeRoot:
+    """
+    Stands in for the Tk root window, running after() callbacks when run is called
+    """
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, func):
+        self.scheduled.append(func)
+
+    def run(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.scheduled and time.monotonic() < deadline:
+            scheduled, self.scheduled = self.scheduled, []
+            for func in scheduled:
+                func()
+            time.sleep(0.005)
+
+
+class FakeWidget:
+    def __init__(self, root):
+        self.root = root
+        self.exists = True
+
+    def _root(self):
+        return self.root
+
+    def after(self, ms, func):
+        if self.exists:
+            self.root.after(ms, func)
+
+    def winfo_exists(self):
+        return self.exists
+
+
+def fail():
+    raise OSError("disk I/O error")
+
+
+@pytest.fixture
+def root():
+    return FakeRoot()
+
+
+def test_closed_widget_does_not_leave_the_call_pending(root):
+    pending = []
+    errors = []
+    worker = DatabaseWorker(on_pending=pending.append, on_error=errors.append)
+    widget = FakeWidget(root)
+    results = []
+    try:
+        worker.call(widget, lambda: 1, callback=results.append)
+        worker.call(widget, fail, callback=results.append, errback=results.append)
+        widget.exists = False
+        root.run()
+    finally:
+        worker.shutdown()
+    assert worker.pending == 0 and pending[-1] == 0
+    assert results == []
+    #the error of a call whose widget was closed still reaches on_error
+    assert [str(error) for error in errors] == ["disk I/O error"]
+
+
+def test_errors_without_errback_go_to_on_error(root):
+    errors = []
+    results = []
+    worker = DatabaseWorker(on_error=errors.append)
+    widget = FakeWidget(root)
+    try:
+        worker.call(widget, fail, callback=results.append)
+        worker.call(widget, lambda: 2, callback=results.append)
+        worker.call(widget, fail, errback=results.append)
+        root.run()
+    finally:
+        worker.shutdown()
+    assert len(errors) == 1
+    assert results[0] == 2 and isinstance(results[1], OSError)
@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db import Database
+
+INSERT_SHIFT = "INSERT INTO shifts (empid, shift_start, utc_offset, work_date) VALUES (?, ?, 0, 20221011)"
+
+
+def rows(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_failing_write_does_not_roll_back_its_batch(db_path):
+    #a long interval, so every write below shares one transaction
+    db = Database(db_path, group_commit=True, commit_interval=500)
+    try:
+        futures = [
+            db._writer.submit(INSERT_SHIFT, (1, 100)),
+            db._writer.submit("INSERT INTO employees VALUES (NULL, ?, ?, ?, ?, ?)", ("test", "Dup", "User", "x", 0)),
+            db._writer.submit(INSERT_SHIFT, (1, 200)),
+        ]
+        results = {}
+        threads = [
+            threading.Thread(target=lambda: results.setdefault("duplicate", db.register("test", "Dup", "User", "x", 0))),
+            threading.Thread(target=lambda: results.setdefault("new", db.register("new", "New", "User", "y", 0))),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        first, duplicate, last = futures
+        assert first.result() > 0 and last.result() > first.result()
+        with pytest.raises(sqlite3.IntegrityError):
+            duplicate.result()
+        assert results == {"duplicate": 1, "new": None}
+    finally:
+        db.close()
+    assert rows(db_path, "SELECT shift_start FROM shifts ORDER BY shiftid") == [(100,), (200,)]
+    assert rows(db_path, "SELECT username FROM employees ORDER BY empid") == [("test",), ("new",)]
+
+
+def test_close_commits_queued_writes(db_path):
+    #writes would otherwise wait ten seconds for their batch to fill
+    db = Database(db_path, group_commit=True, commit_interval=10000, commit_batch=1000)
+    futures = [db._writer.submit(INSERT_SHIFT, (1, at)) for at in range(20)]
+    db.close()
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len({future.result() for future in futures}) == 20
+    assert rows(db_path, "SELECT COUNT(*) FROM shifts") == [(20,)]
@@ -0,0 +1,23 @@
+from db import Database
+from instrument import Metrics
+from report import ReportQuery
+
+
+def test_connection_execute_is_recorded(db_path):
+    metrics = Metrics(slow_query_ms=0)
+    db = Database(db_path, metrics=metrics)
+    try:
+        shiftid = db.start_shift(1)
+        db.end_shift(shiftid)
+        query = ReportQuery(empids=[1], breaks=True)
+        db.shift_report(1, "")
+        db.report_page(query)
+        db.report_keys(query, "Last Name")
+    finally:
+        db.close()
+
+    methods = {entry["method"] for entry in metrics.slow_queries}
+    assert {"shift_report", "report_page", "report_keys"} <= methods
+    assert any(statement.startswith("SELECT shiftid, breakid, sort_key") for statement in metrics.statements)
+    #migrations run through Connection.execute too
+    assert any(statement.startswith("PRAGMA user_version") for statement in metrics.statements)
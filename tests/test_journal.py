@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from db import Database
+from journal import read_journal
+from service import Session
+
+AT = 1665479250
+
+
+def write_journal(path, entries, tail=b""):
+    with open(path, "wb") as file:
+        for entry in entries:
+            file.write(json.dumps(entry).encode() + b"\n")
+        file.write(tail)
+
+
+def shift_entries():
+    return [
+        {"op": "start_shift", "empid": 1, "at": AT, "utc_offset": 0, "work_date": 20221011, "key": "shift1"},
+        {"op": "start_break", "empid": 1, "shift": "shift1", "at": AT + 60, "utc_offset": 0, "key": "break1"},
+        {"op": "end_break", "break": "break1", "at": AT + 120, "key": "end1"},
+        {"op": "end_shift", "shift": "shift1", "at": AT + 600, "key": "end2"},
+    ]
+
+
+def punched(path):
+    conn = sqlite3.connect(path)
+    try:
+        shifts = conn.execute("SELECT punch_key, shift_start, shift_end FROM shifts").fetchall()
+        breaks = conn.execute("SELECT punch_key, break_start, break_end FROM breaks").fetchall()
+    finally:
+        conn.close()
+    return shifts, breaks
+
+
+def test_duplicate_entries_replay_once(db_path, tmp_path):
+    journal = str(tmp_path / "timeclockdb.journal")
+    entries = shift_entries()
+    write_journal(journal, [entry for entry in entries for _ in range(2)])
+
+    Database(db_path, journal=journal).close()
+
+    assert punched(db_path) == ([("shift1", AT, AT + 600)], [("break1", AT + 60, AT + 120)])
+    assert os.path.getsize(journal) == 0
+
+
+def test_replay_after_crash_before_truncate(db_path, tmp_path):
+    journal = str(tmp_path / "timeclockdb.journal")
+    write_journal(journal, shift_entries())
+    Database(db_path, journal=journal).close()
+
+    #the same entries again, as if the process died after committing but before emptying the journal
+    write_journal(journal, shift_entries())
+    Database(db_path, journal=journal).close()
+
+    assert punched(db_path) == ([("shift1", AT, AT + 600)], [("break1", AT + 60, AT + 120)])
+
+
+def test_torn_tail_is_cut_off(db_path, tmp_path):
+    journal = str(tmp_path / "timeclockdb.journal")
+    entries = shift_entries()
+    write_journal(journal, entries[:3], tail=b'{"op": "end_sh')
+
+    assert read_journal(journal) == entries[:3]
+    assert os.path.getsize(journal) == sum(len(json.dumps(entry)) + 1 for entry in entries[:3])
+
+    db = Database(db_path, journal=journal)
+    try:
+        db.end_shift("shift1")
+        assert db._journal.flush(10)
+    finally:
+        db.close()
+    shifts, breaks = punched(db_path)
+    assert [(key, start) for key, start, end in shifts] == [("shift1", AT)] and shifts[0][2] is not None
+    assert breaks == [("break1", AT + 60, AT + 120)]
+
+
+def test_schema_error_at_startup_raises_and_keeps_journal(db_path, tmp_path):
+    journal = str(tmp_path / "timeclockdb.journal")
+    write_journal(journal, shift_entries())
+    size = os.path.getsize(journal)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP INDEX idx_shifts_punch_key")
+    conn.close()
+
+    with pytest.raises(sqlite3.OperationalError):
+        Database(db_path, journal=journal)
+
+    assert os.path.getsize(journal) == size
+    assert punched(db_path) == ([], [])
+
+
+def test_replayer_stops_on_error(db_path, tmp_path):
+    journal = str(tmp_path / "timeclockdb.journal")
+    db = Database(db_path, journal=journal)
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP INDEX idx_shifts_punch_key")
+        conn.close()
+
+        key = db.start_shift(1)
+        assert not db._journal.flush(10)
+        assert len(db._journal.errors) == 1
+        with pytest.raises(sqlite3.OperationalError):
+            db.end_shift(key)
+    finally:
+        db.close()
+    assert [entry["key"] for entry in read_journal(journal)] == [key]
+
+
+@pytest.mark.parametrize("punch, status", [("take_break", "On break"), ("take_lunch", "On lunch"), ("clock_out", "Clocked out")])
+def test_login_applies_pending_punches_on_a_replayed_shift(db_path, tmp_path, punch, status):
+    db = Database(db_path, journal=str(tmp_path / "timeclockdb.journal"))
+    blocker = sqlite3.connect(db_path)
+    try:
+        session = Session(db, 1, "Winnie", "Espinosa", 0)
+        session.clock_in()
+        assert db._journal.flush(10)
+        #the session still names its shift by punch key, while login reads the replayed shift's id
+        assert isinstance(session.current_shift, str)
+
+        #hold the write lock, so the punch stays pending in the journal
+        blocker.execute("BEGIN IMMEDIATE")
+        getattr(session, punch)()
+        assert not db._journal.flush(0.2)
+        row = db.login("test", "123")
+        assert Session(db, 1, "Winnie", "Espinosa", 0).resume(*row[6:9]).status() == status
+
+        blocker.rollback()
+        assert db._journal.flush(10)
+        assert Session(db, 1, "Winnie", "Espinosa", 0).resume(*db.login("test", "123")[6:9]).status() == status
+    finally:
+        blocker.close()
+        db.close()
@@ -0,0 +1,40 @@
+from db import Database
+from live import LiveBoard
+from service import Session
+
+
+def resumed(db, username, password):
+    row = db.login(username, password)
+    return Session(db, row[0], row[2], row[3], row[5]).resume(*row[6:9])
+
+
+def test_live_board_follows_session_punches(db_path):
+    db = Database(db_path, live=LiveBoard())
+    try:
+        db.register("other", "Ada", "Byron", "456", 0)
+        board = db.live
+        first, second = resumed(db, "test", "123"), resumed(db, "other", "456")
+        assert board.counts() == {"Working": 0, "On break": 0, "On lunch": 0}
+
+        first.clock_in()
+        second.clock_in()
+        assert board.counts() == {"Working": 2, "On break": 0, "On lunch": 0}
+        first.take_break()
+        second.take_lunch()
+        assert [(row[0], row[1], row[3]) for row in board.board()] == [(1, "Winnie", "On break"), (2, "Ada", "On lunch")]
+        assert [row[0] for row in board.board("On lunch")] == [2]
+
+        #a board loaded from the database agrees with the one updated punch by punch
+        loaded = LiveBoard()
+        assert loaded.load(db) == 2
+        assert [row[:4] for row in loaded.board()] == [row[:4] for row in board.board()]
+
+        first.end_break()
+        assert board.counts() == {"Working": 1, "On break": 0, "On lunch": 1}
+        second.end_lunch()
+        first.clock_out()
+        assert [(row[0], row[3]) for row in board.board()] == [(2, "Working")]
+        second.clock_out()
+        assert board.board() == []
+    finally:
+        db.close()
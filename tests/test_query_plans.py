@@ -0,0 +1,77 @@
+import pytest
+
+from benchmarks.generate import generate
+from db import Database
+from report import ReportQuery
+
+#the original Employee ID / Shift ID search branches, see ReportQuery.from_search
+SEARCHES = [(3, ""), ("", 7), (3, 7)]
+
+QUERIES = [
+    ReportQuery(empids=[3, 4, 5]),
+    ReportQuery(shiftids=[7, 8]),
+    ReportQuery(start="2020-03-02", end="2020-03-13"),
+    ReportQuery(start="2020-03-02"),
+    ReportQuery(end="2020-01-14"),
+    ReportQuery(empids=list(range(1, 51)), start="2020-03-02", end="2020-03-13"),
+    ReportQuery(empids=[3], start="2020-03-02", end="2020-03-13", breaks=True),
+    ReportQuery(start="2020-03-02", end="2020-03-13", breaktypes=["lunch"]),
+    ReportQuery(status="open"),
+    ReportQuery(empids=[3], status="closed"),
+]
+
+#reports without a selective filter read every shift, in shift start order
+UNFILTERED = [ReportQuery.from_search("", ""), ReportQuery(status="closed"), ReportQuery(breaks=True)]
+
+
+@pytest.fixture(scope="module", params=["fresh", "analyzed"])
+def db(request, tmp_path_factory):
+    """
+    A freshly migrated database without planner statistics, and a generated 20000 shift database after ANALYZE, whose
+    statistics the planner weighs against the filter indexes
+    """
+    path = str(tmp_path_factory.mktemp(request.param) / "timeclockdb.db")
+    if request.param == "analyzed":
+        generate(path, 80, 20000, 0)
+    db = Database(path)
+    yield db
+    db.close()
+
+
+def statements(query):
+    yield "sql", query.sql()
+    yield "first page", query.page_sql(None, 100)
+    yield "next page", query.page_sql((0, 0), 100)
+    yield "keys", query.keys_sql()
+    yield "keys by last name", query.keys_sql("Last Name")
+
+
+def assert_searches(db, query):
+    for name, (sql, params) in statements(query):
+        plan = db.query_plan(sql, params)
+        for table in ("shifts", "breaks"):
+            #the partial indexes hold only open shifts and breaks, so walking one reads just the rows it matches
+            scans = [step for step in plan if step.startswith(f"SCAN {table}") and "_open" not in step]
+            assert not scans, f"{query.key()} {name} scans {table}: {plan}"
+        if query.breaks:
+            assert any("INDEX idx_breaks_shiftid (shiftid=?)" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("empid, shiftid", SEARCHES)
+def test_shift_report_branches_search_an_index(db, empid, shiftid):
+    assert_searches(db, ReportQuery.from_search(empid, shiftid))
+
+
+@pytest.mark.parametrize("query", QUERIES, ids=lambda query: str(query.key()))
+def test_report_filters_search_an_index(db, query):
+    assert_searches(db, query)
+
+
+@pytest.mark.parametrize("query", UNFILTERED, ids=lambda query: str(query.key()))
+def test_unfiltered_report_reads_shifts_in_index_order(db, query):
+    sql, params = query.sql()
+    plan = db.query_plan(sql, params)
+    assert "SCAN shifts USING INDEX idx_shifts_start" in plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+    if query.breaks:
+        assert any("INDEX idx_breaks_shiftid (shiftid=?)" in step for step in plan), plan
@@ -0,0 +1,45 @@
+import pytest
+
+import cli
+from db import Database
+from report import ReportQuery, work_date
+
+
+def test_work_date():
+    assert work_date("2026-01-01") == 20260101
+    assert work_date("2024-02-29") == 20240229
+
+
+@pytest.mark.parametrize("date", ["2022-13-45", "2023-02-29", "2026-1-1", "20260101", "2026-W01-1", "", "yesterday"])
+def test_work_date_rejects_invalid_dates(date):
+    with pytest.raises(ValueError):
+        work_date(date)
+    with pytest.raises(ValueError):
+        ReportQuery(start=date)
+    with pytest.raises(ValueError):
+        ReportQuery(end=date)
+
+
+def test_cli_report_rejects_invalid_dates(db_path, capsys):
+    assert cli.main(["--db", db_path, "report", "--from", "2022-13-45"]) == 1
+    output = capsys.readouterr()
+    assert "YYYY-MM-DD" in output.err
+    assert output.out == ""
+
+
+def test_report_rows_keep_positions_of_rows_no_longer_matching(db_path):
+    db = Database(db_path)
+    try:
+        db.register("other", "Ada", "Byron", "456", 0)
+        db.start_shift(1)
+        db.start_shift(2)
+        query = ReportQuery(status="open")
+        keys, breakids = db.report_keys(query, "Employee ID")
+        assert breakids is None
+        db.end_shift(keys[0])
+        rows = db.report_rows(query, keys)
+        assert len(rows) == len(keys)
+        assert rows[0] is None
+        assert [row[1] for row in rows[1:]] == list(keys[1:])
+    finally:
+        db.close()
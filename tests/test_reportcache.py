@@ -0,0 +1,39 @@
+from db import Database
+from report import ReportQuery
+from reportcache import ReportCache
+
+
+def test_cache_hits_until_another_connection_writes(db_path):
+    cache = ReportCache()
+    db = Database(db_path, report_cache=cache)
+    #a second Database has its own connection, like another SimpleTime or cli.py process
+    other = Database(db_path)
+    try:
+        query = ReportQuery()
+        assert db.report(query) == []
+        assert db.report(query) == []
+        assert cache.stats()["hits"] == 1
+
+        shiftid = other.start_shift(1)
+        rows = db.report(query)
+        assert [row[1] for row in rows] == [shiftid]
+        assert db.report_page(query)[0] == rows
+
+        other.end_shift(shiftid)
+        assert db.report(query)[0][6] is not None
+        assert db.report_page(query)[0][0][6] is not None
+    finally:
+        other.close()
+        db.close()
+
+
+def test_own_writes_keep_unrelated_entries(db_path):
+    cache = ReportCache()
+    db = Database(db_path, report_cache=cache)
+    try:
+        db.report(ReportQuery(empids=[2]))
+        db.start_shift(1)
+        db.report(ReportQuery(empids=[2]))
+        assert cache.stats()["hits"] == 1
+    finally:
+        db.close()
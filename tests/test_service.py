@@ -0,0 +1,59 @@
+import pytest
+
+from db import Database
+from service import PunchError, Session, TimeclockService
+
+
+def resumed(db, username="test", password="123"):
+    row = db.login(username, password)
+    return Session(db, row[0], row[2], row[3], row[5]).resume(*row[6:9])
+
+
+def open_breaks(db):
+    return db.conn.execute("SELECT breakid, breaktype FROM breaks WHERE break_end IS NULL").fetchall()
+
+
+@pytest.fixture
+def db(db_path):
+    db = Database(db_path)
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("start, end, status", [("take_break", "end_break", "On break"), ("take_lunch", "end_lunch", "On lunch")])
+def test_resume_mid_break_or_lunch(db, start, end, status):
+    session = resumed(db)
+    shiftid = session.clock_in()
+    breakid = getattr(session, start)()
+
+    session = resumed(db)
+    assert session.status() == status
+    assert session.current_shift == shiftid
+    assert (session.current_break if start == "take_break" else session.current_lunch) == breakid
+    #the resumed session ends the same break, and cannot start a second one or clock out first
+    with pytest.raises(PunchError):
+        session.take_break()
+    with pytest.raises(PunchError):
+        session.clock_out()
+    assert getattr(session, end)() == breakid
+    assert open_breaks(db) == []
+
+    session = resumed(db)
+    assert session.status() == "Working"
+    assert session.clock_out() == shiftid
+    assert resumed(db).status() == "Clocked out"
+
+
+def test_service_login_resumes_the_live_state(db):
+    service = TimeclockService(db)
+    token, session = service.login("test", "123")
+    service.punch(token, "clock_in")
+    service.punch(token, "take_lunch")
+    service.logout(token)
+
+    assert service.login("test", "wrong") == (None, None)
+    token, session = service.login("test", "123")
+    assert session.state()["status"] == "On lunch"
+    service.punch(token, "end_lunch")
+    service.punch(token, "clock_out")
+    assert service.login("test", "123")[1].status() == "Clocked out"